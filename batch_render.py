@@ -0,0 +1,313 @@
+# batch_render.py
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Без окна: SDL рисует в фиктивный видеодрайвер; приветствие pygame не печатается в stdout
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from camera import PROJECTIONS, Camera
+from lighting import SHADING_MODES
+from lod import DEFAULT_LOD_RATIOS
+from mesh_cache import MeshCache
+from model_loader import load_obj
+from point import Point
+from renderer import Renderer
+
+# Форматы кадров: PNG-файлы в каталоге или поток сырых RGB24 (файл или stdout)
+FRAME_FORMATS = ('png', 'rgb')
+
+# Режимы без собственного пула процессов (исполнители пула не могут создавать свои)
+BATCH_MODES = ('painter', 'zbuffer')
+
+def orbit_path(frames, radius=10.0, elevation=0.0, target=(0.0, 0.0, 0.0),
+               start_angle=0.0, turns=1.0):
+    """Облет камеры вокруг неподвижной цели (как Camera.orbit)
+    
+    Камера движется по окружности радиуса radius на угле возвышения
+    elevation (градусы), за frames кадров совершая turns оборотов.
+    Возвращает массивы положений и целей камеры (frames x 3).
+    """
+    target = np.asarray(target, dtype=float)
+    yaw = np.radians(start_angle + 360.0 * turns * np.arange(frames) / max(frames, 1))
+    pitch = np.radians(elevation)
+    positions = target + radius * np.column_stack([
+        np.cos(pitch) * np.sin(yaw),
+        np.full(frames, np.sin(pitch)),
+        np.cos(pitch) * np.cos(yaw)
+    ])
+    return positions, np.tile(target, (frames, 1))
+
+def keyframe_path(keyframes, frames=None):
+    """Путь камеры по ключевым кадрам с линейной интерполяцией
+    
+    keyframes - список {'frame': номер, 'position': [x, y, z], 'target': [x, y, z]};
+    по умолчанию кадров столько, сколько до последнего ключевого включительно.
+    Возвращает массивы положений и целей камеры (frames x 3).
+    """
+    if not keyframes:
+        raise ValueError("Camera path needs at least one keyframe")
+    keyframes = sorted(keyframes, key=lambda key: key['frame'])
+    times = np.array([key['frame'] for key in keyframes], dtype=float)
+    if frames is None:
+        frames = int(times[-1]) + 1
+    
+    t = np.arange(frames, dtype=float)
+    result = []
+    for name in ('position', 'target'):
+        values = np.array([key[name] for key in keyframes], dtype=float).reshape(-1, 3)
+        result.append(np.column_stack([np.interp(t, times, values[:, axis]) for axis in range(3)]))
+    return tuple(result)
+
+def load_keyframes(filename):
+    """Ключевые кадры из JSON-файла (список или {'keyframes': [...]})"""
+    with open(filename) as f:
+        data = json.load(f)
+    return data['keyframes'] if isinstance(data, dict) else data
+
+def encode_frame(surface, frame_format):
+    """Байты кадра: PNG-файл или сырые строки RGB24 сверху вниз"""
+    if frame_format == 'rgb':
+        return pygame.image.tobytes(surface, 'RGB')
+    buffer = io.BytesIO()
+    pygame.image.save(surface, buffer, 'frame.png')
+    return buffer.getvalue()
+
+# Состояние процесса-исполнителя (создается в _init_worker)
+_worker = {}
+
+def _load_shared_model(model_path, cache_dir, lod_ratios):
+    """Модель из кэша сеток: массивы отображаются в память только для чтения,
+    поэтому все исполнители разделяют одни и те же страницы файла кэша"""
+    if os.path.exists(model_path):
+        model = MeshCache(cache_dir).load(model_path, read_only=True)
+        if model is not None:
+            return model
+    with contextlib.redirect_stdout(sys.stderr):
+        return load_obj(model_path, lod_ratios=lod_ratios)
+
+def _init_worker(model_path, cache_dir, lod_ratios, settings):
+    """Инициализация исполнителя: модель, камера, рендерер и поверхность кадра
+    
+    pygame.init не вызывается: статистика на кадр не выводится, а для
+    поверхностей и кодирования PNG инициализация модулей не нужна (к тому
+    же подсистема событий SDL перехватывает SIGTERM, которым пул
+    останавливает исполнителей).
+    """
+    width, height = settings['width'], settings['height']
+    _worker['model'] = _load_shared_model(model_path, cache_dir, lod_ratios)
+    _worker['camera'] = Camera(
+        position=Point(0, 0, 10),
+        target=Point(0, 0, 0),
+        up=Point(0, 1, 0),
+        aspect_ratio=width / height,
+        projection=settings['projection'],
+        fov=settings['fov']
+    )
+    renderer = Renderer(width, height, mode=settings['mode'])
+    renderer.shading = settings['shading']
+    renderer.lod_enabled = bool(lod_ratios)
+    renderer.show_stats = False
+    _worker['renderer'] = renderer
+    _worker['surface'] = pygame.Surface((width, height))
+    _worker['settings'] = settings
+
+def _render_frame(pose):
+    """Рендеринг одного кадра пути камеры; возвращает (номер, байты кадра)"""
+    index, position, target = pose
+    camera = _worker['camera']
+    renderer = _worker['renderer']
+    settings = _worker['settings']
+    surface = _worker['surface']
+    
+    camera.look_at(Point(*position), Point(*target))
+    surface.fill(renderer.background_color)
+    renderer.render(
+        screen=surface,
+        model=_worker['model'],
+        camera=camera,
+        show_wireframe=settings['show_wireframe'],
+        show_filled=settings['show_filled'],
+        backface_culling=settings['backface_culling']
+    )
+    return index, encode_frame(surface, settings['format'])
+
+def render_path(model_path, positions, targets, write_frame, width=800, height=600,
+                mode='painter', shading='view', projection='orthographic', fov=60.0,
+                frame_format='png', workers=None, show_wireframe=True, show_filled=True,
+                backface_culling=True, lod_ratios=DEFAULT_LOD_RATIOS, cache_dir=None,
+                progress=None):
+    """Рендеринг кадров пути камеры пулом процессов
+    
+    Модель один раз разбирается и сохраняется в кэш сеток (cache_dir, по
+    умолчанию рядом с моделью); исполнители отображают файл кэша в память
+    вместо получения копии модели с каждым кадром. Кадры распределяются
+    по исполнителям по одному и передаются в write_frame(index, data)
+    строго по порядку по мере готовности, поэтому вывод можно сразу
+    направлять в кодировщик. progress(done, total) - необязательный
+    обратный вызов. Возвращает отчет (dict).
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unsupported batch render mode: {mode}")
+    if frame_format not in FRAME_FORMATS:
+        raise ValueError(f"Unknown frame format: {frame_format}")
+    
+    # Запись кэша создается до запуска исполнителей
+    load_start = time.perf_counter()
+    if os.path.exists(model_path):
+        with contextlib.redirect_stdout(sys.stderr):
+            load_obj(model_path, cache=MeshCache(cache_dir), lod_ratios=lod_ratios)
+    load_seconds = time.perf_counter() - load_start
+    
+    settings = {
+        'width': width,
+        'height': height,
+        'mode': mode,
+        'shading': shading,
+        'projection': projection,
+        'fov': fov,
+        'format': frame_format,
+        'show_wireframe': show_wireframe,
+        'show_filled': show_filled,
+        'backface_culling': backface_culling,
+    }
+    initargs = (model_path, cache_dir, lod_ratios, settings)
+    poses = [
+        (index, tuple(position), tuple(target))
+        for index, (position, target) in enumerate(zip(positions.tolist(), targets.tolist()))
+    ]
+    workers = min(workers or os.cpu_count() or 1, max(len(poses), 1))
+    
+    render_start = time.perf_counter()
+    if workers <= 1:
+        # Без пула: рендеринг в текущем процессе
+        _init_worker(*initargs)
+        results = map(_render_frame, poses)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs)
+        results = pool.imap(_render_frame, poses, chunksize=1)
+    
+    total_bytes = 0
+    try:
+        for done, (index, data) in enumerate(results, 1):
+            write_frame(index, data)
+            total_bytes += len(data)
+            if progress is not None:
+                progress(done, len(poses))
+    except BaseException:
+        # Незавершенные кадры не нужны: исполнители останавливаются сразу
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    render_seconds = time.perf_counter() - render_start
+    
+    return {
+        'model': model_path,
+        'frames': len(poses),
+        'resolution': [width, height],
+        'mode': mode,
+        'shading': shading,
+        'projection': projection,
+        'format': frame_format,
+        'workers': workers,
+        'load_seconds': load_seconds,
+        'render_seconds': render_seconds,
+        'fps': len(poses) / render_seconds if render_seconds > 0 else None,
+        'bytes': total_bytes,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline batch rendering of a camera path")
+    parser.add_argument('model', help="OBJ file or default_cube")
+    parser.add_argument('--output', '-o', required=True,
+                        help="directory for PNG frames, or file for raw RGB ('-' for stdout)")
+    parser.add_argument('--format', choices=FRAME_FORMATS, default='png')
+    parser.add_argument('--frames', type=int, default=None, help="frame count (default: 120 for an orbit)")
+    parser.add_argument('--keyframes', help="JSON file with camera keyframes instead of an orbit")
+    parser.add_argument('--radius', type=float, default=10.0, help="orbit radius")
+    parser.add_argument('--elevation', type=float, default=20.0, help="orbit elevation, degrees")
+    parser.add_argument('--turns', type=float, default=1.0, help="orbit turns")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--mode', choices=BATCH_MODES, default='zbuffer')
+    parser.add_argument('--shading', choices=SHADING_MODES, default='gouraud')
+    parser.add_argument('--projection', choices=PROJECTIONS, default='perspective')
+    parser.add_argument('--fov', type=float, default=30.0)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--no-wireframe', action='store_true')
+    parser.add_argument('--no-fill', action='store_true')
+    parser.add_argument('--no-culling', action='store_true')
+    parser.add_argument('--no-lod', action='store_true', help="disable level-of-detail meshes")
+    parser.add_argument('--cache-dir', help="mesh cache directory shared with the workers")
+    args = parser.parse_args(argv)
+    
+    if args.keyframes:
+        positions, targets = keyframe_path(load_keyframes(args.keyframes), args.frames)
+    else:
+        frames = args.frames if args.frames is not None else 120
+        positions, targets = orbit_path(frames, args.radius, args.elevation, turns=args.turns)
+    
+    # PNG - отдельный файл на кадр, RGB - кадры подряд в одном потоке
+    stream = None
+    if args.format == 'png':
+        os.makedirs(args.output, exist_ok=True)
+        
+        def write_frame(index, data):
+            with open(os.path.join(args.output, f"frame_{index:05d}.png"), 'wb') as f:
+                f.write(data)
+    else:
+        stream = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        
+        def write_frame(index, data):
+            stream.write(data)
+            stream.flush()
+    
+    def progress(done, total):
+        print(f"\rFrame {done}/{total}", end='', file=sys.stderr, flush=True)
+    
+    try:
+        report = render_path(
+            args.model,
+            positions,
+            targets,
+            write_frame,
+            width=args.width,
+            height=args.height,
+            mode=args.mode,
+            shading=args.shading,
+            projection=args.projection,
+            fov=args.fov,
+            frame_format=args.format,
+            workers=args.workers,
+            show_wireframe=not args.no_wireframe,
+            show_filled=not args.no_fill,
+            backface_culling=not args.no_culling,
+            lod_ratios=None if args.no_lod else DEFAULT_LOD_RATIOS,
+            cache_dir=args.cache_dir,
+            progress=progress
+        )
+    finally:
+        if stream is not None and stream is not sys.stdout.buffer:
+            stream.close()
+    
+    print(
+        f"\n{report['frames']} frames in {report['render_seconds']:.2f} s "
+        f"({report['fps']:.1f} fps, {report['workers']} workers)",
+        file=sys.stderr
+    )
+
+if __name__ == "__main__":
+    main()
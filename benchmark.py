@@ -0,0 +1,240 @@
+# benchmark.py
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+# Без окна: SDL рисует в фиктивный видеодрайвер; приветствие pygame не печатается в stdout
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from camera import PROJECTIONS, Camera
+from lighting import SHADING_MODES
+from lod import DEFAULT_LOD_RATIOS
+from model_loader import load_obj
+from point import Point
+from renderer import RENDER_MODES, Renderer
+from scene import ModelInstance, Scene, grid_matrices
+from transformations import *
+
+# Этапы конвейера в порядке выполнения
+STAGES = ('transform', 'projection', 'culling', 'sorting', 'lighting', 'rasterization', 'occlusion', 'hud')
+
+# Счетчики граней кадра (Renderer.cull_stats): нарисованные и отброшенные каждой проверкой
+CULL_COUNTERS = ('visible', 'frustum', 'backface', 'occlusion')
+
+def scripted_frame(frame, frames):
+    """Углы вращения модели и высота камеры для кадра сценария"""
+    t = frame / max(frames, 1)
+    angle_y = 360.0 * t
+    angle_x = 30.0 * np.sin(2 * np.pi * t)
+    camera_height = 3.0 * np.sin(4 * np.pi * t)
+    return angle_x, angle_y, camera_height
+
+def positive_int(text):
+    """Тип аргумента командной строки: целое число не меньше 1"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return value
+
+def run_benchmark(model_path, frames=300, width=800, height=600, mode='painter',
+                  warmup=10, workers=None, tile_size=64, show_wireframe=True,
+                  show_filled=True, backface_culling=True, frustum_culling=True,
+                  occlusion_culling=True, instances=0,
+                  lod_ratios=DEFAULT_LOD_RATIOS, projection='orthographic', shading='view',
+                  trace_memory=False):
+    """Рендеринг сценария без ограничения частоты кадров; возвращает отчет (dict)
+    
+    При instances > 0 рендерится сцена из сетки экземпляров модели (render_scene).
+    trace_memory включает измерение выделений памяти за кадр (tracemalloc).
+    """
+    if frames < 1:
+        raise ValueError(f"frames must be at least 1: {frames}")
+    pygame.init()
+    screen = pygame.Surface((width, height))
+    
+    # Сообщения загрузчика не должны попадать в JSON-отчет на stdout
+    load_start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        model = load_obj(model_path, lod_ratios=lod_ratios)
+    load_seconds = time.perf_counter() - load_start
+    
+    instance = ModelInstance(model)
+    scene = None
+    if instances > 0:
+        side = int(np.ceil(np.sqrt(instances)))
+        _, radius = model.get_bounding_sphere()
+        spacing = 6.0 / side
+        offsets = grid_matrices(side, side, spacing, 0.4 * spacing / max(radius, 1e-6))[:instances]
+        scene = Scene()
+        scene.extend(model, offsets)
+    camera = Camera(
+        position=Point(0, 0, 10),
+        target=Point(0, 0, 0),
+        up=Point(0, 1, 0),
+        aspect_ratio=width / height,
+        projection=projection
+    )
+    renderer = Renderer(width, height, mode=mode, workers=workers, tile_size=tile_size)
+    renderer.lod_enabled = bool(lod_ratios)
+    renderer.shading = shading
+    profiler = renderer.profiler
+    profiler.window = max(frames, 1)
+    profiler.trace_memory = trace_memory
+    
+    rotation_pipeline = TransformPipeline().rotate_y('angle_y').rotate_x('angle_x')
+    totals = dict.fromkeys(STAGES, 0.0)
+    culled = dict.fromkeys(CULL_COUNTERS, 0)
+    frame_times = []
+    try:
+        for frame in range(-warmup, frames):
+            angle_x, angle_y, camera_height = scripted_frame(max(frame, 0), frames)
+            rotation = rotation_pipeline(angle_y=angle_y, angle_x=angle_x)
+            instance.model_matrix = rotation
+            if scene is not None:
+                scene.batch(model).matrices[:] = offsets @ rotation
+            camera.position = Point(0, camera_height, 10)
+            
+            # Статистика профилировщика собирается только по измеряемым кадрам
+            profiler.enabled = frame >= 0
+            profiler.begin_frame()
+            frame_start = time.perf_counter()
+            screen.fill(renderer.background_color)
+            if scene is not None:
+                renderer.render_scene(
+                    screen=screen,
+                    scene=scene,
+                    camera=camera,
+                    show_wireframe=show_wireframe,
+                    show_filled=show_filled,
+                    backface_culling=backface_culling,
+                    frustum_culling=frustum_culling,
+                    occlusion_culling=occlusion_culling
+                )
+            else:
+                renderer.render(
+                    screen=screen,
+                    model=instance,
+                    camera=camera,
+                    show_wireframe=show_wireframe,
+                    show_filled=show_filled,
+                    backface_culling=backface_culling,
+                    frustum_culling=frustum_culling,
+                    occlusion_culling=occlusion_culling
+                )
+            frame_time = time.perf_counter() - frame_start
+            profiler.end_frame()
+            
+            # Прогревочные кадры не учитываются
+            if frame < 0:
+                continue
+            frame_times.append(frame_time)
+            for stage in STAGES:
+                totals[stage] += renderer.stage_times.get(stage, 0.0)
+            for counter in CULL_COUNTERS:
+                culled[counter] += renderer.cull_stats.get(counter, 0)
+    finally:
+        renderer.close()
+        pygame.quit()
+    
+    frame_times = np.array(frame_times)
+    total_seconds = float(frame_times.sum())
+    return {
+        'model': model_path,
+        'vertices': int(len(model.positions)),
+        'faces': int(len(model.face_offsets) - 1),
+        'mode': mode,
+        'projection': projection,
+        'shading': shading,
+        'instances': instances,
+        'lod_faces': model.lod_face_counts[1:],
+        'resolution': [width, height],
+        'frames': frames,
+        'load_seconds': load_seconds,
+        'total_seconds': total_seconds,
+        'fps': frames / total_seconds if total_seconds > 0 else None,
+        'frame_ms': {
+            'mean': float(frame_times.mean() * 1000),
+            'p50': float(np.percentile(frame_times, 50) * 1000),
+            'p95': float(np.percentile(frame_times, 95) * 1000),
+            'max': float(frame_times.max() * 1000),
+        },
+        'stages_ms': {stage: totals[stage] / frames * 1000 for stage in STAGES},
+        'faces_per_frame': {counter: culled[counter] / frames for counter in CULL_COUNTERS},
+        'stage_percentiles_ms': {
+            stage: {q: value * 1000 for q, value in profiler.percentiles(stage).items()}
+            for stage in STAGES if profiler.percentiles(stage) is not None
+        },
+        'block_growth_per_frame': profiler.percentiles('block_growth'),
+        'allocated_bytes_per_frame': profiler.percentiles('allocated_bytes'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless render benchmark")
+    parser.add_argument('model', nargs='?', default='models/sphere.obj', help="OBJ file or default_cube")
+    parser.add_argument('--frames', type=positive_int, default=300)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--mode', choices=RENDER_MODES, default='painter')
+    parser.add_argument('--workers', type=int, default=None, help="processes for the tiled mode")
+    parser.add_argument('--tile-size', type=int, default=64)
+    parser.add_argument('--no-wireframe', action='store_true')
+    parser.add_argument('--no-fill', action='store_true')
+    parser.add_argument('--no-culling', action='store_true')
+    parser.add_argument('--no-frustum-culling', action='store_true')
+    parser.add_argument('--no-occlusion-culling', action='store_true')
+    parser.add_argument('--projection', choices=PROJECTIONS, default='orthographic')
+    parser.add_argument('--shading', choices=SHADING_MODES, default='view')
+    parser.add_argument('--no-lod', action='store_true', help="disable level-of-detail meshes")
+    parser.add_argument('--instances', type=int, default=0, help="render a grid of N instances of the model")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="measure per-frame allocations with tracemalloc (slows rendering)")
+    parser.add_argument('--output', '-o', help="JSON report path (default: stdout)")
+    args = parser.parse_args(argv)
+    
+    report = run_benchmark(
+        args.model,
+        frames=args.frames,
+        width=args.width,
+        height=args.height,
+        mode=args.mode,
+        warmup=args.warmup,
+        workers=args.workers,
+        tile_size=args.tile_size,
+        show_wireframe=not args.no_wireframe,
+        show_filled=not args.no_fill,
+        backface_culling=not args.no_culling,
+        frustum_culling=not args.no_frustum_culling,
+        occlusion_culling=not args.no_occlusion_culling,
+        instances=args.instances,
+        lod_ratios=None if args.no_lod else DEFAULT_LOD_RATIOS,
+        projection=args.projection,
+        shading=args.shading,
+        trace_memory=args.trace_memory
+    )
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"{report['fps']:.1f} fps, report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
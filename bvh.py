@@ -0,0 +1,282 @@
+# bvh.py
+import numpy as np
+
+# Количество граней в листе иерархии
+DEFAULT_LEAF_SIZE = 256
+
+# Результаты проверки объема относительно пирамиды видимости
+OUTSIDE = 0
+INTERSECTS = 1
+INSIDE = 2
+
+def face_bounds(positions, face_indices, face_offsets):
+    """Ограничивающие параллелепипеды всех граней: массивы min и max (Fx3)"""
+    corners = positions[face_indices]
+    starts = face_offsets[:-1]
+    return (
+        np.minimum.reduceat(corners, starts, axis=0),
+        np.maximum.reduceat(corners, starts, axis=0)
+    )
+
+def sphere_frustum_test(center, radius, planes):
+    """Положение сферы относительно плоскостей пирамиды: OUTSIDE, INTERSECTS или INSIDE"""
+    distances = planes[:, :3] @ center + planes[:, 3]
+    if np.any(distances < -radius):
+        return OUTSIDE
+    if np.all(distances >= radius):
+        return INSIDE
+    return INTERSECTS
+
+def aabb_frustum_test(centers, extents, planes):
+    """Векторная проверка параллелепипедов (центры и полуразмеры Kx3)
+    
+    Возвращает массивы-маски (outside, inside) длины K.
+    """
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    radii = extents @ np.abs(planes[:, :3]).T
+    outside = np.any(distances < -radii, axis=1)
+    inside = np.all(distances >= radii, axis=1)
+    return outside, inside
+
+def ray_aabb_test(origin, inv_direction, bounds_min, bounds_max):
+    """Векторная проверка пересечения луча с параллелепипедами (метод пластин)
+    
+    inv_direction - покомпонентно обратный вектор направления (inf для
+    нулевых компонент). Возвращает массивы (t_near, t_far) параметров входа и
+    выхода длины K; луч пересекает параллелепипед, если t_near <= t_far.
+    """
+    with np.errstate(invalid='ignore'):
+        t1 = (bounds_min - origin) * inv_direction
+        t2 = (bounds_max - origin) * inv_direction
+    # fmin/fmax пропускают NaN (0 * inf для луча в плоскости грани параллелепипеда)
+    t_near = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+    t_far = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+    return t_near, t_far
+
+class BVH:
+    """Иерархия ограничивающих объемов над кластерами граней сетки
+    
+    Узлы хранятся в массивах в прямом порядке обхода (родитель раньше
+    потомков). Грани каждого узла занимают непрерывный диапазон
+    [start, start + count) в массиве face_order, поэтому поддерево, целиком
+    попавшее в пирамиду видимости, принимается без обхода листьев.
+    Листья - кластеры не более leaf_size граней, разбиение по медиане
+    центров граней вдоль самой длинной оси.
+    """
+    
+    def __init__(self, bounds_min, bounds_max, left, right, start, count, face_order, leaf_size):
+        self.bounds_min = bounds_min
+        self.bounds_max = bounds_max
+        self.left = left
+        self.right = right
+        self.start = start
+        self.count = count
+        self.face_order = face_order
+        self.leaf_size = leaf_size
+        self._levels = None
+        self._triangle_layout = None
+        self._face_leaves = None
+    
+    @classmethod
+    def build(cls, positions, face_indices, face_offsets, leaf_size=DEFAULT_LEAF_SIZE):
+        """Построение иерархии для упакованной сетки"""
+        face_count = len(face_offsets) - 1
+        if face_count == 0:
+            empty = np.zeros((0, 3))
+            none = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty, none, none, none, none, none, leaf_size)
+        
+        face_min, face_max = face_bounds(positions, face_indices, face_offsets)
+        centroids = (face_min + face_max) * 0.5
+        order = np.arange(face_count, dtype=np.int64)
+        
+        bounds_min, bounds_max = [], []
+        left, right, start, count = [], [], [], []
+        
+        # Узлы создаются в прямом порядке; стек хранит (индекс родителя, сторона, начало, длина)
+        stack = [(-1, 0, 0, face_count)]
+        while stack:
+            parent, side, first, length = stack.pop()
+            node = len(start)
+            if parent >= 0:
+                (left if side == 0 else right)[parent] = node
+            
+            ids = order[first:first + length]
+            bounds_min.append(face_min[ids].min(axis=0))
+            bounds_max.append(face_max[ids].max(axis=0))
+            start.append(first)
+            count.append(length)
+            left.append(-1)
+            right.append(-1)
+            
+            if length <= leaf_size:
+                continue
+            
+            # Разбиение по медиане центров вдоль самой длинной оси
+            points = centroids[ids]
+            axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+            half = length // 2
+            order[first:first + length] = ids[np.argpartition(points[:, axis], half)]
+            
+            # Правый потомок кладется в стек первым, чтобы левый получил следующий индекс
+            stack.append((node, 1, first + half, length - half))
+            stack.append((node, 0, first, half))
+        
+        return cls(
+            np.array(bounds_min), np.array(bounds_max),
+            np.array(left, dtype=np.int64), np.array(right, dtype=np.int64),
+            np.array(start, dtype=np.int64), np.array(count, dtype=np.int64),
+            order, leaf_size
+        )
+    
+    def __len__(self):
+        return len(self.start)
+    
+    def _refit_layout(self, face_indices, face_offsets, vertex_count):
+        """Вершины листьев и внутренние узлы по уровням (строится при первом refit)
+        
+        Для каждого листа хранится список его различных вершин: границы
+        листа - минимум и максимум их координат, поэтому при пересчете не
+        нужны границы отдельных граней. Внутренние узлы сгруппированы по
+        уровням дерева от нижнего к корню.
+        """
+        if self._levels is None:
+            leaves = np.flatnonzero(self.left < 0)
+            leaves = leaves[np.argsort(self.start[leaves])]
+            leaf_of_face = np.empty(len(self.face_order), dtype=np.int64)
+            leaf_of_face[self.face_order] = np.repeat(np.arange(len(leaves)), self.count[leaves])
+            
+            # Пары (лист, вершина) без повторов, упорядоченные по листьям
+            owners = np.repeat(leaf_of_face, np.diff(face_offsets))
+            keys = np.unique(owners * vertex_count + face_indices)
+            leaf_ids, vertices = np.divmod(keys, vertex_count)
+            vertex_starts = np.searchsorted(leaf_ids, np.arange(len(leaves)))
+            
+            levels = []
+            frontier = np.zeros(1, dtype=np.int64)
+            while len(frontier):
+                inner = frontier[self.left[frontier] >= 0]
+                if len(inner):
+                    levels.append(inner)
+                frontier = np.concatenate([self.left[inner], self.right[inner]])
+            self._levels = (leaves, vertices, vertex_starts, levels[::-1])
+        return self._levels
+    
+    def refit(self, positions, face_indices, face_offsets):
+        """Пересчет границ узлов после изменения вершин (структура не меняется)
+        
+        Границы всех листьев считаются одним reduceat по заранее собранным
+        вершинам листьев, внутренние узлы - по уровням снизу вверх, уровень
+        одной операцией.
+        """
+        if len(self) == 0:
+            return
+        leaves, vertices, vertex_starts, levels = self._refit_layout(
+            face_indices, face_offsets, len(positions)
+        )
+        points = positions[vertices]
+        self.bounds_min[leaves] = np.minimum.reduceat(points, vertex_starts, axis=0)
+        self.bounds_max[leaves] = np.maximum.reduceat(points, vertex_starts, axis=0)
+        
+        for nodes in levels:
+            a, b = self.left[nodes], self.right[nodes]
+            self.bounds_min[nodes] = np.minimum(self.bounds_min[a], self.bounds_min[b])
+            self.bounds_max[nodes] = np.maximum(self.bounds_max[a], self.bounds_max[b])
+    
+    def face_leaves(self):
+        """Номер листа (узла) для каждой грани (кэшируется)"""
+        if self._face_leaves is None:
+            leaves = np.flatnonzero(self.left < 0)
+            leaves = leaves[np.argsort(self.start[leaves])]
+            face_leaves = np.empty(len(self.face_order), dtype=np.int64)
+            face_leaves[self.face_order] = np.repeat(leaves, self.count[leaves])
+            self._face_leaves = face_leaves
+        return self._face_leaves
+    
+    def triangle_layout(self, triangle_offsets):
+        """Треугольники граней в порядке face_order (кэшируется)
+        
+        Возвращает номера треугольников order и смещения starts (F + 1):
+        треугольники узла занимают order[starts[start]:starts[start + count]].
+        """
+        layout = self._triangle_layout
+        if layout is None or layout[0] is not triangle_offsets:
+            counts = np.diff(triangle_offsets)[self.face_order]
+            starts = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=starts[1:])
+            first = np.repeat(triangle_offsets[self.face_order] - starts[:-1], counts)
+            order = np.arange(starts[-1], dtype=np.int64) + first
+            layout = self._triangle_layout = (triangle_offsets, order, starts)
+        return layout[1], layout[2]
+    
+    def query_ray(self, origin, direction, max_distance=np.inf):
+        """Листья, которые пересекает луч origin + t * direction (0 <= t <= max_distance)
+        
+        Обход идет по уровням иерархии, как в query_planes. Возвращает
+        номера листьев и параметры входа в них, упорядоченные по
+        возрастанию параметра: ближайшее пересечение ищется в листьях по
+        порядку, пока параметр входа следующего не больше найденного.
+        """
+        none = np.zeros(0, dtype=np.int64)
+        if len(self) == 0:
+            return none, np.zeros(0)
+        
+        with np.errstate(divide='ignore'):
+            inv_direction = 1.0 / np.asarray(direction, dtype=float)
+        
+        leaves, entries = [], []
+        frontier = np.zeros(1, dtype=np.int64)
+        while len(frontier):
+            t_near, t_far = ray_aabb_test(
+                origin, inv_direction, self.bounds_min[frontier], self.bounds_max[frontier]
+            )
+            t_near = np.maximum(t_near, 0.0)
+            hit = (t_near <= t_far) & (t_near <= max_distance)
+            frontier, t_near = frontier[hit], t_near[hit]
+            
+            leaf = self.left[frontier] < 0
+            leaves.append(frontier[leaf])
+            entries.append(t_near[leaf])
+            inner = frontier[~leaf]
+            frontier = np.concatenate([self.left[inner], self.right[inner]])
+        
+        leaves = np.concatenate(leaves) if leaves else none
+        entries = np.concatenate(entries) if entries else np.zeros(0)
+        order = np.argsort(entries, kind='stable')
+        return leaves[order], entries[order]
+    
+    def query_planes(self, planes):
+        """Грани кластеров, пересекающих пирамиду видимости
+        
+        planes - массив 6x4 (см. extract_frustum_planes) в координатах сетки.
+        Возвращает None, если видна вся сетка, иначе отсортированный массив
+        индексов граней (возможно пустой). Обход идет по уровням иерархии,
+        все узлы уровня проверяются одним векторным вызовом.
+        """
+        if len(self) == 0:
+            return None
+        
+        centers = (self.bounds_min + self.bounds_max) * 0.5
+        extents = (self.bounds_max - self.bounds_min) * 0.5
+        
+        accepted = []
+        frontier = np.zeros(1, dtype=np.int64)
+        while len(frontier):
+            outside, inside = aabb_frustum_test(centers[frontier], extents[frontier], planes)
+            if frontier[0] == 0 and inside[0]:
+                return None
+            
+            leaf = self.left[frontier] < 0
+            accepted.append(frontier[~outside & (inside | leaf)])
+            split = frontier[~outside & ~inside & ~leaf]
+            frontier = np.concatenate([self.left[split], self.right[split]])
+        
+        nodes = np.concatenate(accepted)
+        if len(nodes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        faces = np.concatenate([
+            self.face_order[first:first + length]
+            for first, length in zip(self.start[nodes], self.count[nodes])
+        ])
+        faces.sort()
+        return faces
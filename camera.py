@@ -3,38 +3,230 @@ import numpy as np
 from point import Point
 from transformations import *
 
+# Типы проекции камеры
+PROJECTIONS = ('orthographic', 'perspective')
+
 class Camera:
-    def __init__(self, position, target, up, aspect_ratio, near=0.1, far=100.0):
-        self.position = position  # Point
-        self.target = target      # Point
-        self.up = up              # Point
-        self.aspect_ratio = aspect_ratio
-        self.near = near
-        self.far = far
+    """Камера с кэшированием матриц
+    
+    Положение, цель, вектор вверх и параметры проекции изменяются только
+    через свойства и методы камеры (move, zoom, orbit, look_at, reset);
+    матрицы вида, проекции, их произведение и плоскости пирамиды видимости
+    пересчитываются лениво, только после изменения входных данных.
+    Свойства position/target/up возвращают копии точек: изменение их полей
+    не влияет на камеру. Счетчик version увеличивается при каждом изменении.
+    """
+    
+    def __init__(self, position, target, up, aspect_ratio, near=0.1, far=100.0,
+                 projection='orthographic', fov=60.0, ortho_scale=0.3):
+        self._position = position.to_array()
+        self._target = target.to_array()
+        self._up = up.to_array()
+        self._aspect_ratio = aspect_ratio
+        self._near = near
+        self._far = far
         
-        self.update_view_matrix()
-        self.update_projection_matrix()
+        # 'orthographic' - параллельная проекция с масштабом ortho_scale,
+        # 'perspective' - перспективная с вертикальным углом обзора fov (градусы)
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection: {projection}")
+        self._projection = projection
+        self._fov = fov
+        self._ortho_scale = ortho_scale
+        
+        # Начальное состояние для reset
+        self._initial = (self._position.copy(), self._target.copy(), self._up.copy())
+        
+        self.version = 0
+        self._view_matrix = None
+        self._projection_matrix = None
+        self._view_projection_matrix = None
+        self._frustum_planes = None
+        self._forward = None
+        self._orbit = None
+    
+    # --- Состояние камеры ---
+    
+    @property
+    def position(self):
+        return Point.from_array(self._position)
+    
+    @position.setter
+    def position(self, point):
+        self._position = point.to_array()
+        self._invalidate_view()
+    
+    @property
+    def target(self):
+        return Point.from_array(self._target)
+    
+    @target.setter
+    def target(self, point):
+        self._target = point.to_array()
+        self._invalidate_view()
+    
+    @property
+    def up(self):
+        return Point.from_array(self._up)
+    
+    @up.setter
+    def up(self, point):
+        self._up = point.to_array()
+        self._invalidate_view()
+    
+    @property
+    def aspect_ratio(self):
+        return self._aspect_ratio
+    
+    @aspect_ratio.setter
+    def aspect_ratio(self, value):
+        self._aspect_ratio = value
+        self._invalidate_projection()
+    
+    @property
+    def near(self):
+        return self._near
+    
+    @near.setter
+    def near(self, value):
+        self._near = value
+        self._invalidate_projection()
+    
+    @property
+    def far(self):
+        return self._far
+    
+    @far.setter
+    def far(self, value):
+        self._far = value
+        self._invalidate_projection()
+    
+    @property
+    def projection(self):
+        return self._projection
+    
+    @projection.setter
+    def projection(self, value):
+        if value not in PROJECTIONS:
+            raise ValueError(f"Unknown projection: {value}")
+        self._projection = value
+        self._invalidate_projection()
+    
+    @property
+    def fov(self):
+        return self._fov
+    
+    @fov.setter
+    def fov(self, value):
+        self._fov = value
+        self._invalidate_projection()
+    
+    @property
+    def ortho_scale(self):
+        return self._ortho_scale
+    
+    @ortho_scale.setter
+    def ortho_scale(self, value):
+        self._ortho_scale = value
+        self._invalidate_projection()
+    
+    def _invalidate_view(self):
+        self.version += 1
+        self._view_matrix = None
+        self._view_projection_matrix = None
+        self._frustum_planes = None
+        self._forward = None
+        self._orbit = None
+    
+    def _invalidate_projection(self):
+        self.version += 1
+        self._projection_matrix = None
+        self._view_projection_matrix = None
+        self._frustum_planes = None
+    
+    # --- Управление ---
+    
+    def look_at(self, position, target, up=None):
+        """Установка положения и цели камеры (и вектора вверх)"""
+        self._position = position.to_array()
+        self._target = target.to_array()
+        if up is not None:
+            self._up = up.to_array()
+        self._invalidate_view()
+    
+    def move(self, dx, dy, dz):
+        """Параллельный перенос камеры вместе с целью"""
+        offset = np.array([dx, dy, dz], dtype=float)
+        self._position = self._position + offset
+        self._target = self._target + offset
+        self._invalidate_view()
+    
+    def zoom(self, distance):
+        """Перемещение камеры вдоль направления взгляда (к цели при distance > 0)"""
+        forward = self.get_forward()
+        if not forward.any():
+            return
+        self._position = self._position + forward * distance
+        self._invalidate_view()
+    
+    def orbit(self, yaw_degrees, pitch_degrees):
+        """Вращение камеры вокруг цели
+        
+        Сферические координаты камеры относительно цели вычисляются один раз
+        и затем только изменяются на приращения углов; наклон ограничен ±89°.
+        """
+        if self._orbit is None:
+            offset = self._position - self._target
+            radius = np.linalg.norm(offset)
+            if radius == 0:
+                return
+            yaw = np.degrees(np.arctan2(offset[0], offset[2]))
+            pitch = np.degrees(np.arcsin(np.clip(offset[1] / radius, -1.0, 1.0)))
+            orbit = [radius, yaw, pitch]
+        else:
+            orbit = self._orbit
+        
+        radius, yaw, pitch = orbit
+        yaw += yaw_degrees
+        pitch = float(np.clip(pitch + pitch_degrees, -89.0, 89.0))
+        
+        yaw_rad = np.radians(yaw)
+        pitch_rad = np.radians(pitch)
+        self._position = self._target + radius * np.array([
+            np.cos(pitch_rad) * np.sin(yaw_rad),
+            np.sin(pitch_rad),
+            np.cos(pitch_rad) * np.cos(yaw_rad)
+        ])
+        self._invalidate_view()
+        self._orbit = [radius, yaw, pitch]
+    
+    def reset(self):
+        """Возврат к начальному положению, цели и вектору вверх"""
+        position, target, up = self._initial
+        self._position = position.copy()
+        self._target = target.copy()
+        self._up = up.copy()
+        self._invalidate_view()
+    
+    # --- Матрицы ---
+    
+    def get_forward(self):
+        """Единичный вектор направления взгляда (нулевой, если цель совпадает с камерой)"""
+        if self._forward is None:
+            forward = self._target - self._position
+            length = np.linalg.norm(forward)
+            self._forward = forward / length if length > 0 else forward
+        return self._forward
     
     def update_view_matrix(self):
         """Вычисление матрицы вида"""
         # Вектор направления взгляда
-        forward = Point(
-            self.target.x - self.position.x,
-            self.target.y - self.position.y,
-            self.target.z - self.position.z
-        )
-        
-        # Нормализация
-        forward_arr = forward.to_array()
-        forward_len = np.linalg.norm(forward_arr)
-        if forward_len == 0:
+        forward_arr = self.get_forward()
+        if not forward_arr.any():
             forward_arr = np.array([0, 0, -1])  # Направление по умолчанию
-        else:
-            forward_arr = forward_arr / forward_len
         
         # Вектор вправо
-        up_arr = self.up.to_array()
-        right_arr = np.cross(forward_arr, up_arr)
+        right_arr = np.cross(forward_arr, self._up)
         right_len = np.linalg.norm(right_arr)
         if right_len == 0:
             right_arr = np.array([1, 0, 0])  # Направление по умолчанию
@@ -50,29 +242,60 @@ class Camera:
             up_arr = up_arr / up_len
         
         # Матрица вида
-        pos_arr = self.position.to_array()
+        pos_arr = self._position
         
-        self.view_matrix = np.array([
+        self._view_matrix = np.array([
             [right_arr[0], right_arr[1], right_arr[2], -np.dot(right_arr, pos_arr)],
             [up_arr[0], up_arr[1], up_arr[2], -np.dot(up_arr, pos_arr)],
             [-forward_arr[0], -forward_arr[1], -forward_arr[2], np.dot(forward_arr, pos_arr)],
             [0, 0, 0, 1]
         ], dtype=float)
+        return self._view_matrix
     
     def update_projection_matrix(self):
-        """Вычисление матрицы ортографической проекции"""
-        # Ортографическая проекция (параллельная)
-        # Масштаб подбирается так, чтобы объекты были хорошо видны
-        scale = 0.3  # Уменьшенный масштаб для лучшей видимости
-        
-        self.projection_matrix = np.array([
-            [scale / self.aspect_ratio, 0, 0, 0],
-            [0, scale, 0, 0],
-            [0, 0, -2/(self.far - self.near), -(self.far + self.near)/(self.far - self.near)],
-            [0, 0, 0, 1]
-        ], dtype=float)
+        """Вычисление матрицы проекции (ортографической или перспективной)"""
+        near, far = self._near, self._far
+        if self._projection == 'perspective':
+            # Перспективная проекция по вертикальному углу обзора
+            f = 1.0 / np.tan(np.radians(self._fov) / 2)
+            self._projection_matrix = np.array([
+                [f / self._aspect_ratio, 0, 0, 0],
+                [0, f, 0, 0],
+                [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                [0, 0, -1, 0]
+            ], dtype=float)
+        else:
+            # Ортографическая проекция (параллельная)
+            # Масштаб подбирается так, чтобы объекты были хорошо видны
+            scale = self._ortho_scale
+            self._projection_matrix = np.array([
+                [scale / self._aspect_ratio, 0, 0, 0],
+                [0, scale, 0, 0],
+                [0, 0, -2/(far - near), -(far + near)/(far - near)],
+                [0, 0, 0, 1]
+            ], dtype=float)
+        return self._projection_matrix
+    
+    @property
+    def view_matrix(self):
+        if self._view_matrix is None:
+            self.update_view_matrix()
+        return self._view_matrix
+    
+    @property
+    def projection_matrix(self):
+        if self._projection_matrix is None:
+            self.update_projection_matrix()
+        return self._projection_matrix
     
     def get_view_projection_matrix(self):
-        """Получение комбинированной матрицы вида и проекции"""
-        self.update_view_matrix()
-        return self.projection_matrix @ self.view_matrix
\ No newline at end of file
+        """Получение комбинированной матрицы вида и проекции (кэшируется)"""
+        if self._view_projection_matrix is None:
+            self._view_projection_matrix = self.projection_matrix @ self.view_matrix
+        return self._view_projection_matrix
+    
+    def get_frustum_planes(self):
+        """Плоскости пирамиды видимости в мировых координатах (массив 6x4, кэшируется)"""
+        if self._frustum_planes is None:
+            self._frustum_planes = extract_frustum_planes(self.get_view_projection_matrix())
+        return self._frustum_planes
@@ -0,0 +1,61 @@
+# depth_order.py
+import numpy as np
+
+def face_depths(vertex_depth, face_indices, face_offsets):
+    """Средняя глубина граней по глубине вершин
+    
+    vertex_depth - массив (..., N) глубин вершин; возвращает (..., F).
+    """
+    starts = face_offsets[:-1]
+    sizes = np.diff(face_offsets)
+    return np.add.reduceat(vertex_depth[..., face_indices], starts, axis=-1) / sizes
+
+def view_depth_row(view_matrix, model_matrix=None):
+    """Строка (4,) для вычисления глубины вершин в пространстве вида
+    
+    Глубина - расстояние вдоль направления взгляда (больше - дальше от
+    камеры): depth = positions @ row[:3] + row[3].
+    """
+    row = -view_matrix[2]
+    if model_matrix is not None:
+        row = row @ model_matrix
+    return row
+
+class DepthOrder:
+    """Порядок граней от дальних к ближним с повторным использованием между кадрами
+    
+    Если число граней не изменилось, за основу берется порядок прошлого
+    кадра: при малых изменениях камеры или модели он почти упорядочен.
+    Уже упорядоченный порядок возвращается без изменений; если доля пар
+    соседей в неверном порядке не больше repair_fraction, порядок
+    исправляется устойчивой сортировкой (timsort, который на почти
+    упорядоченных данных сводится к вставкам и слиянию готовых серий);
+    иначе выполняется полная сортировка argsort.
+    """
+    
+    def __init__(self, repair_fraction=0.25):
+        self.repair_fraction = repair_fraction
+        self.stats = {'full': 0, 'reused': 0, 'repaired': 0}
+        self._order = None
+    
+    def reset(self):
+        self._order = None
+    
+    def sort(self, depth):
+        """Индексы массива depth по убыванию глубины (дальние первыми)"""
+        keys = -np.asarray(depth, dtype=float)
+        previous = self._order
+        if previous is not None and len(previous) == len(keys):
+            ordered = keys[previous]
+            inversions = np.count_nonzero(ordered[1:] < ordered[:-1])
+            if inversions == 0:
+                self.stats['reused'] += 1
+                return previous
+            if inversions <= self.repair_fraction * len(keys):
+                self.stats['repaired'] += 1
+                self._order = previous[np.argsort(ordered, kind='stable')]
+                return self._order
+        
+        self.stats['full'] += 1
+        self._order = np.argsort(keys)
+        return self._order
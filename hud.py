@@ -0,0 +1,161 @@
+# hud.py
+from collections import OrderedDict
+import pygame
+
+# Шрифты загружаются один раз на размер
+_fonts = {}
+
+def get_font(size=24):
+    """Шрифт pygame по умолчанию заданного размера (кэшируется)"""
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.Font(None, size)
+    return font
+
+class TextCache:
+    """Кэш отрисованных строк текста
+    
+    Поверхности хранятся по ключу (текст, цвет) и вытесняются по принципу
+    LRU, когда их больше max_entries. Строки, которые не меняются от кадра к
+    кадру, рисуются шрифтом только один раз.
+    """
+    
+    def __init__(self, font_size=24, max_entries=256):
+        self.font_size = font_size
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+    
+    @property
+    def font(self):
+        return get_font(self.font_size)
+    
+    def render(self, text, color):
+        """Поверхность со строкой text цвета color"""
+        key = (text, tuple(color))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        
+        self.misses += 1
+        surface = self.font.render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+    
+    def draw(self, screen, text, color, position):
+        """Вывод строки на экран"""
+        screen.blit(self.render(text, color), position)
+    
+    def clear(self):
+        self._surfaces.clear()
+    
+    def __len__(self):
+        return len(self._surfaces)
+
+class StaticOverlay:
+    """Блок строк, заранее собранный в одну поверхность
+    
+    Поверхность пересобирается только при изменении набора строк
+    (например, после переключения режима клавишей), а в каждом кадре
+    выводится одним вызовом blit.
+    """
+    
+    def __init__(self, text_cache, color, line_height=25):
+        self.text_cache = text_cache
+        self.color = color
+        self.line_height = line_height
+        self.rebuilds = 0
+        self._lines = None
+        self._surface = None
+    
+    def update(self, lines):
+        """Установка строк; возвращает True, если поверхность пересобрана"""
+        lines = tuple(lines)
+        if lines == self._lines:
+            return False
+        
+        rendered = [self.text_cache.render(line, self.color) for line in lines]
+        width = max((surface.get_width() for surface in rendered), default=0)
+        height = self.line_height * (len(rendered) - 1) + rendered[-1].get_height() if rendered else 0
+        self._surface = pygame.Surface((max(width, 1), max(height, 1)), pygame.SRCALPHA)
+        for i, surface in enumerate(rendered):
+            self._surface.blit(surface, (0, i * self.line_height))
+        
+        self._lines = lines
+        self.rebuilds += 1
+        return True
+    
+    @property
+    def lines(self):
+        return self._lines
+    
+    @property
+    def surface(self):
+        return self._surface
+    
+    def draw(self, screen, position):
+        if self._surface is not None:
+            screen.blit(self._surface, position)
+
+class HudLayer:
+    """HUD поверх готового кадра с перерисовкой только изменившихся областей
+    
+    После рендеринга кадр без HUD сохраняется копией (capture). Элемент HUD
+    (строка или StaticOverlay) под ключом key рисуется заново, только если
+    его содержимое изменилось: фон под старым и новым прямоугольником
+    восстанавливается из копии кадра, а объединение прямоугольников
+    добавляется в список для pygame.display.update. Элементы не должны
+    перекрываться.
+    """
+    
+    def __init__(self, text_cache, size):
+        self.text_cache = text_cache
+        self.background = pygame.Surface(size)
+        self.dirty_rects = []
+        self._items = {}
+    
+    def capture(self, screen):
+        """Сохранение кадра без HUD; все элементы будут нарисованы заново"""
+        self.background.blit(screen, (0, 0))
+        self._items.clear()
+        self.dirty_rects.clear()
+    
+    def _place(self, screen, key, content, surface, position):
+        rect = surface.get_rect(topleft=position)
+        previous = self._items.get(key)
+        if previous is not None:
+            dirty = rect.union(previous[1])
+            screen.blit(self.background, dirty, dirty)
+        else:
+            dirty = rect
+        screen.blit(surface, rect)
+        self._items[key] = (content, rect)
+        self.dirty_rects.append(dirty)
+        return dirty
+    
+    def draw_text(self, screen, key, text, color, position):
+        """Вывод строки; возвращает обновленный прямоугольник или None"""
+        content = (text, tuple(color), position)
+        previous = self._items.get(key)
+        if previous is not None and previous[0] == content:
+            return None
+        return self._place(screen, key, content, self.text_cache.render(text, color), position)
+    
+    def draw_overlay(self, screen, key, overlay, position):
+        """Вывод StaticOverlay; возвращает обновленный прямоугольник или None"""
+        content = (overlay.lines, position)
+        previous = self._items.get(key)
+        if overlay.surface is None or (previous is not None and previous[0] == content):
+            return None
+        return self._place(screen, key, content, overlay.surface, position)
+    
+    def pop_dirty_rects(self):
+        """Прямоугольники, измененные с прошлого вызова"""
+        rects = self.dirty_rects
+        self.dirty_rects = []
+        return rects
@@ -0,0 +1,116 @@
+# lighting.py
+import numpy as np
+
+# Режимы затенения: 'view' - яркость по углу между нормалью и взглядом (без
+# источников света), 'flat' - освещение центров граней, 'gouraud' - освещение
+# вершин по их нормалям с интерполяцией яркости внутри треугольников
+SHADING_MODES = ('view', 'flat', 'gouraud')
+
+def _dot(a, b):
+    """Скалярные произведения векторов по последней оси (b может быть одним вектором)"""
+    if b.ndim == 1:
+        return a @ b
+    return np.einsum('...i,...i->...', a, b)
+
+def _normalize(vectors):
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    np.divide(vectors, lengths, out=vectors, where=lengths > 0)
+    return vectors
+
+class DirectionalLight:
+    """Направленный источник (солнце): свет падает вдоль direction"""
+    
+    def __init__(self, direction, intensity=1.0):
+        self.direction = _normalize(np.array(direction, dtype=float))
+        self.intensity = intensity
+    
+    def incident(self, points):
+        """Единичный вектор к источнику и сила света в точках points (...x3)"""
+        return -self.direction, self.intensity
+
+class PointLight:
+    """Точечный источник с ослаблением intensity / (1 + attenuation * d²)"""
+    
+    def __init__(self, position, intensity=1.0, attenuation=0.0):
+        self.position = np.array(position, dtype=float)
+        self.intensity = intensity
+        self.attenuation = attenuation
+    
+    def incident(self, points):
+        """Единичные векторы к источнику и сила света в точках points (...x3)"""
+        to_light = self.position - points
+        distance_sq = np.einsum('...i,...i->...', to_light, to_light)
+        to_light /= np.sqrt(np.maximum(distance_sq, 1e-24))[..., np.newaxis]
+        return to_light, self.intensity / (1.0 + self.attenuation * distance_sq)
+
+class Lighting:
+    """Освещение по модели Блинна - Фонга с квантованием яркости
+    
+    Яркость - скаляр: фоновая составляющая плюс сумма по источникам
+    диффузной (n·l) и зеркальной ((n·h)^shininess) составляющих. Яркость
+    вычисляется векторно сразу для массива точек (центров граней или
+    вершин) и квантуется до levels уровней в диапазоне [0, max_intensity].
+    Цвет получается выборкой из таблицы lut[канал базового цвета, уровень],
+    поэтому растеризатору не нужно умножать цвета на яркость попиксельно.
+    """
+    
+    def __init__(self, lights=None, ambient=0.2, diffuse=0.8, specular=0.3,
+                 shininess=32.0, levels=256, max_intensity=1.5):
+        if lights is None:
+            lights = [DirectionalLight((1.0, -1.0, -2.0))]
+        self.lights = list(lights)
+        self.ambient = ambient
+        self.diffuse = diffuse
+        self.specular = specular
+        self.shininess = shininess
+        
+        # Не больше 256 уровней: номер уровня хранится в uint8
+        if not 2 <= levels <= 256:
+            raise ValueError(f"levels must be in [2, 256]: {levels}")
+        self.levels = levels
+        self.max_intensity = max_intensity
+        self._lut = None
+        self._lut_key = None
+    
+    def intensity(self, points, normals, eye):
+        """Яркость в точках points (...x3) с единичными нормалями normals
+        
+        eye - единичные векторы от точек к камере (...x3) или один вектор (3,)
+        для ортографической проекции.
+        """
+        result = np.full(normals.shape[:-1], self.ambient, dtype=float)
+        for light in self.lights:
+            to_light, strength = light.incident(points)
+            lambert = np.maximum(_dot(normals, to_light), 0.0)
+            result += self.diffuse * strength * lambert
+            if self.specular > 0:
+                # Зеркальная составляющая только у освещенной стороны
+                half = _normalize(to_light + eye)
+                highlight = np.maximum(_dot(normals, half), 0.0) ** self.shininess
+                result += self.specular * strength * np.where(lambert > 0, highlight, 0.0)
+        return result
+    
+    def quantize(self, intensity):
+        """Номера уровней яркости (uint8)"""
+        scale = (self.levels - 1) / self.max_intensity
+        return np.clip(intensity * scale + 0.5, 0, self.levels - 1).astype(np.uint8)
+    
+    @property
+    def lut(self):
+        """Таблица 256 x levels: канал цвета, умноженный на яркость уровня (uint8)"""
+        key = (self.levels, self.max_intensity)
+        if self._lut_key != key:
+            factors = np.linspace(0.0, self.max_intensity, self.levels)
+            table = np.arange(256, dtype=float)[:, np.newaxis] * factors
+            self._lut = np.minimum(np.rint(table), 255).astype(np.uint8)
+            self._lut_key = key
+        return self._lut
+    
+    def colors(self, base_colors, levels):
+        """Цвета (...x3, uint8) по базовым цветам (...x3) и номерам уровней (...)"""
+        base = np.clip(base_colors, 0, 255).astype(np.intp)
+        return self.lut[base, levels[..., np.newaxis]]
+    
+    def shade(self, base_colors, points, normals, eye):
+        """Освещение и квантование одним вызовом: цвета (...x3, uint8)"""
+        return self.colors(base_colors, self.quantize(self.intensity(points, normals, eye)))
@@ -0,0 +1,237 @@
+# lod.py
+import numpy as np
+
+# Доли треугольников исходной сетки для уровней детализации по умолчанию
+DEFAULT_LOD_RATIOS = (0.5, 0.25, 0.1)
+
+# Уровни грубее этого числа треугольников не строятся
+MIN_LOD_TRIANGLES = 16
+
+# Вес плоскостей, удерживающих границу сетки при упрощении
+BOUNDARY_WEIGHT = 100.0
+
+def _plane_quadrics(planes, weights):
+    """Квадрики плоскостей (a, b, c, d): weight * p p^T, массив Kx4x4"""
+    return weights[:, np.newaxis, np.newaxis] * planes[:, :, np.newaxis] * planes[:, np.newaxis, :]
+
+def _accumulate(quadrics, indices, count):
+    """Суммирование квадрик по вершинам (bincount по каждой компоненте)"""
+    flat = quadrics.reshape(len(quadrics), 16)
+    result = np.empty((count, 16))
+    for j in range(16):
+        result[:, j] = np.bincount(indices, weights=flat[:, j], minlength=count)
+    return result.reshape(count, 4, 4)
+
+def vertex_quadrics(positions, triangles):
+    """Квадрики ошибки вершин: сумма квадрик плоскостей смежных треугольников
+    
+    Плоскости взвешиваются площадью треугольника; вдоль границы сетки
+    добавляются перпендикулярные плоскости, чтобы граница не стягивалась.
+    """
+    v0, v1, v2 = (positions[triangles[:, j]] for j in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    areas = np.linalg.norm(normals, axis=1)
+    np.divide(normals, areas[:, np.newaxis], out=normals, where=areas[:, np.newaxis] > 0)
+    planes = np.column_stack([normals, -np.einsum('ij,ij->i', normals, v0)])
+    face_q = _plane_quadrics(planes, areas * 0.5)
+    
+    count = len(positions)
+    quadrics = sum(_accumulate(face_q, triangles[:, j], count) for j in range(3))
+    
+    # Граничные ребра принадлежат ровно одному треугольнику
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    owners = np.tile(np.arange(len(triangles)), 3)
+    _, inverse, counts = np.unique(_edge_keys(edges, count), return_inverse=True, return_counts=True)
+    boundary = counts[inverse] == 1
+    if boundary.any():
+        a = positions[edges[boundary, 0]]
+        b = positions[edges[boundary, 1]]
+        direction = b - a
+        side = np.cross(direction, normals[owners[boundary]])
+        lengths = np.linalg.norm(side, axis=1)
+        np.divide(side, lengths[:, np.newaxis], out=side, where=lengths[:, np.newaxis] > 0)
+        side_planes = np.column_stack([side, -np.einsum('ij,ij->i', side, a)])
+        side_q = _plane_quadrics(side_planes, BOUNDARY_WEIGHT * np.einsum('ij,ij->i', direction, direction))
+        quadrics += _accumulate(side_q, edges[boundary, 0], count)
+        quadrics += _accumulate(side_q, edges[boundary, 1], count)
+    return quadrics
+
+def _edge_keys(edges, vertex_count):
+    """Ключ ребра без учета направления: min * V + max"""
+    return np.minimum(edges[:, 0], edges[:, 1]) * vertex_count + np.maximum(edges[:, 0], edges[:, 1])
+
+def unique_edges(triangles, vertex_count):
+    """Уникальные ребра треугольников (Ex2, меньший индекс первым)"""
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    keys = np.unique(_edge_keys(edges, vertex_count))
+    return np.column_stack(np.divmod(keys, vertex_count))
+
+def collapse_targets(quadrics, positions, edges):
+    """Оптимальные точки стягивания ребер и их ошибка
+    
+    Точка минимизирует сумму квадрик концов ребра; если система вырождена
+    или решение уходит далеко от ребра, выбирается лучшая из середины и концов.
+    """
+    a, b = edges[:, 0], edges[:, 1]
+    q = quadrics[a] + quadrics[b]
+    pa, pb = positions[a], positions[b]
+    midpoint = (pa + pb) * 0.5
+    
+    targets = midpoint.copy()
+    det = np.linalg.det(q[:, :3, :3])
+    scale = np.einsum('ijj->i', q[:, :3, :3]) ** 3
+    solvable = np.abs(det) > 1e-9 * np.maximum(scale, 1e-30)
+    if solvable.any():
+        solved = np.linalg.solve(q[solvable, :3, :3], -q[solvable, :3, 3:4])[:, :, 0]
+        edge_len = np.linalg.norm(pb[solvable] - pa[solvable], axis=1)
+        near = np.linalg.norm(solved - midpoint[solvable], axis=1) <= edge_len
+        rows = np.flatnonzero(solvable)[near]
+        targets[rows] = solved[near]
+    
+    def error(points):
+        homogeneous = np.column_stack([points, np.ones(len(points))])
+        return np.einsum('ei,eij,ej->e', homogeneous, q, homogeneous)
+    
+    cost = error(targets)
+    fallback = ~solvable
+    if fallback.any():
+        for candidate in (pa, pb):
+            candidate_cost = error(candidate)
+            better = fallback & (candidate_cost < cost)
+            targets[better] = candidate[better]
+            cost[better] = candidate_cost[better]
+    return targets, np.maximum(cost, 0.0)
+
+def _select_matching(edges, cost, candidates, vertex_count, rounds=8):
+    """Ребра без общих вершин, близкие к жадному выбору по возрастанию ошибки
+    
+    В каждом раунде из ребер-кандидатов берутся самые дешевые для обоих
+    своих концов (при равной ошибке - с меньшим номером); затем ребра,
+    касающиеся выбранных вершин, исключаются, и раунд повторяется.
+    """
+    # Общий порядок ребер по ошибке, при равной ошибке - по номеру
+    rank = np.empty(len(edges), dtype=np.int64)
+    rank[np.lexsort((np.arange(len(edges)), cost))] = np.arange(len(edges))
+    
+    taken = np.zeros(vertex_count, dtype=bool)
+    available = candidates
+    selected = []
+    for _ in range(rounds):
+        a, b = edges[available, 0], edges[available, 1]
+        available_rank = rank[available]
+        best = np.full(vertex_count, len(edges), dtype=np.int64)
+        np.minimum.at(best, a, available_rank)
+        np.minimum.at(best, b, available_rank)
+        
+        mutual = available[(best[a] == available_rank) & (best[b] == available_rank)]
+        if len(mutual) == 0:
+            break
+        selected.append(mutual)
+        taken[edges[mutual, 0]] = True
+        taken[edges[mutual, 1]] = True
+        available = available[~(taken[a] | taken[b])]
+        if len(available) == 0:
+            break
+    return np.concatenate(selected) if selected else np.zeros(0, dtype=np.int64)
+
+def _reject_flips(positions, triangles, edges, chosen, targets):
+    """Разделение стягиваний на допустимые и переворачивающие треугольники
+    
+    Возвращает (допустимые, отклоненные) номера ребер.
+    """
+    vertex_edge = np.full(len(positions), -1, dtype=np.int64)
+    vertex_edge[edges[chosen, 0]] = chosen
+    vertex_edge[edges[chosen, 1]] = chosen
+    
+    touched = (vertex_edge[triangles] >= 0).any(axis=1)
+    local = triangles[touched]
+    remap = np.arange(len(positions))
+    remap[edges[chosen, 1]] = edges[chosen, 0]
+    moved = positions.copy()
+    moved[edges[chosen, 0]] = targets[chosen]
+    
+    new_local = remap[local]
+    survives = ((new_local[:, 0] != new_local[:, 1]) & (new_local[:, 1] != new_local[:, 2])
+                & (new_local[:, 2] != new_local[:, 0]))
+    old_n = np.cross(positions[local[:, 1]] - positions[local[:, 0]],
+                     positions[local[:, 2]] - positions[local[:, 0]])
+    new_n = np.cross(moved[new_local[:, 1]] - moved[new_local[:, 0]],
+                     moved[new_local[:, 2]] - moved[new_local[:, 0]])
+    # Треугольники, вырожденные уже до стягивания, не учитываются
+    flipped = survives & (np.einsum('ij,ij->i', old_n, new_n) <= 0) & old_n.any(axis=1)
+    if not flipped.any():
+        return chosen, chosen[:0]
+    
+    rejected = np.unique(vertex_edge[local[flipped]])
+    rejected = rejected[rejected >= 0]
+    return np.setdiff1d(chosen, rejected), rejected
+
+def simplify_mesh(positions, triangles, target_count, max_passes=200, max_retries=4):
+    """Упрощение треугольной сетки стягиванием ребер по квадрикам ошибки
+    
+    На каждом проходе ошибки всех ребер считаются векторно, затем
+    стягивается набор независимых самых дешевых ребер (не больше нужного
+    для достижения target_count). Возвращает новые массивы вершин и треугольников
+    (неиспользуемые вершины удаляются).
+    """
+    positions = np.array(positions, dtype=float)
+    triangles = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+    quadrics = vertex_quadrics(positions, triangles)
+    
+    for _ in range(max_passes):
+        if len(triangles) <= target_count:
+            break
+        
+        edges = unique_edges(triangles, len(positions))
+        targets, cost = collapse_targets(quadrics, positions, edges)
+        
+        # Каждое стягивание удаляет около двух треугольников; если все
+        # выбранные стягивания переворачивают грани, они исключаются из кандидатов
+        needed = max(1, (len(triangles) - target_count + 1) // 2)
+        candidates = np.arange(len(edges))
+        for _ in range(max_retries):
+            chosen = _select_matching(edges, cost, candidates, len(positions))
+            chosen, rejected = _reject_flips(positions, triangles, edges, chosen, targets)
+            if len(chosen) > needed:
+                chosen = chosen[np.argsort(cost[chosen], kind='stable')[:needed]]
+                chosen, _ = _reject_flips(positions, triangles, edges, chosen, targets)
+            if len(chosen) or len(rejected) == 0:
+                break
+            candidates = np.setdiff1d(candidates, rejected)
+        if len(chosen) == 0:
+            break
+        
+        keep, drop = edges[chosen, 0], edges[chosen, 1]
+        positions[keep] = targets[chosen]
+        quadrics[keep] += quadrics[drop]
+        remap = np.arange(len(positions))
+        remap[drop] = keep
+        triangles = remap[triangles]
+        valid = ((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+                 & (triangles[:, 2] != triangles[:, 0]))
+        triangles = triangles[valid]
+    
+    # Удаление неиспользуемых вершин
+    used = np.unique(triangles)
+    new_index = np.full(len(positions), -1, dtype=np.int64)
+    new_index[used] = np.arange(len(used))
+    return positions[used], new_index[triangles]
+
+def select_lod_levels(face_counts, budgets, current, hysteresis=0.25):
+    """Выбор уровней детализации с гистерезисом
+    
+    face_counts - число граней уровней по убыванию, budgets - допустимое
+    число граней для каждого объекта, current - текущие уровни. Переход на
+    более детальный уровень происходит, только если бюджет больше нужного с
+    запасом hysteresis, на более грубый - если он заметно меньше.
+    """
+    keys = -np.asarray(face_counts, dtype=float)
+    last = len(face_counts) - 1
+    budgets = np.asarray(budgets, dtype=float)
+    finer = np.minimum(np.searchsorted(keys, -budgets / (1 + hysteresis)), last)
+    coarser = np.minimum(np.searchsorted(keys, -budgets * (1 + hysteresis)), last)
+    
+    levels = np.asarray(current).copy()
+    levels = np.where(finer < levels, finer, levels)
+    levels = np.where(coarser > levels, coarser, levels)
+    return levels
@@ -2,11 +2,34 @@
 import numpy as np
 import pygame
 import sys
-from model_loader import load_obj
+import time
+from lod import DEFAULT_LOD_RATIOS
+from model_loader import ObjParseError, load_obj
 from renderer import Renderer
 from camera import Camera
+from hud import HudLayer, StaticOverlay, TextCache
+from mesh_cache import MeshCache
+from picking import pick
+from scene import ModelInstance, Scene, grid_matrices
 from transformations import *
 
+# Размер поля экземпляров (клавиша M): FIELD_SIZE x FIELD_SIZE копий модели
+FIELD_SIZE = 20
+
+# Частота цикла: после перерисовки кадра и в простое (ничего не менялось)
+ACTIVE_FPS = 60
+IDLE_FPS = 10
+
+def build_field(mesh, colors, size=FIELD_SIZE):
+    """Сцена из size x size экземпляров сетки; возвращает сцену и матрицы размещения"""
+    _, radius = mesh.get_bounding_sphere()
+    spacing = 6.0 / size
+    offsets = grid_matrices(size, size, spacing, 0.4 * spacing / max(radius, 1e-6))
+    palette = np.array(colors)
+    scene = Scene()
+    scene.extend(mesh, offsets, palette[np.arange(len(offsets)) % len(palette)])
+    return scene, offsets
+
 def main():
     # Инициализация Pygame
     pygame.init()
@@ -15,13 +38,17 @@ def main():
     pygame.display.set_caption("Миша мишенька медведь научи меня пердеть")
     clock = pygame.time.Clock()
     
-    # Загрузка модели
+    # Загрузка модели (разобранные сетки кэшируются в models/.mesh_cache)
+    mesh_cache = MeshCache(max_bytes=512 * 1024 * 1024)
     try:
-        model = load_obj("models/cube.obj")
-    except FileNotFoundError:
-        print("Model files not found. Creating default cube...")
+        model = load_obj("models/cube.obj", cache=mesh_cache, lod_ratios=DEFAULT_LOD_RATIOS)
+    except (FileNotFoundError, ObjParseError):
+        print("Model files not found or invalid. Creating default cube...")
         model = load_obj("default_cube")
     
+    # Экземпляр модели на сцене: вращение хранится в матрице модели
+    instance = ModelInstance(model)
+    
     # Создание камеры
     camera = Camera(
         position=Point(0, 0, 10),
@@ -33,6 +60,24 @@ def main():
     # Создание рендерера
     renderer = Renderer(WIDTH, HEIGHT)
     
+    # Профилировщик кадра (F3 - оверлей), выключен по умолчанию
+    profiler = renderer.profiler
+    
+    # Текст HUD: строки кэшируются, справка по клавишам собирается в одну
+    # поверхность и пересобирается только при переключении режимов
+    text = TextCache()
+    help_overlay = StaticOverlay(text, (200, 200, 200))
+    profiler_overlay = StaticOverlay(text, (255, 220, 120), line_height=20)
+    
+    # Сцена рендерится заново только при изменениях (клавиши, камера, углы,
+    # события окна); в остальных кадрах обновляются лишь изменившиеся строки HUD
+    hud = HudLayer(text, (WIDTH, HEIGHT))
+    scene_dirty = True
+    last_state = None
+    
+    # Вращение модели: матрица пересчитывается только при изменении углов
+    rotation_pipeline = TransformPipeline().rotate_y('angle_y').rotate_x('angle_x')
+    
     # Параметры вращения
     angle_x = 0
     angle_y = 0
@@ -42,18 +87,36 @@ def main():
     show_wireframe = True
     show_filled = True
     backface_culling = True
+    occlusion_culling = True
     show_normals = False
     
     # Отладочная информация
     debug_mode = False
     
+    # Режим поля экземпляров: сцена создается при включении и смене модели
+    field_mode = False
+    field_scene = None
+    field_offsets = None
+    
+    # Грань под курсором (RayHit или None) и положение курсора
+    hover_position = None
+    hover_moved = False
+    hover_hit = None
+    
     # Основной цикл
     running = True
     while running:
+        profiler.begin_frame()
+        events_start = time.perf_counter()
+        
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                scene_dirty = True
             elif event.type == pygame.KEYDOWN:
+                # Любая клавиша может изменить модель или режим отображения
+                scene_dirty = True
                 if event.key == pygame.K_w:
                     show_wireframe = not show_wireframe
                 elif event.key == pygame.K_f:
@@ -61,44 +124,68 @@ def main():
                 elif event.key == pygame.K_c:
                     backface_culling = not backface_culling
                     print(f"Back-face culling: {'ON' if backface_culling else 'OFF'}")
+                elif event.key == pygame.K_o:
+                    occlusion_culling = not occlusion_culling
+                    print(f"Occlusion culling: {'ON' if occlusion_culling else 'OFF'}")
+                elif event.key == pygame.K_b:
+                    print(f"Render mode: {renderer.next_mode().upper()}")
                 elif event.key == pygame.K_n:
                     show_normals = not show_normals
                     print(f"Normals visualization: {'ON' if show_normals else 'OFF'}")
                 elif event.key == pygame.K_1:
                     try:
-                        model = load_obj("models/cube.obj")
+                        model = load_obj("models/cube.obj", cache=mesh_cache, lod_ratios=DEFAULT_LOD_RATIOS)
                         print("Loaded cube")
                     except:
                         print("cube.obj not found, creating default cube")
                         model = load_obj("default_cube")
+                    instance.mesh = model
+                    if field_mode:
+                        field_scene, field_offsets = build_field(model, renderer.colors)
                 elif event.key == pygame.K_2:
                     try:
-                        model = load_obj("models/sphere.obj")
+                        model = load_obj("models/sphere.obj", cache=mesh_cache, lod_ratios=DEFAULT_LOD_RATIOS)
                         print("Loaded sphere")
                     except:
                         print("sphere.obj not found, loading cube instead")
                         model = load_obj("default_cube")
+                    instance.mesh = model
+                    if field_mode:
+                        field_scene, field_offsets = build_field(model, renderer.colors)
+                elif event.key == pygame.K_m:
+                    field_mode = not field_mode
+                    if field_mode:
+                        field_scene, field_offsets = build_field(model, renderer.colors)
+                    print(f"Instance field: {'ON' if field_mode else 'OFF'}")
                 elif event.key == pygame.K_UP:
-                    camera.position.y += 0.5
-                    camera.target.y += 0.5
+                    camera.move(0, 0.5, 0)
                 elif event.key == pygame.K_DOWN:
-                    camera.position.y -= 0.5
-                    camera.target.y -= 0.5
+                    camera.move(0, -0.5, 0)
                 elif event.key == pygame.K_LEFT:
-                    camera.position.x -= 0.5
-                    camera.target.x -= 0.5
+                    camera.move(-0.5, 0, 0)
                 elif event.key == pygame.K_RIGHT:
-                    camera.position.x += 0.5
-                    camera.target.x += 0.5
+                    camera.move(0.5, 0, 0)
+                elif event.key == pygame.K_p:
+                    camera.projection = 'perspective' if camera.projection == 'orthographic' else 'orthographic'
+                    print(f"Projection: {camera.projection.upper()}")
                 elif event.key == pygame.K_r:
                     angle_x = angle_y = 0
-                    camera.position = Point(0, 0, 10)
-                    camera.target = Point(0, 0, 0)
+                    camera.reset()
                     print("Reset rotation and camera")
                 elif event.key == pygame.K_s:
+                    # Сдвиг "запекается" в базовую сетку
                     shear_matrix = shearing_matrix(0.2, 0.1, 0, 0, 0, 0)
                     model.apply_transform(shear_matrix)
                     print("Applied shearing transformation")
+                elif event.key == pygame.K_g:
+                    print(f"Shading: {renderer.next_shading().upper()}")
+                elif event.key == pygame.K_l:
+                    renderer.lod_enabled = not renderer.lod_enabled
+                    print(f"Level of detail: {'ON' if renderer.lod_enabled else 'OFF'}")
+                elif event.key == pygame.K_F3:
+                    profiler.enabled = not profiler.enabled
+                    profiler.reset()
+                    print(f"Profiler: {'ON' if profiler.enabled else 'OFF'}")
                 elif event.key == pygame.K_v:
                     debug_mode = not debug_mode
                     print(f"Debug mode: {'ON' if debug_mode else 'OFF'}")
@@ -108,6 +195,17 @@ def main():
                     for i, face in enumerate(model.faces[:6]):  # Первые 6 граней
                         if face.normal:
                             print(f"Face {i}: normal = ({face.normal.x:.2f}, {face.normal.y:.2f}, {face.normal.z:.2f})")
+            elif event.type == pygame.MOUSEMOTION:
+                hover_position = event.pos
+                hover_moved = True
+                if event.buttons[0]:
+                    # Вращение камеры вокруг цели перетаскиванием мышью
+                    camera.orbit(-event.rel[0] * 0.5, event.rel[1] * 0.5)
+            elif event.type == pygame.WINDOWLEAVE:
+                hover_position = None
+                hover_moved = True
+        
+        profiler.record('events', time.perf_counter() - events_start)
         
         # Обработка непрерывных клавиш
         keys = pygame.key.get_pressed()
@@ -124,97 +222,133 @@ def main():
         
         # Приближение/отдаление (Q/E)
         if keys[pygame.K_q]:
-            direction = Point(
-                camera.target.x - camera.position.x,
-                camera.target.y - camera.position.y,
-                camera.target.z - camera.position.z
-            )
-            length = np.sqrt(direction.x**2 + direction.y**2 + direction.z**2)
-            if length > 0:
-                move_distance = 0.5
-                camera.position.x += (direction.x / length) * move_distance
-                camera.position.y += (direction.y / length) * move_distance
-                camera.position.z += (direction.z / length) * move_distance
-        
+            camera.zoom(0.5)
         if keys[pygame.K_e]:
-            direction = Point(
-                camera.target.x - camera.position.x,
-                camera.target.y - camera.position.y,
-                camera.target.z - camera.position.z
-            )
-            length = np.sqrt(direction.x**2 + direction.y**2 + direction.z**2)
-            if length > 0:
-                move_distance = 0.5
-                camera.position.x -= (direction.x / length) * move_distance
-                camera.position.y -= (direction.y / length) * move_distance
-                camera.position.z -= (direction.z / length) * move_distance
-        
-        # Создание матрицы вращения
-        rot_x = rotation_x_matrix(angle_x)
-        rot_y = rotation_y_matrix(angle_y)
-        rotation = composite_transformation(rot_y, rot_x)
-        
-        # Применение преобразований к модели
-        model_transformed = model.copy()
-        model_transformed.apply_transform(rotation)
-        
-        # Очистка экрана
-        screen.fill((30, 30, 40))
-        
-        # Рендеринг модели
-        renderer.render(
-            screen=screen,
-            model=model_transformed,
-            camera=camera,
-            show_wireframe=show_wireframe,
-            show_filled=show_filled,
-            backface_culling=backface_culling,
-            show_normals=show_normals
-        )
-        
-        # Отображение информации
-        font = pygame.font.Font(None, 24)
-        info = [
+            camera.zoom(-0.5)
+        
+        # Кадр перерисовывается только при изменении камеры, углов или после клавиш
+        state = (camera.version, angle_x, angle_y)
+        if state != last_state:
+            scene_dirty = True
+            last_state = state
+        
+        if scene_dirty:
+            # Создание матрицы вращения
+            rotation = rotation_pipeline(angle_y=angle_y, angle_x=angle_x)
+            
+            # Вращение задается матрицей модели, сетка не копируется
+            instance.model_matrix = rotation
+            if field_mode:
+                field_scene.batch(model).matrices[:] = field_offsets @ rotation
+        
+        # Грань под курсором: луч через иерархию объемов сетки пересчитывается
+        # при движении мыши и изменении сцены; кадр перерисовывается, только
+        # если подсвеченная грань сменилась
+        if hover_moved or scene_dirty:
+            hit = None
+            if hover_position is not None:
+                target = field_scene if field_mode else instance
+                hit = pick(target, camera, *hover_position, WIDTH, HEIGHT)
+            previous = None if hover_hit is None else (hover_hit.mesh, hover_hit.face, hover_hit.instance)
+            current = None if hit is None else (hit.mesh, hit.face, hit.instance)
+            if current != previous:
+                scene_dirty = True
+            hover_hit = hit
+            hover_moved = False
+        
+        if scene_dirty:
+            # Очистка экрана
+            screen.fill(renderer.background_color)
+            
+            # Рендеринг модели или поля ее экземпляров
+            if field_mode:
+                renderer.render_scene(
+                    screen=screen,
+                    scene=field_scene,
+                    camera=camera,
+                    show_wireframe=show_wireframe,
+                    show_filled=show_filled,
+                    backface_culling=backface_culling,
+                    occlusion_culling=occlusion_culling
+                )
+            else:
+                renderer.render(
+                    screen=screen,
+                    model=instance,
+                    camera=camera,
+                    show_wireframe=show_wireframe,
+                    show_filled=show_filled,
+                    backface_culling=backface_culling,
+                    show_normals=show_normals,
+                    occlusion_culling=occlusion_culling
+                )
+            if hover_hit is not None:
+                renderer.draw_highlight(screen, hover_hit, camera)
+            
+            # Кадр без HUD - фон для последующих частичных обновлений
+            hud.capture(screen)
+        
+        # Отображение информации: рисуются только изменившиеся элементы
+        hud_start = time.perf_counter()
+        help_overlay.update([
             f"W: Wireframe ({'ON' if show_wireframe else 'OFF'})",
             f"F: Filled ({'ON' if show_filled else 'OFF'})",
             f"C: Back-face culling ({'ON' if backface_culling else 'OFF'})",
+            f"O: Occlusion culling ({'ON' if occlusion_culling else 'OFF'})",
             f"N: Show normals ({'ON' if show_normals else 'OFF'})",
+            f"B: Render mode ({renderer.mode.upper()})",
+            f"G: Shading ({renderer.shading.upper()})",
             f"1/2: Load cube/sphere",
+            f"L: Level of detail ({'ON' if renderer.lod_enabled else 'OFF'})",
+            f"M: Instance field ({'ON' if field_mode else 'OFF'})",
             f"Arrows: Move camera",
             f"A/D/Z/X: Rotate object (HOLD)",
             f"R: Reset",
-            f"Projection: ORTHOGRAPHIC",
-        ]
-        
-        for i, text in enumerate(info):
-            text_surface = font.render(text, True, (200, 200, 200))
-            screen.blit(text_surface, (10, 10 + i * 25))
+            f"F3: Profiler ({'ON' if profiler.enabled else 'OFF'})",
+            f"P: Projection ({camera.projection.upper()})",
+            f"Mouse drag: Orbit camera",
+            f"Mouse hover: Pick face",
+        ])
+        hud.draw_overlay(screen, 'help', help_overlay, (10, 10))
         
         # Отображение углов вращения
         rotation_info = f"Rotation X: {angle_x:.1f}°, Y: {angle_y:.1f}°"
-        rotation_surface = font.render(rotation_info, True, (255, 255, 100))
-        screen.blit(rotation_surface, (WIDTH - 250, 10))
+        hud.draw_text(screen, 'rotation', rotation_info, (255, 255, 100), (WIDTH - 250, 10))
+        
+        hud.draw_text(screen, 'fps', f"FPS: {clock.get_fps():.0f}", (255, 255, 100), (WIDTH - 250, 60))
+        
+        # Грань под курсором и расстояние до нее
+        if hover_hit is not None:
+            hover_info = f"Face: {hover_hit.face}, distance: {hover_hit.distance:.2f}"
+        else:
+            hover_info = "Face: -"
+        hud.draw_text(screen, 'hover', hover_info, (255, 255, 0), (WIDTH - 250, HEIGHT - 60))
         
         # Отображение направления камеры
-        direction = Point(
-            camera.target.x - camera.position.x,
-            camera.target.y - camera.position.y,
-            camera.target.z - camera.position.z
-        )
-        length = np.sqrt(direction.x**2 + direction.y**2 + direction.z**2)
-        if length > 0:
-            direction.x /= length
-            direction.y /= length
-            direction.z /= length
-            
-            cam_dir_info = f"View dir: ({direction.x:.2f}, {direction.y:.2f}, {direction.z:.2f})"
-            cam_dir_surface = font.render(cam_dir_info, True, (100, 255, 255))
-            screen.blit(cam_dir_surface, (WIDTH - 250, 35))
+        direction = camera.get_forward()
+        if direction.any():
+            cam_dir_info = f"View dir: ({direction[0]:.2f}, {direction[1]:.2f}, {direction[2]:.2f})"
+            hud.draw_text(screen, 'view_dir', cam_dir_info, (100, 255, 255), (WIDTH - 250, 35))
+        
+        if profiler.enabled:
+            profiler_overlay.update(["Profiler p50 / p95 / p99"] + profiler.overlay_lines())
+            hud.draw_overlay(screen, 'profiler', profiler_overlay, (WIDTH - 330, 90))
+        profiler.record('main_hud', time.perf_counter() - hud_start)
+        
+        # Обновление экрана: весь кадр после рендеринга, иначе только области HUD
+        dirty_rects = hud.pop_dirty_rects()
+        with profiler.scope('present'):
+            if scene_dirty:
+                pygame.display.flip()
+            elif dirty_rects:
+                pygame.display.update(dirty_rects)
+        profiler.end_frame()
         
-        # Обновление экрана
-        pygame.display.flip()
-        clock.tick(60)
+        # В простое цикл замедляется до IDLE_FPS
+        clock.tick(ACTIVE_FPS if scene_dirty else IDLE_FPS)
+        scene_dirty = False
     
+    renderer.close()
     pygame.quit()
     sys.exit()
 
@@ -0,0 +1,242 @@
+# mesh_cache.py
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+from model_loader import Model3D
+from point import Point
+
+# Формат файла кэша: сигнатура, длина JSON-заголовка, заголовок, выровненные массивы
+CACHE_MAGIC = b'MSHCACHE'
+CACHE_VERSION = 3
+CACHE_SUFFIX = '.mesh'
+ALIGNMENT = 64
+
+# Массивы Model3D, сохраняемые в кэше (необязательные могут отсутствовать)
+MESH_ARRAYS = ('positions', 'face_indices', 'face_offsets', 'normals')
+OPTIONAL_ARRAYS = ('texcoords', 'texcoord_indices', 'vertex_normals', 'normal_indices')
+TOPOLOGY_ARRAYS = ('triangles', 'triangle_offsets', 'edges', 'corner_edges', 'smooth_normals')
+
+def file_content_hash(path, chunk_size=16 * 1024 * 1024):
+    """Хэш содержимого файла (BLAKE2b)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_signature(path):
+    """Описание исходного файла: абсолютный путь, размер, время изменения"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_cache_file(filename, arrays, meta):
+    """Запись массивов и метаданных в файл кэша (атомарно через временный файл)"""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    
+    header = json.dumps({'version': CACHE_VERSION, 'meta': meta, 'arrays': layout}).encode()
+    data_start = _align(len(CACHE_MAGIC) + 8 + len(header))
+    
+    temp_name = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_name, 'wb') as f:
+        f.write(CACHE_MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temp_name, filename)
+
+def read_cache_header(filename):
+    """Чтение заголовка файла кэша; None, если файл поврежден или другой версии"""
+    try:
+        with open(filename, 'rb') as f:
+            if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len))
+    except (OSError, ValueError, struct.error):
+        return None
+    if header.get('version') != CACHE_VERSION:
+        return None
+    header['data_start'] = _align(len(CACHE_MAGIC) + 8 + header_len)
+    return header
+
+def map_cache_file(filename, header, read_only=False):
+    """Отображение массивов файла кэша в память без копирования
+    
+    По умолчанию отображение копируется при записи (mode='c'): массивы
+    можно изменять, файл кэша при этом не меняется. read_only=True
+    отображает файл только для чтения.
+    """
+    buffer = np.memmap(filename, dtype=np.uint8, mode='r' if read_only else 'c')
+    arrays = {}
+    for name, info in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape'], dtype=np.int64))
+        start = header['data_start'] + info['offset']
+        raw = buffer[start:start + count * dtype.itemsize]
+        arrays[name] = raw.view(dtype).reshape(info['shape'])
+    return arrays
+
+class MeshCache:
+    """Двоичный кэш разобранных сеток с отображением в память
+    
+    Запись кэша соответствует исходному файлу по пути, размеру и времени
+    изменения; в заголовке также хранится хэш содержимого. По умолчанию
+    кэш хранится в каталоге .mesh_cache рядом с файлом модели.
+    max_bytes ограничивает размер каталога: давно не использованные записи
+    удаляются при добавлении новых.
+    """
+    
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+    
+    def directory_for(self, path):
+        """Каталог кэша для исходного файла"""
+        if self.cache_dir is not None:
+            return self.cache_dir
+        return os.path.join(os.path.dirname(os.path.abspath(path)), '.mesh_cache')
+    
+    def entry_path(self, path):
+        """Путь к записи кэша для текущей версии исходного файла"""
+        signature = source_signature(path)
+        key = hashlib.blake2b(
+            f"{signature['path']}|{signature['size']}|{signature['mtime_ns']}".encode(),
+            digest_size=16
+        ).hexdigest()
+        return os.path.join(self.directory_for(path), key + CACHE_SUFFIX)
+    
+    def load(self, path, verify_content=False, read_only=False):
+        """Загрузка модели из кэша; None, если записи нет или она устарела
+        
+        read_only=True - массивы модели только для чтения (см. map_cache_file).
+        """
+        entry = self.entry_path(path)
+        header = read_cache_header(entry)
+        if header is None:
+            return None
+        
+        meta = header['meta']
+        if meta['source'] != source_signature(path):
+            return None
+        if verify_content and meta['content_hash'] != file_content_hash(path):
+            self.invalidate(path)
+            return None
+        
+        arrays = map_cache_file(entry, header, read_only)
+        model = Model3D.from_arrays(
+            arrays['positions'], arrays['face_indices'], arrays['face_offsets'], arrays['normals']
+        )
+        for name in OPTIONAL_ARRAYS + TOPOLOGY_ARRAYS:
+            if name in arrays:
+                setattr(model, name, arrays[name])
+        model.groups = [tuple(group) for group in meta.get('groups', [])]
+        model.center = Point.from_array(meta['center'])
+        if meta.get('bounds') is not None:
+            model._bounds = tuple(np.array(corner, dtype=float) for corner in meta['bounds'])
+        
+        # Уровни детализации
+        for level in range(meta.get('lod_count', 0)):
+            lod = Model3D.from_arrays(*(arrays[f'lod{level}_{name}'] for name in MESH_ARRAYS))
+            lod.center = model.center.copy()
+            model.lods.append(lod)
+        model.lod_ratios = tuple(meta.get('lod_ratios', ()))
+        
+        # Время изменения записи служит меткой последнего использования для вытеснения
+        os.utime(entry)
+        return model
+    
+    def store(self, path, model):
+        """Сохранение модели в кэш; возвращает путь к записи"""
+        entry = self.entry_path(path)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        
+        model.get_triangles()
+        model.get_smooth_normals()
+        arrays = {name: getattr(model, name) for name in MESH_ARRAYS}
+        for name in OPTIONAL_ARRAYS + TOPOLOGY_ARRAYS:
+            if getattr(model, name, None) is not None:
+                arrays[name] = getattr(model, name)
+        for level, lod in enumerate(model.lods):
+            for name in MESH_ARRAYS:
+                arrays[f'lod{level}_{name}'] = getattr(lod, name)
+        
+        min_point, max_point = model.get_bounding_box()
+        meta = {
+            'source': source_signature(path),
+            'content_hash': file_content_hash(path),
+            'bounds': None if min_point is None else [min_point.to_array().tolist(), max_point.to_array().tolist()],
+            'groups': [list(group) for group in model.groups],
+            'center': model.center.to_array().tolist(),
+            'lod_count': len(model.lods),
+            'lod_ratios': list(model.lod_ratios),
+        }
+        write_cache_file(entry, arrays, meta)
+        
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes, directory=os.path.dirname(entry), keep=entry)
+        return entry
+    
+    def entries(self, directory):
+        """Список записей каталога кэша: (путь, размер, время использования)"""
+        if not os.path.isdir(directory):
+            return []
+        result = []
+        for name in os.listdir(directory):
+            if name.endswith(CACHE_SUFFIX):
+                full = os.path.join(directory, name)
+                st = os.stat(full)
+                result.append((full, st.st_size, st.st_mtime))
+        return result
+    
+    def invalidate(self, path):
+        """Удаление всех записей кэша для исходного файла (любых версий)"""
+        source = os.path.abspath(path)
+        removed = 0
+        for entry, _, _ in self.entries(self.directory_for(path)):
+            header = read_cache_header(entry)
+            if header is None or header['meta']['source']['path'] == source:
+                os.remove(entry)
+                removed += 1
+        return removed
+    
+    def clear(self, directory=None):
+        """Удаление всех записей каталога кэша"""
+        directory = directory or self.cache_dir
+        if directory is None:
+            raise ValueError("Cache directory is not specified")
+        for entry, _, _ in self.entries(directory):
+            os.remove(entry)
+    
+    def evict(self, max_bytes, directory=None, keep=None):
+        """Удаление давно не использованных записей, пока размер больше max_bytes"""
+        directory = directory or self.cache_dir
+        if directory is None:
+            raise ValueError("Cache directory is not specified")
+        entries = sorted(self.entries(directory), key=lambda item: item[2])
+        total = sum(size for _, size, _ in entries)
+        for entry, size, _ in entries:
+            if total <= max_bytes:
+                break
+            if entry == keep:
+                continue
+            os.remove(entry)
+            total -= size
+        return total
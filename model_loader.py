@@ -1,6 +1,14 @@
 # model_loader.py
+import os
 import numpy as np
-from point import Point
+from point import Point, PointArray, PointView
+from bvh import BVH
+from lod import MIN_LOD_TRIANGLES, simplify_mesh
+from obj_parser import ObjParseError, parse_obj
+from triangulation import extract_edges, newell_normals, triangulate_faces
+from transformations import (
+    is_affine, normal_matrix, transform_normals_array, transform_points_array
+)
 
 class Face:
     def __init__(self, vertex_indices, normal=None):
@@ -17,17 +25,12 @@ class Face:
         return Face(self.vertex_indices.copy(), normal_copy)
     
     def calculate_normal(self, vertices):
-        """Вычисление нормали грани по вершинам"""
+        """Вычисление нормали грани по всем вершинам (формула Ньюэлла)"""
         if len(self.vertex_indices) < 3:
             return None
         
-        v0 = vertices[self.vertex_indices[0]].to_array()
-        v1 = vertices[self.vertex_indices[1]].to_array()
-        v2 = vertices[self.vertex_indices[2]].to_array()
-        
-        edge1 = v1 - v0
-        edge2 = v2 - v0
-        normal_vec = np.cross(edge1, edge2)
+        corners = np.array([vertices[i].to_array() for i in self.vertex_indices])
+        normal_vec = np.cross(corners, np.roll(corners, -1, axis=0)).sum(axis=0)
         
         # Нормализация
         norm = np.linalg.norm(normal_vec)
@@ -37,148 +40,449 @@ class Face:
         self.normal = Point.from_array(normal_vec)
         return self.normal
 
+class FaceView(Face):
+    """Грань-представление записи в упакованных массивах модели"""
+    
+    def __init__(self, face_indices, face_offsets, normals, index):
+        self._face_indices = face_indices
+        self._face_offsets = face_offsets
+        self._normals = normals
+        self._index = index
+        self.color = (100, 150, 200)
+    
+    @property
+    def vertex_indices(self):
+        start = self._face_offsets[self._index]
+        end = self._face_offsets[self._index + 1]
+        return self._face_indices[start:end]
+    
+    @property
+    def normal(self):
+        return PointView(self._normals, self._index)
+    
+    @normal.setter
+    def normal(self, value):
+        if value is None:
+            self._normals[self._index] = 0.0
+        else:
+            self._normals[self._index] = (value.x, value.y, value.z)
+    
+    def copy(self):
+        """Создание независимой копии грани"""
+        return Face([int(i) for i in self.vertex_indices], self.normal.copy())
+
+class FaceList:
+    """Последовательность граней-представлений над упакованными массивами"""
+    
+    def __init__(self, face_indices, face_offsets, normals):
+        self._face_indices = face_indices
+        self._face_offsets = face_offsets
+        self._normals = normals
+    
+    def __len__(self):
+        return len(self._face_offsets) - 1
+    
+    def _view(self, index):
+        return FaceView(self._face_indices, self._face_offsets, self._normals, index)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._view(i) for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("face index out of range")
+        return self._view(index)
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._view(i)
+
+def pack_faces(faces):
+    """Упаковка списков индексов граней в плоский массив индексов и смещений"""
+    sizes = np.fromiter((len(f) for f in faces), dtype=np.int64, count=len(faces))
+    face_offsets = np.zeros(len(faces) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=face_offsets[1:])
+    if len(faces):
+        face_indices = np.concatenate([np.asarray(f, dtype=np.int32) for f in faces])
+    else:
+        face_indices = np.zeros(0, dtype=np.int32)
+    return face_indices, face_offsets
+
+def face_corner_indices(face_offsets, face_ids):
+    """Позиции углов выбранных граней в упакованном массиве индексов"""
+    starts = face_offsets[face_ids]
+    sizes = face_offsets[face_ids + 1] - starts
+    shift = np.repeat(starts - (np.cumsum(sizes) - sizes), sizes)
+    return np.arange(int(sizes.sum()), dtype=np.int64) + shift
+
+def compute_face_normals(positions, face_indices, face_offsets):
+    """Вычисление нормалей всех граней, взвешенных по площади (формула Ньюэлла)
+    
+    Для неплоских граней это средняя нормаль по всем вершинам, а не
+    нормаль плоскости первых трех.
+    """
+    normals = newell_normals(positions, face_indices, face_offsets)
+    
+    # Нормализация (вырожденные грани остаются нулевыми)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    return normals
+
+def compute_vertex_normals(positions, face_indices, face_offsets):
+    """Нормали вершин для сглаженного освещения (Nx3)
+    
+    Нормаль вершины - сумма ненормированных нормалей Ньюэлла прилежащих
+    граней, то есть среднее с весом по площади, после нормализации.
+    """
+    face_normals = newell_normals(positions, face_indices, face_offsets)
+    corner_normals = np.repeat(face_normals, np.diff(face_offsets), axis=0)
+    normals = np.column_stack([
+        np.bincount(face_indices, weights=corner_normals[:, axis], minlength=len(positions))
+        for axis in range(3)
+    ]).reshape(-1, 3)
+    
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    return normals
+
 class Model3D:
     def __init__(self, vertices=None, faces=None):
-        self.vertices = vertices if vertices is not None else []
-        self.faces = faces if faces is not None else []
+        """Создание модели из списков Point/Face (см. также from_arrays)"""
+        vertices = vertices if vertices is not None else []
+        faces = faces if faces is not None else []
+        
+        self.positions = np.array(
+            [(v.x, v.y, v.z) for v in vertices], dtype=float
+        ).reshape(-1, 3)
+        self.face_indices, self.face_offsets = pack_faces([f.vertex_indices for f in faces])
+        
+        if faces and all(f.normal is not None for f in faces):
+            self.normals = np.array(
+                [(f.normal.x, f.normal.y, f.normal.z) for f in faces], dtype=float
+            )
+        elif faces:
+            self.normals = compute_face_normals(self.positions, self.face_indices, self.face_offsets)
+        else:
+            self.normals = np.zeros((0, 3), dtype=float)
+        
+        # Дополнительные данные .obj: текстурные координаты и нормали vn
+        # с индексами по углам граней (-1 - не указан), группы g/o
+        self.texcoords = None
+        self.texcoord_indices = None
+        self.vertex_normals = None
+        self.normal_indices = None
+        self.groups = []
+        
         self.center = Point(0, 0, 0)
+        
+        # Уровни детализации (от подробного к грубому) без самой модели и их доли
+        self.lods = []
+        self.lod_ratios = ()
+        
+        # Разбиение граней на треугольники и уникальные ребра (см. build_topology)
+        self.triangles = None
+        self.triangle_offsets = None
+        self.edges = None
+        self.corner_edges = None
+        
+        # Нормали вершин для освещения по Гуро (см. build_topology); не путать
+        # с нормалями vn из файла, которые индексируются по углам граней
+        self.smooth_normals = None
+        
+        # Кэш границ и иерархии объемов (сбрасывается при изменении вершин)
+        self._bounds = None
+        self._bounding_sphere = None
+        self._bvh = None
+    
+    @classmethod
+    def from_arrays(cls, positions, face_indices, face_offsets, normals=None):
+        """Создание модели напрямую из массивов (без промежуточных объектов)"""
+        model = cls()
+        model.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        model.face_indices = np.asarray(face_indices, dtype=np.int32)
+        model.face_offsets = np.asarray(face_offsets, dtype=np.int64)
+        if normals is None:
+            normals = compute_face_normals(model.positions, model.face_indices, model.face_offsets)
+        model.normals = np.asarray(normals, dtype=float).reshape(-1, 3)
+        return model
+    
+    @property
+    def vertices(self):
+        """Вершины в виде PointArray над массивом позиций (без копирования)"""
+        return PointArray(self.positions)
+    
+    @property
+    def faces(self):
+        """Грани в виде последовательности Face (представления массивов)"""
+        return FaceList(self.face_indices, self.face_offsets, self.normals)
+    
+    @property
+    def lod_face_counts(self):
+        """Число граней модели и каждого уровня детализации"""
+        return [len(self.face_offsets) - 1] + [len(level.face_offsets) - 1 for level in self.lods]
+    
+    def build_topology(self):
+        """Предварительная обработка при загрузке: треугольники, ребра, нормали вершин
+        
+        triangles (Tx3) и triangle_offsets (F + 1) - разбиение граней на
+        треугольники (невыпуклые - отсечением ушей); edges (Ex2) - уникальные
+        ребра граней, corner_edges - номер ребра каждого угла грани;
+        smooth_normals (Nx3) - нормали вершин с весом по площади граней.
+        """
+        self.triangles, self.triangle_offsets = triangulate_faces(
+            self.positions, self.face_indices, self.face_offsets, self.normals
+        )
+        self.edges, self.corner_edges = extract_edges(
+            self.face_indices, self.face_offsets, len(self.positions)
+        )
+        self.smooth_normals = compute_vertex_normals(self.positions, self.face_indices, self.face_offsets)
+    
+    def get_triangles(self):
+        """Треугольники граней и их смещения (строятся при первом обращении)"""
+        if self.triangles is None:
+            self.build_topology()
+        return self.triangles, self.triangle_offsets
+    
+    def get_edges(self):
+        """Уникальные ребра и номера ребер углов граней (строятся при первом обращении)"""
+        if self.edges is None:
+            self.build_topology()
+        return self.edges, self.corner_edges
+    
+    def get_smooth_normals(self):
+        """Нормали вершин с весом по площади (вычисляются при первом обращении)"""
+        if self.smooth_normals is None:
+            self.smooth_normals = compute_vertex_normals(self.positions, self.face_indices, self.face_offsets)
+        return self.smooth_normals
+    
+    @property
+    def triangle_faces(self):
+        """Номер исходной грани для каждого треугольника"""
+        _, triangle_offsets = self.get_triangles()
+        return np.repeat(np.arange(len(triangle_offsets) - 1), np.diff(triangle_offsets))
+    
+    def lod_level(self, level):
+        """Сетка уровня детализации (0 - сама модель)"""
+        return self if level == 0 else self.lods[level - 1]
+    
+    @property
+    def face_sizes(self):
+        """Количество вершин в каждой грани"""
+        return np.diff(self.face_offsets)
     
     def __str__(self):
-        return f"Model3D({len(self.vertices)} vertices, {len(self.faces)} faces)"
+        return f"Model3D({len(self.positions)} vertices, {len(self.face_offsets) - 1} faces)"
     
     def copy(self):
         """Создание глубокой копии модели"""
-        new_vertices = [v.copy() for v in self.vertices]
-        new_faces = [f.copy() for f in self.faces]
-        return Model3D(new_vertices, new_faces)
+        model = Model3D.from_arrays(
+            self.positions.copy(),
+            self.face_indices.copy(),
+            self.face_offsets.copy(),
+            self.normals.copy()
+        )
+        if self.texcoords is not None:
+            model.texcoords = self.texcoords.copy()
+            model.texcoord_indices = self.texcoord_indices.copy()
+        if self.vertex_normals is not None:
+            model.vertex_normals = self.vertex_normals.copy()
+            model.normal_indices = self.normal_indices.copy()
+        model.groups = list(self.groups)
+        model.center = self.center.copy()
+        model.lods = [level.copy() for level in self.lods]
+        model.lod_ratios = self.lod_ratios
+        return model
     
     def apply_transform(self, matrix):
         """Применение матрицы преобразования к модели"""
-        # Преобразование вершин
-        for vertex in self.vertices:
-            vertex.transform(matrix)
+        # Преобразование всех вершин одним умножением
+        self.positions = transform_points_array(self.positions, matrix)
         
-        # Пересчет нормалей
-        for face in self.faces:
-            face.calculate_normal(self.vertices)
+        # Нормали: для аффинных матриц - через обратную транспонированную,
+        # иначе пересчет по геометрии
+        normal_mat = normal_matrix(matrix) if is_affine(matrix) else None
+        if normal_mat is not None:
+            self.normals = transform_normals_array(self.normals, normal_mat)
+        else:
+            self.normals = compute_face_normals(self.positions, self.face_indices, self.face_offsets)
+        if self.smooth_normals is not None:
+            if normal_mat is not None:
+                self.smooth_normals = transform_normals_array(self.smooth_normals, normal_mat)
+            else:
+                self.smooth_normals = None
         
-        # Обновление центра
+        # Нормали vn из файла: при невырожденной аффинной матрице преобразуются, иначе сбрасываются
+        if self.vertex_normals is not None:
+            if normal_mat is not None:
+                self.vertex_normals = transform_normals_array(self.vertex_normals, normal_mat)
+            else:
+                self.vertex_normals = None
+                self.normal_indices = None
+        
+        for level in self.lods:
+            level.apply_transform(matrix)
+        
+        # Обновление центра и границ; иерархия объемов перестраивает только границы узлов
         self.update_center()
+        self.invalidate_bounds()
+        if self._bvh is not None:
+            self._bvh.refit(self.positions, self.face_indices, self.face_offsets)
     
     def update_center(self):
         """Вычисление центра модели"""
-        if not self.vertices:
+        if len(self.positions) == 0:
             self.center = Point(0, 0, 0)
             return
         
-        sum_x = sum_y = sum_z = 0.0
-        for vertex in self.vertices:
-            sum_x += vertex.x
-            sum_y += vertex.y
-            sum_z += vertex.z
-        
-        self.center = Point(
-            sum_x / len(self.vertices),
-            sum_y / len(self.vertices),
-            sum_z / len(self.vertices)
-        )
+        self.center = Point.from_array(self.positions.mean(axis=0))
+    
+    def invalidate_bounds(self):
+        """Сброс кэшированных границ после изменения массива вершин"""
+        self._bounds = None
+        self._bounding_sphere = None
+    
+    def get_bounds(self):
+        """Ограничивающий параллелепипед в виде массивов (min, max); кэшируется"""
+        if self._bounds is None:
+            if len(self.positions) == 0:
+                return None, None
+            self._bounds = (self.positions.min(axis=0), self.positions.max(axis=0))
+        return self._bounds
+    
+    def get_bounding_sphere(self):
+        """Ограничивающая сфера (центр - массив 3, радиус); кэшируется"""
+        if self._bounding_sphere is None:
+            min_corner, max_corner = self.get_bounds()
+            if min_corner is None:
+                return None, 0.0
+            center = (min_corner + max_corner) * 0.5
+            radius = float(np.sqrt(((self.positions - center) ** 2).sum(axis=1).max()))
+            self._bounding_sphere = (center, radius)
+        return self._bounding_sphere
+    
+    def get_bvh(self):
+        """Иерархия ограничивающих объемов граней (строится при первом обращении)"""
+        if self._bvh is None:
+            self._bvh = BVH.build(self.positions, self.face_indices, self.face_offsets)
+        return self._bvh
     
     def get_bounding_box(self):
         """Получение ограничивающего параллелепипеда"""
-        if not self.vertices:
+        min_corner, max_corner = self.get_bounds()
+        if min_corner is None:
             return None, None
         
-        min_point = Point(float('inf'), float('inf'), float('inf'))
-        max_point = Point(float('-inf'), float('-inf'), float('-inf'))
-        
-        for vertex in self.vertices:
-            min_point.x = min(min_point.x, vertex.x)
-            min_point.y = min(min_point.y, vertex.y)
-            min_point.z = min(min_point.z, vertex.z)
-            
-            max_point.x = max(max_point.x, vertex.x)
-            max_point.y = max(max_point.y, vertex.y)
-            max_point.z = max(max_point.z, vertex.z)
-        
-        return min_point, max_point
+        return Point.from_array(min_corner), Point.from_array(max_corner)
 
-def load_obj(filename):
-    """Загружает модель из файла .obj"""
+def build_lod_chain(model, ratios):
+    """Построение уровней детализации упрощением по квадрикам ошибки
+    
+    ratios - доли треугольников исходной сетки; каждый уровень получается
+    упрощением предыдущего. Уровни, не уменьшающие число граней, пропускаются,
+    уровни меньше MIN_LOD_TRIANGLES треугольников не строятся.
+    """
+    triangles, _ = model.get_triangles()
+    triangle_count = len(triangles)
+    positions = model.positions
+    
+    lods = []
+    for ratio in sorted(ratios, reverse=True):
+        target = int(triangle_count * ratio)
+        if target < MIN_LOD_TRIANGLES:
+            break
+        positions, triangles = simplify_mesh(positions, triangles, target)
+        previous = len(lods[-1].face_offsets) - 1 if lods else len(model.face_offsets) - 1
+        if len(triangles) >= previous:
+            continue
+        level = Model3D.from_arrays(
+            positions,
+            triangles.ravel().astype(np.int32),
+            np.arange(0, 3 * len(triangles) + 1, 3, dtype=np.int64)
+        )
+        level.center = model.center.copy()
+        lods.append(level)
+    
+    model.lods = lods
+    model.lod_ratios = tuple(ratios)
+    return lods
+
+def load_obj(filename, progress=None, cache=None, lod_ratios=None):
+    """Загружает модель из файла .obj
+    
+    progress(bytes_read, total_bytes) - необязательный обратный вызов прогресса.
+    cache - MeshCache: при наличии актуальной записи модель отображается
+    из двоичного кэша, иначе разбирается и сохраняется в кэш.
+    lod_ratios - доли граней уровней детализации (см. build_lod_chain);
+    уровни сохраняются в кэше вместе с моделью.
+    При ошибке формата выбрасывается ObjParseError.
+    """
     if filename == "default_cube":
         return create_cube()
     
-    vertices = []
-    faces = []
+    if cache is not None and os.path.exists(filename):
+        model = cache.load(filename)
+        if model is not None:
+            print(f"Loaded {filename} from cache: {len(model.positions)} vertices, "
+                  f"{len(model.face_offsets) - 1} faces")
+            if lod_ratios and tuple(lod_ratios) != model.lod_ratios:
+                build_lod_chain(model, lod_ratios)
+                cache.store(filename, model)
+            return model
     
     try:
-        with open(filename, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                
-                parts = line.split()
-                if not parts:
-                    continue
-                
-                if parts[0] == 'v':
-                    # Вершина
-                    if len(parts) >= 4:
-                        vertex = Point(float(parts[1]), float(parts[2]), float(parts[3]))
-                        vertices.append(vertex)
-                
-                elif parts[0] == 'f':
-                    # Грань
-                    vertex_indices = []
-                    for part in parts[1:]:
-                        # Разделяем по '/'
-                        indices = part.split('/')
-                        # Индекс вершин в OBJ начинается с 1
-                        vertex_idx = int(indices[0]) - 1
-                        if vertex_idx >= 0 and vertex_idx < len(vertices):
-                            vertex_indices.append(vertex_idx)
-                    
-                    if len(vertex_indices) >= 3:
-                        face = Face(vertex_indices)
-                        faces.append(face)
-        
-        # Вычисление нормалей
-        for face in faces:
-            face.calculate_normal(vertices)
-        
-        model = Model3D(vertices, faces)
-        model.update_center()
-        
-        print(f"Loaded {filename}: {len(vertices)} vertices, {len(faces)} faces")
-        return model
-    
+        data = parse_obj(filename, progress)
     except FileNotFoundError:
         print(f"File {filename} not found")
         raise
-    except Exception as e:
-        print(f"Error loading {filename}: {e}")
-        return create_cube()
+    except ObjParseError as e:
+        print(f"Error loading {e}")
+        raise
+    
+    # Вычисление нормалей
+    model = Model3D.from_arrays(data.positions, data.face_vertices, data.face_offsets)
+    if len(data.texcoords) and (data.face_texcoords >= 0).any():
+        model.texcoords = data.texcoords
+        model.texcoord_indices = data.face_texcoords
+    if len(data.normals) and (data.face_normals >= 0).any():
+        model.vertex_normals = data.normals
+        model.normal_indices = data.face_normals
+    model.groups = data.objects + data.groups
+    model.update_center()
+    model.build_topology()
+    if lod_ratios:
+        build_lod_chain(model, lod_ratios)
+    
+    stats = data.stats
+    print(
+        f"Loaded {filename}: {len(model.positions)} vertices, {len(model.face_offsets) - 1} faces "
+        f"({stats['seconds']:.3f} s, {stats['bytes_per_second'] / 1e6:.1f} MB/s)"
+    )
+    
+    if cache is not None:
+        cache.store(filename, model)
+    return model
 
 def create_cube():
     """Создает куб для тестирования"""
-    vertices = [
-        Point(-1, -1, -1), Point(1, -1, -1), Point(1, 1, -1), Point(-1, 1, -1),
-        Point(-1, -1, 1),  Point(1, -1, 1),  Point(1, 1, 1),  Point(-1, 1, 1)
-    ]
+    positions = np.array([
+        (-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1),
+        (-1, -1, 1),  (1, -1, 1),  (1, 1, 1),  (-1, 1, 1)
+    ], dtype=float)
     
     faces = [
-        Face([0, 3, 2, 1]),  # задняя
-        Face([4, 5, 6, 7]),  # передняя
-        Face([0, 4, 7, 3]),  # левая
-        Face([1, 2, 6, 5]),  # правая
-        Face([0, 1, 5, 4]),  # нижняя
-        Face([2, 3, 7, 6])   # верхняя
+        [0, 3, 2, 1],  # задняя
+        [4, 5, 6, 7],  # передняя
+        [0, 4, 7, 3],  # левая
+        [1, 2, 6, 5],  # правая
+        [0, 1, 5, 4],  # нижняя
+        [2, 3, 7, 6]   # верхняя
     ]
+    face_indices, face_offsets = pack_faces(faces)
     
     # Вычисление нормалей
-    for face in faces:
-        face.calculate_normal(vertices)
-    
-    model = Model3D(vertices, faces)
+    model = Model3D.from_arrays(positions, face_indices, face_offsets)
     model.update_center()
-    return model
\ No newline at end of file
+    model.build_topology()
+    return model
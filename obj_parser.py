@@ -0,0 +1,303 @@
+# obj_parser.py
+import os
+import time
+import warnings
+from itertools import chain, compress, repeat
+import numpy as np
+
+# Размер блока чтения файла
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+class ObjParseError(ValueError):
+    """Ошибка разбора файла .obj (с именем файла и номером строки)"""
+    
+    def __init__(self, filename, line_number, message):
+        self.filename = filename
+        self.line_number = line_number
+        location = f"{filename}:{line_number}" if line_number else filename
+        super().__init__(f"{location}: {message}")
+
+class ObjData:
+    """Результат разбора .obj в виде массивов
+    
+    positions (Nx3), texcoords (Tx2), normals (Mx3) - данные записей v/vt/vn;
+    face_offsets (F+1) и face_vertices/face_texcoords/face_normals (K) -
+    упакованные индексы углов граней (с нуля, -1 если индекс не указан);
+    groups/objects - списки (имя, индекс первой грани) для записей g/o.
+    """
+    
+    def __init__(self):
+        self.positions = np.zeros((0, 3), dtype=float)
+        self.texcoords = np.zeros((0, 2), dtype=float)
+        self.normals = np.zeros((0, 3), dtype=float)
+        self.face_offsets = np.zeros(1, dtype=np.int64)
+        self.face_vertices = np.zeros(0, dtype=np.int32)
+        self.face_texcoords = np.zeros(0, dtype=np.int32)
+        self.face_normals = np.zeros(0, dtype=np.int32)
+        self.groups = []
+        self.objects = []
+        self.stats = {}
+
+def _parse_floats(buffer, count):
+    """Быстрое преобразование текста в массив float; None при ошибке формата"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(buffer, dtype=np.float64, sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+    if count == 0 or len(values) % count:
+        return None
+    return values.reshape(count, -1)
+
+def _parse_ints(buffer):
+    """Быстрое преобразование текста в массив int; None при ошибке формата"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            return np.fromstring(buffer, dtype=np.int64, sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+
+class _ChunkParser:
+    """Накопление данных .obj по блокам строк"""
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self.line_number = 0
+        self.positions = []
+        self.texcoords = []
+        self.normals = []
+        self.face_sizes = []
+        self.corners = []
+        self.vertex_count = 0
+        self.texcoord_count = 0
+        self.normal_count = 0
+        self.face_count = 0
+        self.groups = []
+        self.objects = []
+    
+    def error(self, line_index, message):
+        raise ObjParseError(self.filename, self.line_number + line_index + 1, message)
+    
+    def parse_vectors(self, lines, mask, keyword, width):
+        """Разбор записей v/vt/vn одним вызовом numpy"""
+        selected = list(compress(lines, mask))
+        if not selected:
+            return np.zeros((0, width))
+        
+        prefix = keyword + b' '
+        buffer = b' '.join(selected).replace(prefix, b' ')
+        values = _parse_floats(buffer, len(selected))
+        # Число компонент сверяется в каждой строке по числу пробелов (v может
+        # содержать w или цвет); лишние пробелы уводят на медленный путь
+        if values is not None and values.shape[1] >= width:
+            separators = np.fromiter(map(bytes.count, selected, repeat(b' ')), dtype=np.int64, count=len(selected))
+            if np.all(separators == values.shape[1]):
+                return values[:, :width]
+        
+        # Медленный путь: строки с разным числом компонент или ошибкой
+        result = np.zeros((len(selected), width))
+        line_indices = np.flatnonzero(mask)
+        for k, line in enumerate(selected):
+            parts = line.split()[1:]
+            try:
+                values = [float(p) for p in parts]
+            except ValueError:
+                self.error(line_indices[k], f"invalid number in '{line.decode(errors='replace')}'")
+            if len(values) < width:
+                # vt может содержать только u
+                if keyword == b'vt' and values:
+                    values += [0.0] * (width - len(values))
+                else:
+                    self.error(line_indices[k], f"expected {width} components")
+            result[k] = values[:width]
+        return result
+    
+    def parse_faces(self, lines, mask, v_before, vt_before, vn_before):
+        """Разбор записей f: триплеты v/vt/vn, отрицательные индексы, n-угольники"""
+        selected = list(compress(lines, mask))
+        if not selected:
+            return
+        line_indices = np.flatnonzero(mask)
+        
+        split_lines = [line.split() for line in selected]
+        sizes = np.fromiter((len(parts) - 1 for parts in split_lines), dtype=np.int64, count=len(split_lines))
+        tokens = list(chain.from_iterable(parts[1:] for parts in split_lines))
+        corners = self.parse_corner_tokens(tokens)
+        if corners is None:
+            # Смешанные форматы углов - разбор по одному
+            corners = np.zeros((len(tokens), 3), dtype=np.int64)
+            corner_lines = np.repeat(line_indices, sizes)
+            for k, token in enumerate(tokens):
+                parts = token.split(b'/')
+                try:
+                    for j, part in enumerate(parts[:3]):
+                        corners[k, j] = int(part) if part else 0
+                except ValueError:
+                    self.error(corner_lines[k], f"invalid face index '{token.decode(errors='replace')}'")
+        
+        # Разрешение относительных (отрицательных) индексов и переход к отсчету с нуля
+        counts = (v_before, vt_before, vn_before)
+        resolved = np.empty_like(corners)
+        for j in range(3):
+            column = corners[:, j]
+            before = np.repeat(counts[j], sizes)
+            resolved[:, j] = np.where(column < 0, before + column, column - 1)
+            missing = column == 0
+            if j == 0:
+                bad = missing | (resolved[:, 0] < 0) | (resolved[:, 0] >= before)
+            else:
+                resolved[missing, j] = -1
+                bad = ~missing & ((resolved[:, j] < 0) | (resolved[:, j] >= before))
+            if bad.any():
+                corner = int(np.flatnonzero(bad)[0])
+                face = int(np.searchsorted(np.cumsum(sizes), corner, side='right'))
+                self.error(line_indices[face], "face index out of range")
+        
+        # Грани меньше чем из трех вершин пропускаются
+        keep = sizes >= 3
+        if not keep.all():
+            resolved = resolved[np.repeat(keep, sizes)]
+            sizes = sizes[keep]
+        
+        self.face_sizes.append(sizes)
+        self.corners.append(resolved)
+        return keep
+    
+    @staticmethod
+    def parse_corner_tokens(tokens):
+        """Векторный разбор углов граней одного формата (v, v/vt, v//vn, v/vt/vn)"""
+        if not tokens:
+            return np.zeros((0, 3), dtype=np.int64)
+        
+        # Формат сверяется в каждом углу по числу '/': смешанные форматы
+        # разбираются по одному
+        slashes = np.fromiter(map(bytes.count, tokens, repeat(b'/')), dtype=np.int64, count=len(tokens))
+        width = int(slashes[0]) + 1
+        if width > 3 or np.any(slashes != slashes[0]):
+            return None
+        buffer = b' '.join(tokens)
+        if width == 2 and b'//' in buffer:
+            return None
+        if width == 3:
+            buffer = buffer.replace(b'//', b'/0/')
+        
+        values = _parse_ints(buffer.replace(b'/', b' '))
+        if values is None or len(values) != width * len(tokens):
+            return None
+        
+        corners = np.zeros((len(tokens), 3), dtype=np.int64)
+        corners[:, :width] = values.reshape(-1, width)
+        return corners
+    
+    def feed(self, data):
+        """Разбор блока целых строк"""
+        data = data.replace(b'\t', b' ').replace(b'\r', b'')
+        lines = data.split(b'\n')
+        if b'\n ' in data or data.startswith(b' '):
+            lines = [line.lstrip() for line in lines]
+        
+        # Типы записей по первым двум байтам строки
+        kinds = np.array([line[:2] for line in lines], dtype='S2')
+        is_v = kinds == b'v '
+        is_vt = kinds == b'vt'
+        is_vn = kinds == b'vn'
+        is_f = kinds == b'f '
+        is_group = (kinds == b'g ') | (kinds == b'o ')
+        
+        positions = self.parse_vectors(lines, is_v, b'v', 3)
+        texcoords = self.parse_vectors(lines, is_vt, b'vt', 2)
+        normals = self.parse_vectors(lines, is_vn, b'vn', 3)
+        
+        # Количество вершин, объявленных до каждой строки грани
+        face_lines = np.flatnonzero(is_f)
+        v_before = self.vertex_count + np.cumsum(is_v)[face_lines]
+        vt_before = self.texcoord_count + np.cumsum(is_vt)[face_lines]
+        vn_before = self.normal_count + np.cumsum(is_vn)[face_lines]
+        keep = self.parse_faces(lines, is_f, v_before, vt_before, vn_before)
+        
+        # Группы и объекты: индекс первой грани после записи
+        if is_group.any():
+            kept_before = np.cumsum(keep) if keep is not None else np.zeros(0, dtype=np.int64)
+            for index in np.flatnonzero(is_group):
+                line = lines[index]
+                name = line[2:].strip().decode(errors='replace')
+                preceding = int(np.searchsorted(face_lines, index))
+                first_face = self.face_count + (int(kept_before[preceding - 1]) if preceding else 0)
+                target = self.objects if line.startswith(b'o') else self.groups
+                target.append((name, first_face))
+        
+        self.positions.append(positions)
+        self.texcoords.append(texcoords)
+        self.normals.append(normals)
+        self.vertex_count += len(positions)
+        self.texcoord_count += len(texcoords)
+        self.normal_count += len(normals)
+        if keep is not None:
+            self.face_count += int(keep.sum())
+        self.line_number += len(lines) - 1
+    
+    def result(self):
+        """Сборка итоговых массивов"""
+        data = ObjData()
+        if self.positions:
+            data.positions = np.concatenate(self.positions)
+            data.texcoords = np.concatenate(self.texcoords)
+            data.normals = np.concatenate(self.normals)
+        if self.corners:
+            sizes = np.concatenate(self.face_sizes)
+            corners = np.concatenate(self.corners)
+            data.face_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=data.face_offsets[1:])
+            data.face_vertices = corners[:, 0].astype(np.int32)
+            data.face_texcoords = corners[:, 1].astype(np.int32)
+            data.face_normals = corners[:, 2].astype(np.int32)
+        data.groups = self.groups
+        data.objects = self.objects
+        return data
+
+def parse_obj(filename, progress=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Потоковый разбор .obj большими блоками
+    
+    progress(bytes_read, total_bytes) вызывается после каждого блока.
+    В data.stats записываются объем, время и скорость разбора (байт/с).
+    """
+    total_bytes = os.path.getsize(filename)
+    parser = _ChunkParser(filename)
+    start_time = time.perf_counter()
+    bytes_read = 0
+    
+    with open(filename, 'rb') as f:
+        tail = b''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            bytes_read += len(chunk)
+            
+            # Обрабатываются только целые строки, остаток переносится в следующий блок
+            data = tail + chunk
+            cut = data.rfind(b'\n')
+            if cut < 0:
+                tail = data
+                continue
+            tail = data[cut + 1:]
+            parser.feed(data[:cut + 1])
+            
+            if progress is not None:
+                progress(bytes_read, total_bytes)
+        
+        if tail:
+            parser.feed(tail + b'\n')
+            if progress is not None:
+                progress(bytes_read, total_bytes)
+    
+    data = parser.result()
+    elapsed = time.perf_counter() - start_time
+    data.stats = {
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'bytes_per_second': total_bytes / elapsed if elapsed > 0 else float('inf'),
+    }
+    return data
@@ -0,0 +1,133 @@
+# occlusion.py
+import weakref
+import numpy as np
+
+# Число выборок пирамиды по каждой оси прямоугольника при проверке
+SAMPLES = 8
+
+# Углы параллелепипеда: выбор min (0) или max (1) по каждой оси
+_BOX_CORNERS = np.array([[i >> 2 & 1, i >> 1 & 1, i & 1] for i in range(8)], dtype=bool)
+
+def transform_boxes(bounds_min, bounds_max, matrices):
+    """Мировые параллелепипеды (Kx3) параллелепипеда модели в K матрицах модели
+    
+    Центр преобразуется матрицей, полуразмеры - модулем ее линейной части,
+    поэтому результат охватывает все восемь преобразованных углов.
+    """
+    center = (bounds_min + bounds_max) * 0.5
+    extent = (bounds_max - bounds_min) * 0.5
+    centers = matrices[:, :3, :3] @ center + matrices[:, :3, 3]
+    extents = np.abs(matrices[:, :3, :3]) @ extent
+    return centers - extents, centers + extents
+
+def project_boxes(bounds_min, bounds_max, view_proj_matrix, width, height):
+    """Экранные прямоугольники и ближайшая глубина параллелепипедов (Kx3)
+    
+    Углы проецируются так же, как вершины в Renderer.project_vertices.
+    Возвращает массивы x0, y0, x1, y1 (пиксели), ближайшую глубину и маску
+    testable: параллелепипеды, задевающие ближнюю плоскость или
+    находящиеся за камерой, проверять нельзя.
+    """
+    corners = np.where(_BOX_CORNERS, bounds_max[:, np.newaxis], bounds_min[:, np.newaxis])
+    clip = corners @ view_proj_matrix[:, :3].T + view_proj_matrix[:, 3]
+    w = clip[..., 3]
+    testable = np.all(w > 1e-9, axis=1)
+    ndc = clip[..., :3] / np.where(w > 1e-9, w, 1.0)[..., np.newaxis]
+    testable &= np.all(ndc[..., 2] >= -1, axis=1)
+    
+    x = (ndc[..., 0] + 1) * (width / 2)
+    y = (1 - ndc[..., 1]) * (height / 2)
+    return x.min(axis=1), y.min(axis=1), x.max(axis=1), y.max(axis=1), ndc[..., 2].min(axis=1), testable
+
+class DepthPyramid:
+    """Иерархический Z-буфер (Hi-Z)
+    
+    Уровень 0 - буфер глубины растеризатора ([x, y], меньше - ближе, inf -
+    пусто), каждый следующий хранит максимум (самую дальнюю глубину) блоков
+    2x2 предыдущего; нечетные размеры дополняются inf. Прямоугольник
+    экрана проверяется на самом подробном уровне, где он покрывает не
+    больше SAMPLES x SAMPLES текселей, поэтому проверка любого объекта стоит
+    не больше SAMPLES² выборок. Объект закрыт, если его ближайшая глубина
+    больше самой дальней глубины под ним.
+    """
+    
+    def __init__(self, depth_buffer):
+        self.width, self.height = depth_buffer.shape
+        self.levels = [depth_buffer]
+        current = depth_buffer
+        while current.shape[0] > 1 or current.shape[1] > 1:
+            w, h = current.shape
+            if w % 2 or h % 2:
+                padded = np.full((w + w % 2, h + h % 2), np.inf, dtype=current.dtype)
+                padded[:w, :h] = current
+                current = padded
+            current = np.maximum(
+                np.maximum(current[0::2, 0::2], current[1::2, 0::2]),
+                np.maximum(current[0::2, 1::2], current[1::2, 1::2])
+            )
+            self.levels.append(current)
+    
+    def test_rects(self, x0, y0, x1, y1, depth):
+        """Маска закрытых прямоугольников экрана с ближайшей глубиной depth
+        
+        Прямоугольники, целиком лежащие за пределами экрана, не считаются
+        закрытыми (их отбрасывает отсечение по пирамиде видимости).
+        """
+        px0 = np.maximum(np.floor(x0), 0).astype(np.int64)
+        py0 = np.maximum(np.floor(y0), 0).astype(np.int64)
+        px1 = np.minimum(np.floor(x1), self.width - 1).astype(np.int64)
+        py1 = np.minimum(np.floor(y1), self.height - 1).astype(np.int64)
+        on_screen = (px0 <= px1) & (py0 <= py1)
+        
+        # Уровень, на котором прямоугольник занимает не больше SAMPLES текселей по каждой оси
+        span = (np.maximum(px1 - px0, py1 - py0) + 1) / (SAMPLES - 1)
+        level = np.ceil(np.log2(np.maximum(span, 1.0))).astype(np.int64)
+        level = np.minimum(level, len(self.levels) - 1)
+        
+        occluded = np.zeros(len(depth), dtype=bool)
+        steps = np.arange(SAMPLES)
+        for k in np.unique(level[on_screen]).tolist():
+            ids = np.flatnonzero(on_screen & (level == k))
+            texels = self.levels[k]
+            tx = np.minimum((px0[ids] >> k)[:, np.newaxis] + steps, (px1[ids] >> k)[:, np.newaxis])
+            ty = np.minimum((py0[ids] >> k)[:, np.newaxis] + steps, (py1[ids] >> k)[:, np.newaxis])
+            farthest = texels[tx[:, :, np.newaxis], ty[:, np.newaxis, :]].max(axis=(1, 2))
+            occluded[ids] = depth[ids] > farthest
+        return occluded
+    
+    def test_boxes(self, bounds_min, bounds_max, view_proj_matrix):
+        """Маска закрытых параллелепипедов (Kx3, координаты, в которых задана матрица)"""
+        x0, y0, x1, y1, depth, testable = project_boxes(
+            bounds_min, bounds_max, view_proj_matrix, self.width, self.height
+        )
+        return self.test_rects(x0, y0, x1, y1, depth) & testable
+
+class OcclusionCuller:
+    """Двухпроходное отсечение невидимых объектов по иерархическому Z-буферу
+    
+    Для каждого ключа (сетки или группы экземпляров) запоминается, какие
+    объекты (кластеры BVH, экземпляры) были видимы в прошлом кадре. Сначала
+    растеризуются только они, по полученному буферу глубины строится
+    DepthPyramid и проверяются ограничивающие параллелепипеды всех
+    объектов: незакрытые объекты, которых не было в первом проходе,
+    растеризуются вторым проходом, закрытые отбрасываются. Закрытый объект
+    целиком дальше уже записанной глубины и не прошел бы проверку глубины,
+    поэтому изображение совпадает с рендерингом без отсечения. Маски
+    хранятся по слабым ссылкам на ключи и удаляются вместе с объектами.
+    """
+    
+    def __init__(self):
+        self._visible = weakref.WeakKeyDictionary()
+    
+    def reset(self):
+        self._visible.clear()
+    
+    def previous(self, key, count):
+        """Маска объектов, видимых в прошлом кадре (все - для нового ключа)"""
+        visible = self._visible.get(key)
+        if visible is None or len(visible) != count:
+            return np.ones(count, dtype=bool)
+        return visible
+    
+    def update(self, key, visible):
+        self._visible[key] = visible
@@ -0,0 +1,169 @@
+# picking.py
+import numpy as np
+from scene import ModelInstance, Scene
+from transformations import identity_matrix
+
+# Допуск определителя при пересечении луча с треугольником (луч в плоскости треугольника)
+EPSILON = 1e-12
+
+class RayHit:
+    """Ближайшее пересечение луча с сеткой
+    
+    face - номер грани, triangle - номер треугольника разбиения грани,
+    point - точка пересечения в мировых координатах (массив 3), distance -
+    расстояние от начала луча вдоль единичного направления. mesh,
+    model_matrix и instance (номер экземпляра в группе сцены или None)
+    указывают, какой объект попал под луч.
+    """
+    
+    __slots__ = ('face', 'triangle', 'point', 'distance', 'mesh', 'model_matrix', 'instance')
+    
+    def __init__(self, face, triangle, point, distance, mesh, model_matrix, instance=None):
+        self.face = face
+        self.triangle = triangle
+        self.point = point
+        self.distance = distance
+        self.mesh = mesh
+        self.model_matrix = model_matrix
+        self.instance = instance
+    
+    def __str__(self):
+        x, y, z = self.point
+        return f"RayHit(face {self.face}, point ({x:.2f}, {y:.2f}, {z:.2f}), distance {self.distance:.3f})"
+
+def screen_ray(camera, x, y, width, height):
+    """Луч из точки экрана (x, y) в мировых координатах
+    
+    Точки на ближней и дальней плоскостях восстанавливаются обратной
+    матрицей вида и проекции, поэтому луч годится для обеих проекций.
+    Возвращает начало луча (точку на ближней плоскости) и единичное
+    направление (массивы 3).
+    """
+    ndc_x = 2.0 * x / width - 1.0
+    ndc_y = 1.0 - 2.0 * y / height
+    inverse = np.linalg.inv(camera.get_view_projection_matrix())
+    points = inverse @ np.array([[ndc_x, ndc_y, -1.0, 1.0], [ndc_x, ndc_y, 1.0, 1.0]]).T
+    near, far = (points[:3] / points[3]).T
+    direction = far - near
+    return near, direction / np.linalg.norm(direction)
+
+def ray_triangle_intersections(origin, direction, v0, v1, v2):
+    """Пересечение луча с массивом треугольников (алгоритм Меллера - Трумбора)
+    
+    v0, v1, v2 - вершины треугольников (Tx3). Треугольники проверяются с
+    обеих сторон. Возвращает параметры t луча (inf при промахе) и
+    барицентрические координаты u, v точек пересечения.
+    """
+    edge1 = v1 - v0
+    edge2 = v2 - v0
+    p = np.cross(direction, edge2)
+    det = np.einsum('ij,ij->i', edge1, p)
+    valid = np.abs(det) > EPSILON
+    inv_det = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+    
+    s = origin - v0
+    u = np.einsum('ij,ij->i', s, p) * inv_det
+    q = np.cross(s, edge1)
+    v = (q @ direction) * inv_det
+    t = np.einsum('ij,ij->i', edge2, q) * inv_det
+    
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf), u, v
+
+def raycast_mesh(mesh, origin, direction, max_distance=np.inf):
+    """Ближайшее пересечение луча с сеткой в ее координатах
+    
+    Листья иерархии объемов (mesh.get_bvh()) проверяются по возрастанию
+    параметра входа; обход заканчивается, как только следующий лист
+    начинается дальше найденного пересечения. Направление не обязано
+    быть единичным: расстояние измеряется в параметре t луча.
+    Возвращает (треугольник, t) или None.
+    """
+    triangles, _ = mesh.get_triangles()
+    if len(triangles) == 0:
+        return None
+    bvh = mesh.get_bvh()
+    order, starts = bvh.triangle_layout(mesh.triangle_offsets)
+    leaves, entries = bvh.query_ray(origin, direction, max_distance)
+    
+    best_t = max_distance
+    best_triangle = None
+    positions = mesh.positions
+    for leaf, entry in zip(leaves.tolist(), entries.tolist()):
+        if entry > best_t:
+            break
+        first = bvh.start[leaf]
+        ids = order[starts[first]:starts[first + bvh.count[leaf]]]
+        corners = triangles[ids]
+        t, _, _ = ray_triangle_intersections(
+            origin, direction,
+            positions[corners[:, 0]], positions[corners[:, 1]], positions[corners[:, 2]]
+        )
+        k = int(np.argmin(t))
+        if t[k] <= best_t and np.isfinite(t[k]):
+            best_t = float(t[k])
+            best_triangle = int(ids[k])
+    
+    if best_triangle is None:
+        return None
+    return best_triangle, best_t
+
+def _model_ray(model_matrix, origin, direction):
+    """Луч в координатах модели; параметр t остается прежним (направление не нормируется)"""
+    inverse = np.linalg.inv(model_matrix)
+    return inverse[:3, :3] @ origin + inverse[:3, 3], inverse[:3, :3] @ direction
+
+def _mesh_hit(mesh, model_matrix, origin, direction, max_distance, instance=None):
+    """RayHit для сетки с матрицей модели или None"""
+    local_origin, local_direction = _model_ray(model_matrix, origin, direction)
+    result = raycast_mesh(mesh, local_origin, local_direction, max_distance)
+    if result is None:
+        return None
+    triangle, t = result
+    face = int(np.searchsorted(mesh.triangle_offsets, triangle, side='right') - 1)
+    return RayHit(face, triangle, origin + t * direction, t, mesh, model_matrix, instance)
+
+def raycast(model, origin, direction, max_distance=np.inf):
+    """Ближайшее пересечение мирового луча с Model3D, ModelInstance или Scene
+    
+    Сетки не преобразуются: луч переводится в координаты модели обратной
+    матрицей модели, поэтому иерархия объемов строится один раз на сетку
+    (и подстраивается в Model3D.apply_transform). Для сцены сначала
+    векторно отбрасываются экземпляры, чей ограничивающий шар луч не
+    задевает. direction должно быть единичным. Возвращает RayHit или None.
+    """
+    origin = np.asarray(origin, dtype=float)
+    direction = np.asarray(direction, dtype=float)
+    if isinstance(model, ModelInstance):
+        return _mesh_hit(model.mesh, model.model_matrix, origin, direction, max_distance)
+    if not isinstance(model, Scene):
+        return _mesh_hit(model, identity_matrix(), origin, direction, max_distance)
+    
+    best = None
+    for batch in model.batches:
+        center, radius = batch.mesh.get_bounding_sphere()
+        if center is None or len(batch) == 0:
+            continue
+        
+        # Ограничивающие шары всех экземпляров группы в мировых координатах
+        matrices = batch.matrices
+        centers = matrices[:, :3, :3] @ center + matrices[:, :3, 3]
+        radii = radius * np.sqrt((matrices[:, :3, :3] ** 2).sum(axis=1).max(axis=1))
+        along = (centers - origin) @ direction
+        miss_sq = ((centers - origin) ** 2).sum(axis=1) - along ** 2
+        near = along - radii
+        candidates = np.flatnonzero((miss_sq <= radii ** 2) & (along + radii >= 0))
+        
+        for index in candidates[np.argsort(near[candidates])].tolist():
+            limit = max_distance if best is None else best.distance
+            if near[index] > limit:
+                break
+            hit = _mesh_hit(batch.mesh, matrices[index].copy(), origin, direction, limit, index)
+            if hit is not None:
+                best = hit
+    return best
+
+def pick(model, camera, x, y, width, height, max_distance=np.inf):
+    """Объект под точкой экрана (x, y): RayHit или None (см. screen_ray и raycast)"""
+    origin, direction = screen_ray(camera, x, y, width, height)
+    return raycast(model, origin, direction, max_distance)
@@ -2,6 +2,14 @@
 import numpy as np
 
 class Point:
+    """Точка (или вектор) в трехмерном пространстве
+    
+    Атрибуты хранятся в слотах без словаря экземпляра: точки часто
+    создаются как временные объекты. Для множества точек используйте
+    PointArray.
+    """
+    __slots__ = ('x', 'y', 'z')
+    
     def __init__(self, x, y, z):
         self.x = float(x)
         self.y = float(y)
@@ -58,4 +66,119 @@ class Point:
         dx = self.x - other.x
         dy = self.y - other.y
         dz = self.z - other.z
-        return np.sqrt(dx*dx + dy*dy + dz*dz)
\ No newline at end of file
+        return np.sqrt(dx*dx + dy*dy + dz*dz)
+
+
+class PointView(Point):
+    """Точка-представление строки массива Nx3 (изменения пишутся в массив)"""
+    __slots__ = ('_array', '_index')
+    
+    def __init__(self, array, index):
+        self._array = array
+        self._index = index
+    
+    @property
+    def x(self):
+        return float(self._array[self._index, 0])
+    
+    @x.setter
+    def x(self, value):
+        self._array[self._index, 0] = value
+    
+    @property
+    def y(self):
+        return float(self._array[self._index, 1])
+    
+    @y.setter
+    def y(self, value):
+        self._array[self._index, 1] = value
+    
+    @property
+    def z(self):
+        return float(self._array[self._index, 2])
+    
+    @z.setter
+    def z(self, value):
+        self._array[self._index, 2] = value
+    
+    def to_array(self):
+        """Преобразование в массив numpy (копия строки)"""
+        return self._array[self._index].astype(float)
+
+class PointArray:
+    """Набор точек в одном массиве Nx3 (структура массивов)
+    
+    Преобразование, расстояния и однородные координаты вычисляются сразу
+    для всех точек; доступ по индексу возвращает PointView над строкой
+    массива, срез - PointArray над частью того же массива (без копирования).
+    """
+    __slots__ = ('data',)
+    
+    def __init__(self, data=None):
+        # Массив Nx3 из float используется без копирования
+        self.data = np.asarray(data if data is not None else (), dtype=float).reshape(-1, 3)
+    
+    @classmethod
+    def from_points(cls, points):
+        """Создание из последовательности Point"""
+        return cls(np.array([(p.x, p.y, p.z) for p in points], dtype=float).reshape(-1, 3))
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PointArray(self.data[index])
+        index = int(index)
+        if index < 0:
+            index += len(self.data)
+        if not 0 <= index < len(self.data):
+            raise IndexError("point index out of range")
+        return PointView(self.data, index)
+    
+    def __iter__(self):
+        for i in range(len(self.data)):
+            yield PointView(self.data, i)
+    
+    def __str__(self):
+        return f"PointArray({len(self.data)} points)"
+    
+    def __repr__(self):
+        return self.__str__()
+    
+    def to_array(self):
+        """Копия координат (массив Nx3)"""
+        return self.data.copy()
+    
+    def to_homogeneous(self):
+        """Однородные координаты всех точек (массив Nx4)"""
+        result = np.ones((len(self.data), 4))
+        result[:, :3] = self.data
+        return result
+    
+    def copy(self):
+        """Создание копии набора точек"""
+        return PointArray(self.data.copy())
+    
+    def transform(self, matrix):
+        """Применение матрицы преобразования ко всем точкам (на месте)"""
+        transformed = self.data @ matrix[:3, :3].T
+        transformed += matrix[:3, 3]
+        
+        # Перспективное деление там, где w отлично от 0 (как в Point.transform)
+        w = self.data @ matrix[3, :3] + matrix[3, 3]
+        divide = (w != 0) & (w != 1)
+        transformed[divide] /= w[divide, np.newaxis]
+        
+        self.data[:] = transformed
+        return self
+    
+    def distance_to(self, other):
+        """Расстояния до точки (Point) или попарно до точек PointArray той же длины"""
+        if isinstance(other, PointArray):
+            target = other.data
+        elif isinstance(other, Point):
+            target = other.to_array()
+        else:
+            target = np.asarray(other, dtype=float)
+        return np.linalg.norm(self.data - target, axis=-1)
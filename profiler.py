@@ -0,0 +1,171 @@
+# profiler.py
+import sys
+import time
+import tracemalloc
+from collections import deque
+import numpy as np
+
+# Метрики памяти кадра (не времена этапов)
+MEMORY_METRICS = ('block_growth', 'allocated_bytes')
+
+class _NullScope:
+    """Пустая область измерения (профилировщик выключен)"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+class _Scope:
+    """Область измерения времени: длительность добавляется к этапу кадра"""
+    __slots__ = ('profiler', 'name', 'start')
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class Profiler:
+    """Профилировщик кадров
+    
+    Именованные этапы кадра измеряются через scope(name) или record(name, seconds).
+    По завершении кадра (end_frame) времена попадают в скользящие окна из
+    window последних кадров, по которым считаются перцентили p50/p95/p99, а
+    подписчики (subscribe) получают отчет о кадре. Также считается прирост
+    числа выделенных блоков памяти интерпретатора за кадр (block_growth):
+    это разность на конце и начале кадра, и при установившемся потреблении
+    она близка к нулю, сколько бы временных объектов кадр ни создавал.
+    Объем выделений за кадр измеряется с trace_memory=True: tracemalloc
+    дает пик памяти сверх уровня начала кадра (allocated_bytes). Трассировка
+    заметно замедляет интерпретатор, поэтому включается отдельно.
+    Выключенный профилировщик возвращает общий пустой контекст и ничего не
+    записывает, поэтому его можно оставлять в рабочем коде.
+    """
+    
+    def __init__(self, enabled=False, window=240, trace_memory=False):
+        self.enabled = enabled
+        self.window = window
+        self.trace_memory = trace_memory
+        self.frame_count = 0
+        self.last_report = None
+        self._samples = {}
+        self._frame = {}
+        self._subscribers = []
+        self._frame_start = None
+        self._blocks_start = 0
+        self._traced_start = 0
+    
+    def scope(self, name):
+        """Контекст измерения этапа name"""
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _Scope(self, name)
+    
+    def record(self, name, seconds):
+        """Добавление времени к этапу текущего кадра"""
+        if self.enabled:
+            self._frame[name] = self._frame.get(name, 0.0) + seconds
+    
+    def begin_frame(self):
+        """Начало кадра"""
+        if not self.enabled:
+            return
+        self._frame = {}
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+        self._blocks_start = sys.getallocatedblocks()
+        self._frame_start = time.perf_counter()
+    
+    def end_frame(self):
+        """Завершение кадра: обновление статистики и уведомление подписчиков"""
+        if not self.enabled or self._frame_start is None:
+            return None
+        
+        total = time.perf_counter() - self._frame_start
+        report = {
+            'frame': self.frame_count,
+            'total': total,
+            'stages': self._frame,
+            'block_growth': sys.getallocatedblocks() - self._blocks_start,
+        }
+        if self.trace_memory and tracemalloc.is_tracing():
+            report['allocated_bytes'] = tracemalloc.get_traced_memory()[1] - self._traced_start
+        self._frame_start = None
+        self.frame_count += 1
+        
+        self._push('frame', total)
+        for name in MEMORY_METRICS:
+            if name in report:
+                self._push(name, report[name])
+        for name, seconds in self._frame.items():
+            self._push(name, seconds)
+        
+        self.last_report = report
+        for callback in self._subscribers:
+            callback(report)
+        return report
+    
+    def _push(self, name, value):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(value)
+    
+    def percentiles(self, name, quantiles=(50, 95, 99)):
+        """Перцентили значений этапа по скользящему окну"""
+        samples = self._samples.get(name)
+        if not samples:
+            return None
+        values = np.percentile(np.fromiter(samples, dtype=float, count=len(samples)), quantiles)
+        return {f"p{q}": float(v) for q, v in zip(quantiles, values)}
+    
+    def summary(self):
+        """Перцентили всех этапов: {имя: {'p50': ..., 'p95': ..., 'p99': ...}}"""
+        return {name: self.percentiles(name) for name in self._samples}
+    
+    def reset(self):
+        """Очистка накопленной статистики"""
+        self._samples.clear()
+        self._frame = {}
+        self.frame_count = 0
+        self.last_report = None
+    
+    def subscribe(self, callback):
+        """Подписка на отчеты о кадрах: callback(report)"""
+        self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        """Отмена подписки"""
+        self._subscribers.remove(callback)
+    
+    def overlay_lines(self):
+        """Строки для экранного оверлея (hud.StaticOverlay; времена в миллисекундах)"""
+        lines = []
+        for name in self._samples:
+            if name in MEMORY_METRICS:
+                continue
+            stats = self.percentiles(name)
+            lines.append(
+                f"{name}: {stats['p50'] * 1000:.2f} / {stats['p95'] * 1000:.2f} / {stats['p99'] * 1000:.2f} ms"
+            )
+        stats = self.percentiles('block_growth')
+        if stats is not None:
+            lines.append(f"net block growth/frame: {stats['p50']:+.0f} (p99 {stats['p99']:+.0f})")
+        stats = self.percentiles('allocated_bytes')
+        if stats is not None:
+            lines.append(f"peak alloc/frame: {stats['p50'] / 1024:.0f} KB (p99 {stats['p99'] / 1024:.0f} KB)")
+        return lines
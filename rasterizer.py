@@ -0,0 +1,368 @@
+# rasterizer.py
+import numpy as np
+import pygame
+
+def rasterize_triangle(color_buffer, depth_buffer, xy, z, color, clip=None, levels=None, table=None):
+    """Растеризация одного треугольника с проверкой глубины
+    
+    xy - экранные координаты вершин (3x2), z - глубина вершин (меньше = ближе),
+    clip - прямоугольник отсечения (x0, y0, x1, y1), правая/нижняя граница не включается.
+    Буферы индексируются как [x, y], как в pygame.surfarray.
+    Затенение по Гуро: levels - номера уровней яркости вершин, table - цвета
+    базового цвета треугольника по уровням (уровни x 3, см. color_tables);
+    color тогда не используется, а цвет пикселя выбирается из таблицы по
+    интерполированному уровню.
+    """
+    if clip is None:
+        clip = (0, 0, depth_buffer.shape[0], depth_buffer.shape[1])
+    
+    (ax, ay), (bx, by), (cx, cy) = xy
+    
+    # Удвоенная площадь со знаком; вырожденные треугольники пропускаются
+    area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    if area == 0:
+        return
+    
+    # Ограничивающий прямоугольник, обрезанный по области отсечения
+    x0 = max(int(np.floor(min(ax, bx, cx))), clip[0])
+    x1 = min(int(np.ceil(max(ax, bx, cx))), clip[2])
+    y0 = max(int(np.floor(min(ay, by, cy))), clip[1])
+    y1 = min(int(np.ceil(max(ay, by, cy))), clip[3])
+    if x0 >= x1 or y0 >= y1:
+        return
+    
+    # Центры пикселей прямоугольника
+    px = (np.arange(x0, x1, dtype=np.float32) + 0.5)[:, np.newaxis]
+    py = (np.arange(y0, y1, dtype=np.float32) + 0.5)[np.newaxis, :]
+    
+    # Функции ребер (барицентрические веса, умноженные на площадь)
+    w0 = (cx - bx) * (py - by) - (cy - by) * (px - bx)
+    w1 = (ax - cx) * (py - cy) - (ay - cy) * (px - cx)
+    w2 = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+    
+    if area > 0:
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+    else:
+        inside = (w0 <= 0) & (w1 <= 0) & (w2 <= 0)
+    if not inside.any():
+        return
+    
+    # Интерполяция глубины и Z-тест
+    depth = (w0 * z[0] + w1 * z[1] + w2 * z[2]) / area
+    depth_region = depth_buffer[x0:x1, y0:y1]
+    mask = inside & (depth < depth_region)
+    
+    depth_region[mask] = depth[mask]
+    if levels is None:
+        color_buffer[x0:x1, y0:y1][mask] = color
+        return
+    
+    # Одинаковые уровни углов - заливка одним цветом без выборки по пикселям
+    l0, l1, l2 = levels
+    if l0 == l1 == l2:
+        color_buffer[x0:x1, y0:y1][mask] = table[int(l0)]
+        return
+    
+    # Уровень - линейная функция координат пикселя: c + gx * x + gy * y;
+    # выход за диапазон таблицы на краях обрезается при выборке (mode='clip')
+    gx = ((cy - by) * l0 + (ay - cy) * l1 + (by - ay) * l2) / -area
+    gy = ((cx - bx) * l0 + (ax - cx) * l1 + (bx - ax) * l2) / area
+    c = l0 - gx * ax - gy * ay + 0.5
+    level = (px * gx + (py * gy + c))[mask]
+    color_buffer[x0:x1, y0:y1][mask] = np.take(table, level.astype(np.intp), axis=0, mode='clip')
+
+# Треугольники с ограничивающим прямоугольником не больше этого размера
+# (пиксели по каждой оси) растеризуются пакетами по BATCH_CELLS пикселей
+SMALL_TRIANGLE_SIZE = 16
+BATCH_CELLS = 1 << 20
+
+def rasterize_triangles(color_buffer, depth_buffer, xy, z, colors, clip=None,
+                        levels=None, tables=None, table_ids=None):
+    """Растеризация массива треугольников по порядку
+    
+    xy (Nx3x2), z (Nx3), colors (Nx3); для Гуро levels (Nx3) - уровни
+    вершин, tables и table_ids - таблицы базовых цветов и номер таблицы
+    каждого треугольника (см. color_tables). Большие треугольники рисуются
+    по одному (rasterize_triangle), подряд идущие маленькие - одним
+    векторным проходом (_rasterize_small). Результат совпадает с
+    рисованием тех же треугольников по одному.
+    """
+    if len(xy) == 0:
+        return
+    if clip is None:
+        clip = (0, 0, depth_buffer.shape[0], depth_buffer.shape[1])
+    xy = np.asarray(xy, dtype=np.float64)
+    z = np.asarray(z)
+    colors = np.asarray(colors)
+    bounds = np.stack([
+        np.maximum(np.floor(xy[:, :, 0].min(axis=1)), clip[0]),
+        np.maximum(np.floor(xy[:, :, 1].min(axis=1)), clip[1]),
+        np.minimum(np.ceil(xy[:, :, 0].max(axis=1)), clip[2]),
+        np.minimum(np.ceil(xy[:, :, 1].max(axis=1)), clip[3])
+    ], axis=1)
+    spans = bounds[:, 2:] - bounds[:, :2]
+    small = spans.max(axis=1) <= SMALL_TRIANGLE_SIZE
+    
+    start = 0
+    for k in np.flatnonzero(~small).tolist() + [len(xy)]:
+        if k > start:
+            _rasterize_small(color_buffer, depth_buffer, xy, z, colors, bounds, np.arange(start, k),
+                             levels, tables, table_ids)
+        if k < len(xy):
+            if levels is None:
+                rasterize_triangle(color_buffer, depth_buffer, xy[k].tolist(), z[k], colors[k], clip)
+            else:
+                rasterize_triangle(color_buffer, depth_buffer, xy[k].tolist(), z[k], colors[k], clip,
+                                   levels[k].tolist(), tables[table_ids[k]])
+        start = k + 1
+
+def _rasterize_small(color_buffer, depth_buffer, xy, z, colors, bounds, ids, levels, tables, table_ids):
+    """Векторная растеризация маленьких треугольников ids (по порядку)
+    
+    Пиксели всех треугольников вычисляются теми же операциями и в тех же
+    типах, что и в rasterize_triangle. Из фрагментов одного пикселя
+    выбирается тот, который остался бы в буфере при рисовании по одному:
+    глубина в буфере хранится в float32, поэтому среди фрагментов с
+    наименьшей округленной глубиной побеждает последний, строго ближний
+    к ней, а если таких нет - первый.
+    """
+    keep = (bounds[ids, 0] < bounds[ids, 2]) & (bounds[ids, 1] < bounds[ids, 3])
+    ids = ids[keep]
+    (ax, ay), (bx, by), (cx, cy) = xy[ids, 0].T, xy[ids, 1].T, xy[ids, 2].T
+    area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    nonzero = area != 0
+    ids = ids[nonzero]
+    if len(ids) == 0:
+        return
+    
+    # Треугольники группируются по размеру прямоугольника (степени двойки)
+    x0 = bounds[ids, 0].astype(np.int64)
+    y0 = bounds[ids, 1].astype(np.int64)
+    width = bounds[ids, 2].astype(np.int64) - x0
+    height = bounds[ids, 3].astype(np.int64) - y0
+    size = 1 << np.ceil(np.log2(np.maximum(width, height))).astype(np.int64)
+    
+    # Пакеты по порядку треугольников: каждый пакет дописывается в буферы до следующего
+    cells = np.cumsum(size * size)
+    chunk = np.searchsorted(cells, np.arange(BATCH_CELLS, cells[-1] + BATCH_CELLS, BATCH_CELLS), side='right')
+    start = 0
+    for end in np.unique(np.concatenate([chunk[chunk > 0], [len(ids)]])).tolist():
+        fragments = []
+        for s in np.unique(size[start:end]).tolist():
+            group = start + np.flatnonzero(size[start:end] == s)
+            fragments.append(_triangle_fragments(
+                depth_buffer, xy, z, ids[group], x0[group], y0[group], width[group], height[group], s,
+                levels, tables, table_ids
+            ))
+        _resolve_fragments(color_buffer, depth_buffer, colors, fragments, levels is not None)
+        start = end
+
+def _triangle_fragments(depth_buffer, xy, z, ids, x0, y0, width, height, s, levels, tables, table_ids):
+    """Фрагменты треугольников ids с прямоугольниками не больше s x s, прошедшие Z-тест"""
+    ax, ay, bx, by, cx, cy = (xy[ids, k // 2, k % 2][:, np.newaxis, np.newaxis] for k in range(6))
+    area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    f32 = np.float32
+    
+    # Центры пикселей и функции ребер - в float32, как в rasterize_triangle
+    steps = np.arange(s)
+    px = (x0[:, np.newaxis] + steps).astype(f32)[:, :, np.newaxis] + f32(0.5)
+    py = (y0[:, np.newaxis] + steps).astype(f32)[:, np.newaxis, :] + f32(0.5)
+    w0 = (cx - bx).astype(f32) * (py - by.astype(f32)) - (cy - by).astype(f32) * (px - bx.astype(f32))
+    w1 = (ax - cx).astype(f32) * (py - cy.astype(f32)) - (ay - cy).astype(f32) * (px - cx.astype(f32))
+    w2 = (bx - ax).astype(f32) * (py - ay.astype(f32)) - (by - ay).astype(f32) * (px - ax.astype(f32))
+    inside = np.where(
+        area > 0,
+        (w0 >= 0) & (w1 >= 0) & (w2 >= 0),
+        (w0 <= 0) & (w1 <= 0) & (w2 <= 0)
+    )
+    inside &= (steps < width[:, np.newaxis])[:, :, np.newaxis]
+    inside &= (steps < height[:, np.newaxis])[:, np.newaxis, :]
+    
+    tri, i, j = np.nonzero(inside)
+    x = x0[tri] + i
+    y = y0[tri] + j
+    corner_z = z[ids[tri]]
+    depth_type = np.result_type(f32, z.dtype)
+    depth = (
+        w0[tri, i, j].astype(depth_type) * corner_z[:, 0]
+        + w1[tri, i, j].astype(depth_type) * corner_z[:, 1]
+        + w2[tri, i, j].astype(depth_type) * corner_z[:, 2]
+    ) / area[tri, 0, 0]
+    passed = depth < depth_buffer[x, y]
+    tri, i, j, x, y, depth = tri[passed], i[passed], j[passed], x[passed], y[passed], depth[passed]
+    
+    level = None
+    if levels is not None:
+        l0, l1, l2 = levels[ids].T
+        area = area[:, 0, 0]
+        gx = ((cy - by)[:, 0, 0] * l0 + (ay - cy)[:, 0, 0] * l1 + (by - ay)[:, 0, 0] * l2) / -area
+        gy = ((cx - bx)[:, 0, 0] * l0 + (ax - cx)[:, 0, 0] * l1 + (bx - ax)[:, 0, 0] * l2) / area
+        c = l0 - gx * ax[:, 0, 0] - gy * ay[:, 0, 0] + 0.5
+        level = (
+            px[tri, i, 0] * gx.astype(f32)[tri] + (py[tri, 0, j] * gy.astype(f32)[tri] + c.astype(f32)[tri])
+        ).astype(np.intp)
+        equal = (l0 == l1) & (l1 == l2)
+        level = np.where(equal[tri], l0.astype(np.intp)[tri], level)
+        level = np.clip(level, 0, tables.shape[1] - 1)
+        return ids[tri], x, y, depth, tables[table_ids[ids[tri]], level]
+    return ids[tri], x, y, depth, None
+
+def _resolve_fragments(color_buffer, depth_buffer, colors, fragments, shaded):
+    """Запись победивших фрагментов пакета в буферы (см. _rasterize_small)"""
+    order = np.concatenate([f[0] for f in fragments])
+    if len(order) == 0:
+        return
+    x = np.concatenate([f[1] for f in fragments])
+    y = np.concatenate([f[2] for f in fragments])
+    depth = np.concatenate([f[3] for f in fragments])
+    stored = depth.astype(depth_buffer.dtype)
+    pixel = x * depth_buffer.shape[1] + y
+    
+    # Среди фрагментов с наименьшей сохраняемой глубиной пикселя: сначала
+    # строго ближние к ней (последний по порядку), затем остальные (первый)
+    below = depth < stored
+    priority = np.where(below, -order - 1, order)
+    sorted_ids = np.lexsort((priority, stored, pixel))
+    pixel = pixel[sorted_ids]
+    first = np.ones(len(pixel), dtype=bool)
+    first[1:] = pixel[1:] != pixel[:-1]
+    winners = sorted_ids[first]
+    
+    depth_buffer.reshape(-1)[pixel[first]] = stored[winners]
+    if shaded:
+        values = np.concatenate([f[4] for f in fragments])[winners]
+    else:
+        values = colors[order[winners]]
+    color_buffer.reshape(-1, color_buffer.shape[2])[pixel[first]] = values
+
+def color_tables(lut, colors):
+    """Таблицы цветов по уровням яркости для базовых цветов colors (Kx3)
+    
+    lut - таблица Lighting.lut (256 x уровни). Возвращает таблицы уникальных
+    цветов (U x уровни x 3) и номер таблицы каждого цвета (K).
+    """
+    colors = np.asarray(colors, dtype=np.intp).reshape(-1, 3)
+    unique, inverse = np.unique(colors, axis=0, return_inverse=True)
+    return np.ascontiguousarray(lut[unique].transpose(0, 2, 1)), inverse.reshape(-1)
+
+def line_pixels(starts, ends, width, height):
+    """Пиксели отрезков для буфера width x height одним векторным проходом
+    
+    starts, ends - концы отрезков (Kx2). Для отрезков внутри буфера точки
+    совпадают с алгоритмом Брезенхэма pygame.draw.line: концы усекаются до
+    целых, по длинной оси шаг в один пиксель, по короткой -
+    floor((i * minor + (major - 1) // 2) / major). Диапазон шагов заранее
+    обрезается по буферу (Лианг - Барски), поэтому число точек не зависит
+    от того, как далеко концы выходят за экран.
+    Возвращает массивы координат x и y.
+    """
+    p0 = np.trunc(np.asarray(starts, dtype=float).reshape(-1, 2)).astype(np.int64)
+    p1 = np.trunc(np.asarray(ends, dtype=float).reshape(-1, 2)).astype(np.int64)
+    delta = p1 - p0
+    sign = np.where(delta < 0, -1, 1)
+    length = np.abs(delta)
+    x_major = length[:, 0] > length[:, 1]
+    major = np.where(x_major, length[:, 0], length[:, 1])
+    minor = np.where(x_major, length[:, 1], length[:, 0])
+    
+    # Диапазон шагов по длинной оси, при котором точка может попасть в буфер
+    low = np.zeros(len(p0))
+    high = major.astype(float)
+    for axis, size in ((0, width), (1, height)):
+        d = delta[:, axis]
+        moving = d != 0
+        inside = (p0[:, axis] >= 0) & (p0[:, axis] <= size - 1)
+        high[~moving & ~inside] = -1.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ta = (-1 - p0[:, axis]) / d * major
+            tb = (size - p0[:, axis]) / d * major
+        low = np.where(moving, np.maximum(low, np.minimum(ta, tb)), low)
+        high = np.where(moving, np.minimum(high, np.maximum(ta, tb)), high)
+    first = np.ceil(low).astype(np.int64)
+    counts = np.maximum(np.floor(high).astype(np.int64) - first + 1, 0)
+    
+    segment = np.repeat(np.arange(len(p0)), counts)
+    step = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts) + first[segment]
+    along = (step * minor[segment] + (major[segment] - 1) // 2) // np.maximum(major[segment], 1)
+    major_axis = x_major[segment]
+    x = p0[segment, 0] + sign[segment, 0] * np.where(major_axis, step, along)
+    y = p0[segment, 1] + sign[segment, 1] * np.where(major_axis, along, step)
+    
+    valid = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    return x[valid], y[valid]
+
+class ZBufferRasterizer:
+    """Растеризатор с Z-буфером: буферы цвета и глубины - массивы numpy"""
+    
+    def __init__(self, width, height, clear_color=(30, 30, 40)):
+        self.width = width
+        self.height = height
+        self.clear_color = clear_color
+        
+        # Таблица цветов по уровням яркости для треугольников с затенением по
+        # Гуро и построенные по ней таблицы базовых цветов
+        self.color_lut = None
+        self._tables_lut = None
+        self._color_tables = {}
+        
+        self._allocate_buffers()
+        self.clear()
+    
+    def _allocate_buffers(self):
+        """Выделение буферов; порядок осей [x, y] совпадает с pygame.surfarray"""
+        self.color_buffer = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+        self.depth_buffer = np.full((self.width, self.height), np.inf, dtype=np.float32)
+    
+    def clear(self):
+        """Очистка буферов цвета и глубины"""
+        self.color_buffer[:] = self.clear_color
+        self.depth_buffer.fill(np.inf)
+    
+    def draw_triangle(self, xy, z, color, levels=None):
+        """Растеризация треугольника в буферы
+        
+        При заданных levels (уровни яркости вершин) color - базовый цвет,
+        цвета пикселей выбираются из self.color_lut (таблица базового цвета
+        строится один раз и используется, пока color_lut не сменится).
+        """
+        table = None
+        if levels is not None:
+            if self._tables_lut is not self.color_lut:
+                self._tables_lut = self.color_lut
+                self._color_tables.clear()
+            key = tuple(color)
+            table = self._color_tables.get(key)
+            if table is None:
+                table = self._color_tables[key] = color_tables(self.color_lut, color)[0][0]
+        rasterize_triangle(self.color_buffer, self.depth_buffer, xy, z, color,
+                           levels=levels, table=table)
+    
+    def draw_triangles(self, xy, z, colors, levels=None):
+        """Растеризация массива треугольников по порядку (см. rasterize_triangles)
+        
+        xy (Nx3x2), z (Nx3), colors (Nx3); levels (Nx3) - уровни яркости
+        вершин для Гуро, тогда colors - базовые цвета.
+        """
+        if levels is None:
+            rasterize_triangles(self.color_buffer, self.depth_buffer, xy, z, colors)
+            return
+        tables, table_ids = color_tables(self.color_lut, colors)
+        rasterize_triangles(self.color_buffer, self.depth_buffer, xy, z, colors,
+                            levels=levels, tables=tables, table_ids=table_ids)
+    
+    def draw_lines(self, starts, ends, color):
+        """Рисование отрезков в буфер цвета поверх изображения (без проверки глубины)"""
+        x, y = line_pixels(starts, ends, self.width, self.height)
+        self.color_buffer[x, y] = color
+    
+    def flush(self):
+        """Завершение растеризации отправленных треугольников (для совместимости с TiledRasterizer)"""
+        pass
+    
+    def present(self, screen):
+        """Вывод буфера цвета на экран одной операцией"""
+        pygame.surfarray.blit_array(screen, self.color_buffer)
+    
+    def close(self):
+        """Освобождение ресурсов (для совместимости с TiledRasterizer)"""
+        pass
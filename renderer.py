@@ -1,14 +1,77 @@
 # renderer.py
+import time
+import weakref
 import numpy as np
 import pygame
-from point import Point
+from bvh import INSIDE, OUTSIDE, sphere_frustum_test
+from depth_order import DepthOrder, face_depths, view_depth_row
+from hud import TextCache
+from lighting import SHADING_MODES, Lighting
+from lod import select_lod_levels
+from model_loader import FaceList, face_corner_indices
+from occlusion import DepthPyramid, OcclusionCuller, transform_boxes
+from profiler import Profiler
+from rasterizer import ZBufferRasterizer, line_pixels
+from tiled_rasterizer import TiledRasterizer
+from scene import ModelInstance, Scene
+from transformations import (
+    extract_frustum_planes, identity_matrix, normal_matrix, transform_normals_array,
+    transform_points_array, transform_points_batch
+)
+
+# Режимы удаления невидимых поверхностей
+RENDER_MODES = ('painter', 'zbuffer', 'tiled')
 
 class Renderer:
-    def __init__(self, width, height):
+    def __init__(self, width, height, mode='painter', background_color=(30, 30, 40),
+                 workers=None, tile_size=64):
         self.width = width
         self.height = height
         self.half_width = width / 2
         self.half_height = height / 2
+        self.background_color = background_color
+        
+        # 'painter' - сортировка граней и pygame.draw.polygon,
+        # 'zbuffer' - растеризация в numpy-буферы с проверкой глубины,
+        # 'tiled' - Z-буфер, растеризуемый по плиткам пулом процессов
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.tile_size = tile_size
+        self._rasterizers = {}
+        
+        # Длительность этапов последнего кадра; этапы также передаются в профилировщик
+        self.stage_times = {}
+        self.profiler = Profiler()
+        
+        # Порядок граней от дальних к ближним (переиспользуется между кадрами)
+        self.depth_order = DepthOrder()
+        self.scene_depth_order = DepthOrder()
+        
+        # Отсечение закрытых объектов по иерархическому Z-буферу (режимы Z-буфера)
+        # и число граней последнего кадра, отброшенных каждой проверкой
+        self.occlusion = OcclusionCuller()
+        self.cull_stats = {}
+        
+        # Кэш строк статистики (шрифт загружается один раз); show_stats = False
+        # отключает вывод статистики на кадр (например, при пакетном рендеринге)
+        self.text = TextCache()
+        self.show_stats = True
+        
+        # Уровни детализации: бюджет граней - площадь проекции ограничивающей
+        # сферы, деленная на lod_pixels_per_face; выбранные уровни запоминаются
+        # для гистерезиса по объекту (экземпляру или группе экземпляров) вместе
+        # с числом уровней его сетки; записи удаляются вместе с объектами
+        self.lod_enabled = True
+        self.lod_pixels_per_face = 16.0
+        self.lod_hysteresis = 0.25
+        self._lod_levels = weakref.WeakKeyDictionary()
+        
+        # Затенение: 'view' - по углу к направлению взгляда, 'flat'/'gouraud' -
+        # освещение источниками self.lighting граней или вершин
+        self.lighting = Lighting()
+        self.shading = 'view'
         
         # Цвета для разных граней
         self.colors = [
@@ -20,6 +83,53 @@ class Renderer:
             (100, 200, 200),  # бирюзовый
         ]
     
+    @property
+    def rasterizer(self):
+        """Растеризатор текущего режима (создается при первом обращении)"""
+        if self.mode not in self._rasterizers:
+            if self.mode == 'tiled':
+                self._rasterizers[self.mode] = TiledRasterizer(
+                    self.width, self.height, self.background_color,
+                    workers=self.workers, tile_size=self.tile_size
+                )
+            else:
+                self._rasterizers[self.mode] = ZBufferRasterizer(
+                    self.width, self.height, self.background_color
+                )
+        return self._rasterizers[self.mode]
+    
+    def next_mode(self):
+        """Переключение на следующий режим рендеринга"""
+        self.mode = RENDER_MODES[(RENDER_MODES.index(self.mode) + 1) % len(RENDER_MODES)]
+        return self.mode
+    
+    def next_shading(self):
+        """Переключение на следующий режим затенения"""
+        self.shading = SHADING_MODES[(SHADING_MODES.index(self.shading) + 1) % len(SHADING_MODES)]
+        return self.shading
+    
+    def close(self):
+        """Освобождение ресурсов растеризаторов (пул процессов, разделяемая память)"""
+        for rasterizer in self._rasterizers.values():
+            rasterizer.close()
+        self._rasterizers.clear()
+    
+    def _end_stage(self, name, start):
+        """Учет длительности этапа кадра; возвращает начало следующего этапа
+        
+        Этап может состоять из нескольких отрезков, их длительности суммируются.
+        """
+        now = time.perf_counter()
+        self.stage_times[name] = self.stage_times.get(name, 0.0) + now - start
+        self.profiler.record(name, now - start)
+        return now
+    
+    def resolve_instance(self, model):
+        """Получение базовой сетки и матрицы модели для рендеринга"""
+        if isinstance(model, ModelInstance):
+            return model.mesh, model.model_matrix
+        return model, identity_matrix()
+    
     def project_point(self, point, view_proj_matrix):
         """Проецирование 3D точки в 2D координаты экрана"""
         homogeneous = point.to_homogeneous()
@@ -28,206 +138,805 @@ class Renderer:
         y = -transformed[1] * self.half_height + self.half_height
         return (x, y)
     
-    def is_face_visible(self, face, vertices, camera_position, camera_target):
-        """Проверка видимости грани (правильный алгоритм отсечения)"""
-        if face.normal is None or len(face.vertex_indices) < 3:
-            return True
+    def project_vertices(self, positions, view_proj_matrix):
+        """Пакетное проецирование массива вершин Nx3
         
-        # 1. Вычисляем направление взгляда камеры (вектор от камеры к цели)
-        view_direction = Point(
-            camera_target.x - camera_position.x,
-            camera_target.y - camera_position.y,
-            camera_target.z - camera_position.z
-        )
+        Возвращает экранные координаты (Nx2) и столбец глубины (N,) в
+        нормализованных координатах: меньшее значение ближе к камере.
+        """
+        # Однородные координаты всех вершин одним умножением
+        clip = positions @ view_proj_matrix[:, :3].T
+        clip += view_proj_matrix[:, 3]
         
-        # Нормализуем вектор направления взгляда
-        view_len = np.sqrt(view_direction.x**2 + view_direction.y**2 + view_direction.z**2)
-        if view_len > 0:
-            view_direction.x /= view_len
-            view_direction.y /= view_len
-            view_direction.z /= view_len
-        
-        # 2. Для ортографической проекции проверяем угол между нормалью и направлением взгляда
-        # Грань видима, если нормаль направлена от камеры (угол > 90°)
-        
-        # Скалярное произведение нормали и направления взгляда
-        dot_product = (
-            face.normal.x * view_direction.x +
-            face.normal.y * view_direction.y +
-            face.normal.z * view_direction.z
-        )
+        # Перспективное деление (для ортографической проекции w = 1)
+        w = clip[:, 3]
+        if not np.all(w == 1):
+            divide = w != 0
+            clip[divide, :3] /= w[divide, np.newaxis]
+        
+        # Преобразование в координаты окна на месте
+        screen = clip[:, :2]
+        screen[:, 0] *= self.half_width
+        screen[:, 0] += self.half_width
+        screen[:, 1] *= -self.half_height
+        screen[:, 1] += self.half_height
+        return screen, clip[:, 2]
+    
+    def frustum_cull(self, mesh, planes):
+        """Грани сетки, которые могут попасть в пирамиду видимости
         
-        # DEBUG: Выводим информацию для первой грани
-        if face == vertices[0].faces[0] if hasattr(vertices[0], 'faces') else False:
-            print(f"Normal: ({face.normal.x:.2f}, {face.normal.y:.2f}, {face.normal.z:.2f})")
-            print(f"View dir: ({view_direction.x:.2f}, {view_direction.y:.2f}, {view_direction.z:.2f})")
-            print(f"Dot product: {dot_product:.2f}")
-            print(f"Visible: {dot_product < 0}")
+        Сначала проверяется ограничивающая сфера всей сетки; если она
+        пересекает границу пирамиды, отбор идет по иерархии кластеров граней.
+        Возвращает None, если видна вся сетка, иначе массив индексов граней.
+        """
+        center, radius = mesh.get_bounding_sphere()
+        if center is None:
+            return None
         
-        # Грань видима если dot_product < 0 (угол > 90°)
-        return dot_product < 0
+        result = sphere_frustum_test(center, radius, planes)
+        if result == INSIDE:
+            return None
+        if result == OUTSIDE:
+            return np.zeros(0, dtype=np.int64)
+        return mesh.get_bvh().query_planes(planes)
     
-    def calculate_face_color(self, face, color_idx, vertices, camera_position, camera_target):
-        """Вычисление цвета грани с учетом направления камеры"""
-        base_color = self.colors[color_idx % len(self.colors)]
+    def screen_radii(self, mesh, matrices, view_proj_matrix):
+        """Радиусы ограничивающей сферы экземпляров на экране (в пикселях)
         
-        if face.normal is None:
-            return base_color
+        matrices - матрицы модели Kx4x4, view_proj_matrix - матрица камеры.
+        """
+        center, radius = mesh.get_bounding_sphere()
+        if center is None:
+            return np.zeros(len(matrices))
         
-        # Направление от камеры к цели
-        view_direction = Point(
-            camera_target.x - camera_position.x,
-            camera_target.y - camera_position.y,
-            camera_target.z - camera_position.z
-        )
+        centers = matrices[:, :3, :3] @ center + matrices[:, :3, 3]
+        scales = np.sqrt((matrices[:, :3, :3] ** 2).sum(axis=1).max(axis=1))
+        w = np.abs(centers @ view_proj_matrix[3, :3] + view_proj_matrix[3, 3])
+        pixels_per_unit = np.linalg.norm(view_proj_matrix[0, :3]) * self.half_width / np.maximum(w, 1e-6)
+        return radius * scales * pixels_per_unit
+    
+    def select_lod(self, key, mesh, matrices, view_proj_matrix):
+        """Уровни детализации экземпляров сетки (массив длины K)
+        
+        key - объект, для которого запоминается выбор между кадрами (по
+        слабой ссылке).
+        """
+        if not self.lod_enabled or not mesh.lods:
+            return np.zeros(len(matrices), dtype=np.int64)
         
-        # Нормализуем
-        view_len = np.sqrt(view_direction.x**2 + view_direction.y**2 + view_direction.z**2)
-        if view_len > 0:
-            view_direction.x /= view_len
-            view_direction.y /= view_len
-            view_direction.z /= view_len
-        
-        # Скалярное произведение для освещения
-        dot = (
-            face.normal.x * view_direction.x +
-            face.normal.y * view_direction.y +
-            face.normal.z * view_direction.z
+        face_counts = mesh.lod_face_counts
+        radii = self.screen_radii(mesh, matrices, view_proj_matrix)
+        budgets = np.pi * radii ** 2 / self.lod_pixels_per_face
+        
+        # Первый выбор - без гистерезиса
+        level_count, current = self._lod_levels.get(key, (None, None))
+        if current is None or len(current) != len(matrices) or level_count != len(face_counts):
+            current = select_lod_levels(face_counts, budgets, np.full(len(matrices), len(face_counts) - 1), 0.0)
+        levels = select_lod_levels(face_counts, budgets, current, self.lod_hysteresis)
+        self._lod_levels[key] = (len(face_counts), levels)
+        return levels
+    
+    def project_visible_vertices(self, mesh, face_ids, view_proj_matrix):
+        """Проецирование только вершин выбранных граней
+        
+        Возвращает массивы на все вершины сетки; вершины остальных граней
+        не вычисляются и остаются нулевыми.
+        """
+        if face_ids is None:
+            return self.project_vertices(mesh.positions, view_proj_matrix)
+        
+        used = np.zeros(len(mesh.positions), dtype=bool)
+        used[mesh.face_indices[face_corner_indices(mesh.face_offsets, face_ids)]] = True
+        vertex_ids = np.flatnonzero(used)
+        
+        screen_xy = np.zeros((len(mesh.positions), 2))
+        vertex_depth = np.zeros(len(mesh.positions))
+        screen_xy[vertex_ids], vertex_depth[vertex_ids] = self.project_vertices(
+            mesh.positions[vertex_ids], view_proj_matrix
         )
+        return screen_xy, vertex_depth
+    
+    def get_view_direction(self, camera):
+        """Единичный вектор направления взгляда камеры (кэшируется камерой)"""
+        return camera.get_forward()
+    
+    def compute_face_dots(self, mesh, model_matrix, normals, camera, view_direction):
+        """Скалярные произведения нормалей всех граней и направления взгляда
+        
+        Для ортографической камеры используется общее направление взгляда,
+        для перспективной - вектор от камеры к центру каждой грани.
+        """
+        if camera.projection != 'perspective':
+            return normals @ view_direction
+        
+        # Центры граней в мировых координатах
+        world_positions = transform_points_array(mesh.positions, model_matrix)
+        sizes = np.diff(mesh.face_offsets)
+        centers = np.add.reduceat(world_positions[mesh.face_indices], mesh.face_offsets[:-1], axis=0)
+        centers /= sizes[:, np.newaxis]
+        
+        eye = centers - camera.position.to_array()
+        lengths = np.linalg.norm(eye, axis=1, keepdims=True)
+        np.divide(eye, lengths, out=eye, where=lengths > 0)
+        return np.einsum('ij,ij->i', normals, eye)
+    
+    def cull_faces(self, dots):
+        """Маска видимых граней: нормаль направлена навстречу взгляду (угол > 90°)"""
+        return dots < 0
+    
+    def shade_faces(self, dots, base_colors=None):
+        """Цвета граней с учетом направления камеры (массив Fx3)
+        
+        base_colors - базовые цвета, согласованные по форме с dots
+        (по умолчанию цвет палитры по номеру грани).
+        """
+        if base_colors is None:
+            palette = np.array(self.colors, dtype=float)
+            base_colors = palette[np.arange(len(dots)) % len(palette)]
         
         # Интенсивность: видимые грани ярче, невидимые - темнее
-        if dot < 0:  # Грань видима
-            intensity = max(0.6, 0.8 - abs(dot) * 0.3)
-        else:  # Грань невидима (если отсечение выключено)
-            intensity = max(0.2, 0.4 - dot * 0.2)
-        
-        return (
-            min(255, int(base_color[0] * intensity)),
-            min(255, int(base_color[1] * intensity)),
-            min(255, int(base_color[2] * intensity))
+        intensity = np.where(
+            dots < 0,
+            np.maximum(0.6, 0.8 - np.abs(dots) * 0.3),
+            np.maximum(0.2, 0.4 - dots * 0.2)
         )
+        
+        return np.minimum(255, (base_colors * intensity[:, np.newaxis]).astype(int))
+    
+    def eye_vectors(self, points, camera):
+        """Единичные векторы от точек (...x3, мировые координаты) к камере
+        
+        Для ортографической камеры - один общий вектор (3,).
+        """
+        if camera.projection != 'perspective':
+            return -camera.get_forward()
+        eye = camera.position.to_array() - points
+        lengths = np.linalg.norm(eye, axis=-1, keepdims=True)
+        np.divide(eye, lengths, out=eye, where=lengths > 0)
+        return eye
+    
+    def light_faces(self, model, mesh, model_matrix, normals, dots, face_ids, camera, per_vertex):
+        """Цвета граней face_ids (Kx3) в режиме затенения self.shading
+        
+        Возвращает цвета и уровни яркости вершин сетки (для 'gouraud' при
+        per_vertex, иначе None; освещаются только вершины граней face_ids). С уровнями вершин цвета - базовые, их
+        освещает растеризатор; без них (заливка pygame одним цветом) уровень
+        грани - среднее уровней ее углов.
+        """
+        base_color = getattr(model, 'color', None)
+        if base_color is None:
+            palette = np.array(self.colors)
+            base_colors = palette[face_ids % len(palette)]
+        else:
+            base_colors = np.tile(np.array(base_color), (len(face_ids), 1))
+        if self.shading == 'view' or len(face_ids) == 0:
+            return self.shade_faces(dots[face_ids], base_colors), None
+        
+        lighting = self.lighting
+        corners = face_corner_indices(mesh.face_offsets, face_ids)
+        starts = np.concatenate([[0], np.cumsum(mesh.face_sizes[face_ids])[:-1]])
+        if self.shading == 'flat':
+            # Освещение центров граней (центры вычисляются в координатах модели)
+            centers = np.add.reduceat(mesh.positions[mesh.face_indices[corners]], starts, axis=0)
+            centers /= mesh.face_sizes[face_ids][:, np.newaxis]
+            centers = transform_points_array(centers, model_matrix)
+            return lighting.shade(base_colors, centers, normals[face_ids], self.eye_vectors(centers, camera)), None
+        
+        # Гуро: освещение по нормалям вершин только у вершин рисуемых граней
+        corner_vertices = mesh.face_indices[corners]
+        used = np.unique(corner_vertices)
+        world = transform_points_array(mesh.positions[used], model_matrix)
+        vertex_normals = mesh.get_smooth_normals()[used]
+        normal_mat = normal_matrix(model_matrix)
+        if normal_mat is not None:
+            vertex_normals = transform_normals_array(vertex_normals, normal_mat)
+        levels = np.zeros(len(mesh.positions), dtype=np.uint8)
+        levels[used] = lighting.quantize(lighting.intensity(world, vertex_normals, self.eye_vectors(world, camera)))
+        if per_vertex:
+            return base_colors, levels
+        face_levels = np.add.reduceat(levels[corner_vertices].astype(float), starts)
+        face_levels /= mesh.face_sizes[face_ids]
+        return lighting.colors(base_colors, np.rint(face_levels).astype(np.uint8)), None
+    
+    def draw_lines(self, screen, starts, ends, color):
+        """Рисование отрезков на поверхности одним векторным проходом (см. line_pixels)"""
+        width, height = screen.get_size()
+        x, y = line_pixels(starts, ends, width, height)
+        pixels = pygame.surfarray.pixels3d(screen)
+        pixels[x, y] = color
+        del pixels
+    
+    def draw_face_normal(self, screen, face, face_points, view_direction):
+        """Рисование нормали грани и направления взгляда из центра грани"""
+        if face.normal:
+            # Центр грани на экране
+            center_x = sum(p[0] for p in face_points) / len(face_points)
+            center_y = sum(p[1] for p in face_points) / len(face_points)
+            
+            # Нормаль на экране (масштабированная)
+            scale = 30
+            normal_end_x = center_x + face.normal.x * scale
+            normal_end_y = center_y - face.normal.y * scale  # минус, т.к. ось Y вниз
+            
+            # Рисуем нормаль
+            pygame.draw.line(screen, (255, 255, 0), 
+                           (center_x, center_y), 
+                           (normal_end_x, normal_end_y), 2)
+            
+            # Направление взгляда камеры (синяя стрелка)
+            if view_direction.any():
+                view_end_x = center_x + view_direction[0] * scale
+                view_end_y = center_y - view_direction[1] * scale
+                
+                pygame.draw.line(screen, (100, 200, 255),
+                               (center_x, center_y),
+                               (view_end_x, view_end_y), 1)
+    
+    def draw_highlight(self, screen, hit, camera, color=(255, 255, 0)):
+        """Контур грани, найденной лучом (hit - RayHit, см. picking)"""
+        mesh = hit.mesh
+        indices = mesh.face_indices[mesh.face_offsets[hit.face]:mesh.face_offsets[hit.face + 1]]
+        view_proj_matrix = camera.get_view_projection_matrix() @ hit.model_matrix
+        screen_xy, depth = self.project_vertices(mesh.positions[indices], view_proj_matrix)
+        
+        # Грань, пересекающая ближнюю или дальнюю плоскость, не обводится
+        if len(indices) < 3 or np.any((depth < -1) | (depth > 1)):
+            return
+        pygame.draw.polygon(screen, color, screen_xy.tolist(), 2)
+    
+    def update_cull_stats(self, visible, hidden, off_screen, occluded, total):
+        """Счетчики граней кадра: visible - нарисованные; hidden, off_screen и
+        occluded - отброшенные как нелицевые, по пирамиде видимости и по
+        иерархическому Z-буферу"""
+        self.cull_stats = {
+            'visible': visible,
+            'backface': hidden,
+            'frustum': off_screen,
+            'occlusion': occluded,
+            'total': total,
+        }
+    
+    def draw_stats(self, screen, extra=""):
+        """Строка статистики граней (self.cull_stats) внизу экрана"""
+        stats = self.cull_stats
+        stats_text = (
+            f"Visible: {stats['visible']}, Back-face: {stats['backface']}, "
+            f"Frustum: {stats['frustum']}, Occluded: {stats['occlusion']}, Total: {stats['total']}{extra}"
+        )
+        self.text.draw(screen, stats_text, (200, 255, 200), (10, self.height - 30))
+    
+    def rasterize_faces(self, mesh, face_order, ranks, screen_xy, vertex_depth, face_colors, vertex_levels):
+        """Растеризация треугольников граней face_order[ranks] в Z-буфер
+        
+        face_colors (Kx3) индексируются номером грани в face_order;
+        vertex_levels - уровни яркости вершин для Гуро или None. Треугольники
+        передаются растеризатору одним вызовом draw_triangles.
+        """
+        triangles, triangle_offsets = mesh.get_triangles()
+        faces = face_order[ranks]
+        triangle_corners = triangles[face_corner_indices(triangle_offsets, faces)]
+        owners = np.repeat(ranks, np.diff(triangle_offsets)[faces])
+        colors = face_colors[owners]
+        if vertex_levels is None:
+            self.rasterizer.draw_triangles(screen_xy[triangle_corners], vertex_depth[triangle_corners], colors)
+            return
+        
+        # Гуро: уровни яркости вершин интерполируются растеризатором
+        self.rasterizer.color_lut = self.lighting.lut
+        self.rasterizer.draw_triangles(screen_xy[triangle_corners], vertex_depth[triangle_corners], colors,
+                                       vertex_levels[triangle_corners])
+    
+    def occlusion_test(self, bounds_min, bounds_max, view_proj_matrix, stage_start):
+        """Проверка параллелепипедов по буферу глубины первого прохода
+        
+        Дорисовывает очередь растеризатора, строит DepthPyramid и
+        возвращает маску закрытых параллелепипедов (координаты, в которых
+        задана view_proj_matrix) и начало следующего этапа.
+        """
+        self.rasterizer.flush()
+        stage_start = self._end_stage('rasterization', stage_start)
+        pyramid = DepthPyramid(self.rasterizer.depth_buffer)
+        occluded = pyramid.test_boxes(bounds_min, bounds_max, view_proj_matrix)
+        return occluded, self._end_stage('occlusion', stage_start)
     
     def render(self, screen, model, camera, show_wireframe=True, 
-               show_filled=True, backface_culling=True, show_normals=False):
-        """Рендеринг модели на экран"""
-        view_proj_matrix = camera.get_view_projection_matrix()
+               show_filled=True, backface_culling=True, show_normals=False,
+               frustum_culling=True, occlusion_culling=True):
+        """Рендеринг модели (Model3D или ModelInstance) на экран
+        
+        Время этапов последнего кадра (в секундах) сохраняется в self.stage_times.
+        В режимах Z-буфера occlusion_culling включает отсечение кластеров
+        граней BVH по иерархическому Z-буферу (см. OcclusionCuller).
+        """
+        stage_times = self.stage_times
+        stage_times.clear()
+        stage_start = time.perf_counter()
         
-        # Проецирование всех вершин
-        projected_vertices = []
-        for vertex in model.vertices:
-            projected = self.project_point(vertex, view_proj_matrix)
-            projected_vertices.append(projected)
+        mesh, model_matrix = self.resolve_instance(model)
+        camera_matrix = camera.get_view_projection_matrix()
         
-        visible_faces = 0
+        # Уровень детализации по экранному размеру модели
+        lod = int(self.select_lod(model, mesh, model_matrix[np.newaxis], camera_matrix)[0])
+        lod_info = f", LOD: {lod}" if mesh.lods else ""
+        mesh = mesh.lod_level(lod)
+        
+        # Матрица модели встраивается в матрицу вида и проекции
+        view_proj_matrix = camera_matrix @ model_matrix
+        
+        # Нормали в мировых координатах (обратная транспонированная матрица модели)
+        normal_mat = normal_matrix(model_matrix)
+        normals = mesh.normals
+        if normal_mat is not None:
+            normals = transform_normals_array(normals, normal_mat)
+        faces = FaceList(mesh.face_indices, mesh.face_offsets, normals)
+        
+        # Глубина вершин в пространстве вида для сортировки граней
+        depth_row = view_depth_row(camera.view_matrix, model_matrix)
+        view_depth = mesh.positions @ depth_row[:3] + depth_row[3]
+        stage_start = self._end_stage('transform', stage_start)
+        
+        # Отсечение по пирамиде видимости в координатах модели (до проецирования)
+        candidates = None
+        if frustum_culling:
+            candidates = self.frustum_cull(mesh, extract_frustum_planes(view_proj_matrix))
+        frustum_culled = 0 if candidates is None else len(faces) - len(candidates)
+        
+        # Отсечение нелицевых граней и затенение одним векторным проходом
+        view_direction = self.get_view_direction(camera)
+        dots = self.compute_face_dots(mesh, model_matrix, normals, camera, view_direction)
+        visible_mask = self.cull_faces(dots)
+        stage_start = self._end_stage('culling', stage_start)
+        
+        # Проецирование вершин граней, прошедших отсечение; глубина используется Z-буфером
+        screen_xy, vertex_depth = self.project_visible_vertices(mesh, candidates, view_proj_matrix)
+        
+        # В перспективе грани с вершинами за ближней/дальней плоскостью (или за камерой) не рисуются
+        depth_clipped = None
+        if camera.projection == 'perspective':
+            depth_clipped = (vertex_depth < -1) | (vertex_depth > 1)
+        stage_start = self._end_stage('projection', stage_start)
+        
+        use_zbuffer = self.mode != 'painter' and show_filled
+        
+        # Сортировка граней по средней глубине: дальние рисуются первыми
+        depth = face_depths(view_depth, mesh.face_indices, mesh.face_offsets)
+        if candidates is None:
+            face_order = self.depth_order.sort(depth)
+        else:
+            face_order = candidates[self.depth_order.sort(depth[candidates])]
+        
+        # Отсечение нелицевых граней и граней за ближней/дальней плоскостью сразу для всего порядка
         hidden_faces = 0
+        if backface_culling:
+            front = visible_mask[face_order]
+            hidden_faces = len(face_order) - int(np.count_nonzero(front))
+            face_order = face_order[front]
+        visible_faces = len(face_order)
+        sizes = mesh.face_sizes
+        drawable = sizes[face_order] >= 3
+        if depth_clipped is not None:
+            clipped = np.logical_or.reduceat(depth_clipped[mesh.face_indices], mesh.face_offsets[:-1])
+            drawable &= ~clipped[face_order]
+        face_order = face_order[drawable]
+        
+        # Каркас без заливки и поверх Z-буфера рисуется по уникальным ребрам:
+        # общее ребро двух граней - один раз
+        corners = face_corner_indices(mesh.face_offsets, face_order)
+        edge_segments = None
+        if show_wireframe and (use_zbuffer or not show_filled):
+            edges, corner_edges = mesh.get_edges()
+            used = np.zeros(len(edges), dtype=bool)
+            used[corner_edges[corners]] = True
+            edge_segments = screen_xy[edges[used]]
+        stage_start = self._end_stage('sorting', stage_start)
+        
+        # Освещение только рисуемых граней; цвета идут в порядке face_order
+        face_colors = None
+        vertex_levels = None
+        if show_filled:
+            face_colors, vertex_levels = self.light_faces(
+                model, mesh, model_matrix, normals, dots, face_order, camera, use_zbuffer
+            )
+            if not use_zbuffer:
+                face_colors = face_colors.tolist()
+            stage_start = self._end_stage('lighting', stage_start)
         
-        # Сортируем грани по глубине для правильного отображения (простейший вариант)
-        # Создаем список граней с их средней глубиной
-        faces_with_depth = []
-        for i, face in enumerate(model.faces):
-            # Вычисляем среднюю Z-координату грани
-            avg_z = 0
-            count = 0
-            for idx in face.vertex_indices:
-                if idx < len(model.vertices):
-                    avg_z += model.vertices[idx].z
-                    count += 1
-            if count > 0:
-                avg_z /= count
-                faces_with_depth.append((avg_z, i, face))
-        
-        # Сортируем по глубине (дальние рисуем первыми)
-        faces_with_depth.sort(reverse=True)  # reverse=True: дальние -> ближние
-        
-        # Рендеринг граней от дальних к ближним
-        for depth, i, face in faces_with_depth:
-            # Отсечение нелицевых граней
-            if backface_culling:
-                is_visible = self.is_face_visible(face, model.vertices, camera.position, camera.target)
-                if not is_visible:
-                    hidden_faces += 1
-                    continue
+        occluded_faces = 0
+        if use_zbuffer:
+            # Z-буфер: треугольники всех нарисованных граней одним набором массивов
+            self.rasterizer.clear()
+            ranks = np.arange(len(face_order))
+            if occlusion_culling and len(face_order):
+                # Первый проход - кластеры BVH, видимые в прошлом кадре; затем
+                # кластеры всех рисуемых граней проверяются по Hi-Z, и
+                # незакрытые новые кластеры дорисовываются вторым проходом
+                bvh = mesh.get_bvh()
+                face_leaves = bvh.face_leaves()[face_order]
+                first = self.occlusion.previous(mesh, len(bvh))[face_leaves]
+                self.rasterize_faces(mesh, face_order, ranks[first], screen_xy, vertex_depth,
+                                     face_colors, vertex_levels)
+                
+                leaves = np.unique(face_leaves)
+                occluded, stage_start = self.occlusion_test(
+                    bvh.bounds_min[leaves], bvh.bounds_max[leaves], view_proj_matrix, stage_start
+                )
+                visible = np.zeros(len(bvh), dtype=bool)
+                visible[leaves[~occluded]] = True
+                self.occlusion.update(mesh, visible)
+                
+                second = ~first & visible[face_leaves]
+                occluded_faces = int(np.count_nonzero(~first & ~second))
+                ranks = ranks[second]
+            self.rasterize_faces(mesh, face_order, ranks, screen_xy, vertex_depth,
+                                 face_colors, vertex_levels)
             
-            visible_faces += 1
+            # Каркас поверх готового кадра
+            if edge_segments is not None:
+                self.rasterizer.draw_lines(edge_segments[:, 0], edge_segments[:, 1], (255, 255, 255))
+            self.rasterizer.present(screen)
             
-            # Координаты вершин грани
-            face_points = []
-            for idx in face.vertex_indices:
-                if 0 <= idx < len(projected_vertices):
-                    face_points.append(projected_vertices[idx])
+            if show_normals:
+                for i in face_order.tolist():
+                    face = faces[i]
+                    self.draw_face_normal(screen, face, screen_xy[face.vertex_indices].tolist(), view_direction)
+        else:
+            # Рендеринг граней от дальних к ближним; при заливке контур грани
+            # рисуется сразу после нее, чтобы его закрывали более близкие грани
+            if show_filled or show_normals:
+                corner_xy = screen_xy[mesh.face_indices[corners]].tolist()
+                bounds = np.concatenate([[0], np.cumsum(sizes[face_order])]).tolist()
+                for rank, i in enumerate(face_order.tolist()):
+                    face_points = corner_xy[bounds[rank]:bounds[rank + 1]]
+                    
+                    # Заполненная грань
+                    if show_filled:
+                        pygame.draw.polygon(screen, face_colors[rank], face_points)
+                        if show_wireframe:
+                            pygame.draw.polygon(screen, (255, 255, 255), face_points, 1)
+                    
+                    if show_normals:
+                        self.draw_face_normal(screen, faces[i], face_points, view_direction)
             
-            if len(face_points) < 3:
+            if edge_segments is not None:
+                self.draw_lines(screen, edge_segments[:, 0], edge_segments[:, 1], (255, 255, 255))
+        
+        stage_start = self._end_stage('rasterization', stage_start)
+        
+        # Статистика (счетчики отсечения сохраняются и при show_stats = False)
+        self.update_cull_stats(visible_faces - occluded_faces, hidden_faces, frustum_culled,
+                               occluded_faces, len(faces))
+        if self.show_stats:
+            self.draw_stats(screen, lod_info)
+        
+        # Отображение угла для отладки
+        if self.show_stats and len(faces) > 0 and view_direction.any():
+            dot = float(normals[0] @ view_direction)
+            angle = np.degrees(np.arccos(max(-1, min(1, dot))))
+            self.text.draw(screen, f"Angle: {angle:.1f}°", (255, 200, 100), (10, self.height - 60))
+        
+        self._end_stage('hud', stage_start)
+    
+    def light_instances(self, mesh, world, normals, normal_mats, dots, instance_ids, face_ids,
+                        base_colors, camera, per_vertex):
+        """Цвета видимых граней экземпляров (пары instance_ids, face_ids)
+        
+        world - вершины экземпляров (K x N x 3), normals - нормали граней
+        (K x F x 3), normal_mats - матрицы нормалей экземпляров. Как и в
+        light_faces, для 'gouraud' при per_vertex возвращаются базовые цвета
+        и уровни яркости вершин (K x N; освещены только вершины граней
+        face_ids), иначе уровни равны None.
+        """
+        if self.shading == 'view' or len(face_ids) == 0:
+            return self.shade_faces(dots[instance_ids, face_ids], base_colors), None
+        
+        lighting = self.lighting
+        starts = mesh.face_offsets[:-1]
+        sizes = mesh.face_sizes
+        if self.shading == 'flat':
+            centers = np.add.reduceat(world[:, mesh.face_indices], starts, axis=1)[instance_ids, face_ids]
+            centers /= sizes[face_ids][:, np.newaxis]
+            return lighting.shade(
+                base_colors, centers, normals[instance_ids, face_ids], self.eye_vectors(centers, camera)
+            ), None
+        
+        # Гуро: освещаются только пары (экземпляр, вершина) рисуемых граней
+        count = world.shape[1]
+        corners = face_corner_indices(mesh.face_offsets, face_ids)
+        corner_instances = np.repeat(instance_ids, sizes[face_ids])
+        corner_vertices = mesh.face_indices[corners]
+        used_instances, used_vertices = np.divmod(np.unique(corner_instances * count + corner_vertices), count)
+        points = world[used_instances, used_vertices]
+        vertex_normals = np.einsum(
+            'ij,ijk->ik', mesh.get_smooth_normals()[used_vertices], normal_mats[used_instances]
+        )
+        lengths = np.linalg.norm(vertex_normals, axis=1, keepdims=True)
+        np.divide(vertex_normals, lengths, out=vertex_normals, where=lengths > 0)
+        levels = np.zeros(world.shape[:2], dtype=np.uint8)
+        levels[used_instances, used_vertices] = lighting.quantize(
+            lighting.intensity(points, vertex_normals, self.eye_vectors(points, camera))
+        )
+        if per_vertex:
+            return base_colors, levels
+        face_starts = np.concatenate([[0], np.cumsum(sizes[face_ids])[:-1]])
+        face_levels = np.add.reduceat(levels[corner_instances, corner_vertices].astype(float), face_starts)
+        face_levels /= sizes[face_ids]
+        return lighting.colors(base_colors, np.rint(face_levels).astype(np.uint8)), None
+    
+    def cull_instances(self, mesh, matrices, planes):
+        """Маска экземпляров, ограничивающая сфера которых пересекает пирамиду видимости
+        
+        planes - плоскости в мировых координатах; радиус сферы масштабируется
+        наибольшей длиной столбца линейной части матрицы модели.
+        """
+        center, radius = mesh.get_bounding_sphere()
+        if center is None:
+            return np.zeros(len(matrices), dtype=bool)
+        
+        centers = matrices[:, :3, :3] @ center + matrices[:, :3, 3]
+        scales = np.sqrt((matrices[:, :3, :3] ** 2).sum(axis=1).max(axis=1))
+        distances = centers @ planes[:, :3].T + planes[:, 3]
+        return np.all(distances >= -(radius * scales)[:, np.newaxis], axis=1)
+    
+    def rasterize_instances(self, data, select=None):
+        """Растеризация граней экземпляров одной группы render_scene в Z-буфер
+        
+        data - данные группы (грани, экземпляры, цвета, проекции вершин),
+        select - маска рисуемых граней группы (None - все).
+        """
+        ranks = np.arange(len(data['faces']))
+        if select is not None:
+            ranks = ranks[select]
+        triangles, triangle_offsets = data['mesh'].get_triangles()
+        faces = data['faces'][ranks]
+        counts = np.diff(triangle_offsets)[faces]
+        corners = triangles[face_corner_indices(triangle_offsets, faces)]
+        instances = np.repeat(data['instances'][ranks], counts)[:, np.newaxis]
+        triangle_xy = data['screen_xy'][instances, corners]
+        triangle_depth = data['vertex_depth'][instances, corners]
+        colors = data['colors'][ranks][np.repeat(np.arange(len(counts)), counts)]
+        if data['levels'] is None:
+            self.rasterizer.draw_triangles(triangle_xy, triangle_depth, colors)
+            return
+        
+        self.rasterizer.color_lut = self.lighting.lut
+        self.rasterizer.draw_triangles(triangle_xy, triangle_depth, colors, data['levels'][instances, corners])
+    
+    def render_scene(self, screen, scene, camera, show_wireframe=True,
+                     show_filled=True, backface_culling=True, frustum_culling=True,
+                     occlusion_culling=True):
+        """Рендеринг сцены из многих экземпляров (Scene)
+        
+        Все экземпляры одной сетки обрабатываются вместе: вершины и нормали
+        преобразуются стопкой матриц модели, проецируются и отсекаются
+        векторно. Грани всех сеток затем сортируются по глубине общим
+        argsort, и только видимые грани рисуются по одной. В режимах
+        Z-буфера occlusion_culling включает отсечение экземпляров по
+        иерархическому Z-буферу (см. OcclusionCuller).
+        """
+        stage_times = self.stage_times
+        stage_times.clear()
+        stage_start = time.perf_counter()
+        
+        view_proj_matrix = camera.get_view_projection_matrix()
+        planes = camera.get_frustum_planes()
+        view_direction = self.get_view_direction(camera)
+        depth_row = view_depth_row(camera.view_matrix)
+        perspective = camera.projection == 'perspective'
+        palette = np.array(self.colors, dtype=float)
+        use_zbuffer = self.mode != 'painter' and show_filled
+        
+        total_faces = 0
+        total_instances = 0
+        drawn_instances = 0
+        frustum_culled = 0
+        hidden_faces = 0
+        
+        # Данные видимых граней каждой сетки для общей сортировки
+        batches = []
+        for batch in scene.batches:
+            mesh = batch.mesh
+            face_count = len(mesh.face_offsets) - 1
+            total_faces += face_count * len(batch)
+            total_instances += len(batch)
+            if len(batch) == 0 or face_count == 0:
                 continue
             
-            # Заполненная грань
-            if show_filled:
-                color = self.calculate_face_color(face, i, model.vertices, camera.position, camera.target)
-                pygame.draw.polygon(screen, color, face_points)
-            
-            # Каркас
-            if show_wireframe:
-                pygame.draw.polygon(screen, (255, 255, 255), face_points, 1)
+            # Отсечение экземпляров по ограничивающей сфере и вырожденных матриц
+            matrices = batch.matrices
+            keep = self.cull_instances(mesh, matrices, planes) if frustum_culling else np.ones(len(batch), dtype=bool)
+            linear = matrices[:, :3, :3]
+            det = np.linalg.det(linear)
+            keep &= np.abs(det) >= 1e-12
+            ids = np.flatnonzero(keep)
+            frustum_culled += face_count * (len(batch) - len(ids))
+            stage_start = self._end_stage('culling', stage_start)
+            if len(ids) == 0:
+                continue
+            drawn_instances += len(ids)
             
-            # Визуализация нормалей
-            if show_normals and face.normal and len(face_points) >= 3:
-                # Центр грани на экране
-                center_x = sum(p[0] for p in face_points) / len(face_points)
-                center_y = sum(p[1] for p in face_points) / len(face_points)
+            # Экземпляры обрабатываются группами одного уровня детализации
+            levels = self.select_lod(batch, mesh, matrices, view_proj_matrix)[ids]
+            for level in np.unique(levels).tolist():
+                group = ids[levels == level]
+                mesh = batch.mesh.lod_level(level)
                 
-                # Нормаль на экране (масштабированная)
-                scale = 30
-                normal_end_x = center_x + face.normal.x * scale
-                normal_end_y = center_y - face.normal.y * scale  # минус, т.к. ось Y вниз
+                # Вершины (K x N x 3) и нормали граней (K x F x 3) всех экземпляров
+                linear = matrices[group, :3, :3]
+                world = transform_points_batch(mesh.positions, matrices[group])
+                normal_mats = np.linalg.inv(linear) * np.sign(det[group])[:, np.newaxis, np.newaxis]
+                normals = mesh.normals @ normal_mats
+                lengths = np.linalg.norm(normals, axis=2, keepdims=True)
+                np.divide(normals, lengths, out=normals, where=lengths > 0)
                 
-                # Рисуем нормаль
-                pygame.draw.line(screen, (255, 255, 0), 
-                               (center_x, center_y), 
-                               (normal_end_x, normal_end_y), 2)
+                # Средняя глубина граней в пространстве вида для сортировки
+                starts = mesh.face_offsets[:-1]
+                sizes = np.diff(mesh.face_offsets)
+                face_depth = face_depths(world @ depth_row[:3] + depth_row[3], mesh.face_indices, mesh.face_offsets)
+                stage_start = self._end_stage('transform', stage_start)
                 
-                # Направление взгляда камеры (синяя стрелка)
-                view_direction = Point(
-                    camera.target.x - camera.position.x,
-                    camera.target.y - camera.position.y,
-                    camera.target.z - camera.position.z
-                )
-                view_len = np.sqrt(view_direction.x**2 + view_direction.y**2 + view_direction.z**2)
-                if view_len > 0:
-                    view_direction.x /= view_len
-                    view_direction.y /= view_len
-                    view_direction.z /= view_len
-                    
-                    view_end_x = center_x + view_direction.x * scale
-                    view_end_y = center_y - view_direction.y * scale
-                    
-                    pygame.draw.line(screen, (100, 200, 255),
-                                   (center_x, center_y),
-                                   (view_end_x, view_end_y), 1)
+                # Отсечение нелицевых граней всех экземпляров
+                if perspective:
+                    centers = np.add.reduceat(world[:, mesh.face_indices], starts, axis=1)
+                    centers /= sizes[:, np.newaxis]
+                    eye = centers - camera.position.to_array()
+                    lengths = np.linalg.norm(eye, axis=2, keepdims=True)
+                    np.divide(eye, lengths, out=eye, where=lengths > 0)
+                    dots = np.einsum('kfi,kfi->kf', normals, eye)
+                else:
+                    dots = normals @ view_direction
+                if backface_culling:
+                    visible = self.cull_faces(dots)
+                    hidden_faces += int(visible.size - np.count_nonzero(visible))
+                else:
+                    visible = np.ones(dots.shape, dtype=bool)
+                instance_ids, face_ids = np.nonzero(visible)
+                stage_start = self._end_stage('culling', stage_start)
+                
+                # Цвета: цвет экземпляра или палитра по номеру грани
+                colors = None
+                levels = None
+                if show_filled:
+                    instance_colors = batch.colors[group][instance_ids]
+                    base_colors = np.where(
+                        instance_colors[:, :1] >= 0,
+                        instance_colors,
+                        palette[face_ids % len(palette)]
+                    )
+                    colors, levels = self.light_instances(
+                        mesh, world, normals, normal_mats, dots, instance_ids, face_ids,
+                        base_colors, camera, use_zbuffer
+                    )
+                    stage_start = self._end_stage('lighting', stage_start)
+                
+                # Проецирование всех вершин экземпляров одним вызовом
+                screen_xy, vertex_depth = self.project_vertices(world.reshape(-1, 3), view_proj_matrix)
+                vertex_count = len(mesh.positions)
+                keys = face_depth[instance_ids, face_ids]
+                
+                # В перспективе отбрасываются грани с вершинами вне диапазона глубины
+                if perspective:
+                    corner_depth = vertex_depth.reshape(len(group), vertex_count)[:, mesh.face_indices]
+                    outside = (corner_depth < -1) | (corner_depth > 1)
+                    clipped = np.logical_or.reduceat(outside, starts, axis=1)[instance_ids, face_ids]
+                    if clipped.any():
+                        instance_ids, face_ids, keys = instance_ids[~clipped], face_ids[~clipped], keys[~clipped]
+                        if colors is not None:
+                            colors = colors[~clipped]
+                batches.append({
+                    'batch': batch,
+                    'group': group,
+                    'mesh': mesh,
+                    'instances': instance_ids,
+                    'faces': face_ids,
+                    'keys': keys,
+                    'colors': colors,
+                    'levels': levels,
+                    'screen_xy': screen_xy.reshape(len(group), vertex_count, 2),
+                    'vertex_depth': vertex_depth.reshape(len(group), vertex_count),
+                })
+                stage_start = self._end_stage('projection', stage_start)
         
-        # Статистика
-        font = pygame.font.Font(None, 24)
-        stats_text = f"Visible: {visible_faces}, Hidden: {hidden_faces}, Total: {len(model.faces)}"
-        stats_surface = font.render(stats_text, True, (200, 255, 200))
-        screen.blit(stats_surface, (10, self.height - 30))
+        # Общий порядок граней всех сеток: от дальних к ближним
+        if batches:
+            keys = np.concatenate([data['keys'] for data in batches])
+            batch_ids = np.repeat(np.arange(len(batches)), [len(data['keys']) for data in batches])
+            local_ids = np.concatenate([np.arange(len(data['keys'])) for data in batches])
+            order = self.scene_depth_order.sort(keys)
+            draw_order = list(zip(batch_ids[order].tolist(), local_ids[order].tolist()))
+        else:
+            draw_order = []
+        stage_start = self._end_stage('sorting', stage_start)
         
-        # Отображение угла для отладки
-        if len(model.faces) > 0 and model.faces[0].normal:
-            normal = model.faces[0].normal
-            view_direction = Point(
-                camera.target.x - camera.position.x,
-                camera.target.y - camera.position.y,
-                camera.target.z - camera.position.z
-            )
-            view_len = np.sqrt(view_direction.x**2 + view_direction.y**2 + view_direction.z**2)
-            if view_len > 0:
-                view_direction.x /= view_len
-                view_direction.y /= view_len
-                view_direction.z /= view_len
+        # Каркас без заливки и поверх Z-буфера рисуется по уникальным ребрам
+        # экземпляров: ключ - номер экземпляра в пакете * число ребер + ребро
+        edge_segments = None
+        if show_wireframe and (use_zbuffer or not show_filled) and batches:
+            segments = []
+            for data in batches:
+                mesh = data['mesh']
+                edges, corner_edges = mesh.get_edges()
+                sizes = np.diff(mesh.face_offsets)[data['faces']]
+                corners = face_corner_indices(mesh.face_offsets, data['faces'])
+                used = np.zeros(len(data['screen_xy']) * len(edges), dtype=bool)
+                used[np.repeat(data['instances'], sizes) * len(edges) + corner_edges[corners]] = True
+                instance, edge = np.divmod(np.flatnonzero(used), len(edges))
+                segments.append(data['screen_xy'][instance[:, np.newaxis], edges[edge]])
+            edge_segments = np.concatenate(segments)
+        
+        occluded_faces = 0
+        if use_zbuffer:
+            # Z-буфер: треугольники всех видимых граней, порядок не важен
+            self.rasterizer.clear()
+            selected = [None] * len(batches)
+            if occlusion_culling and batches:
+                # Первый проход - экземпляры, видимые в прошлом кадре; затем
+                # параллелепипеды всех экземпляров проверяются по Hi-Z
+                for k, data in enumerate(batches):
+                    batch = data['batch']
+                    previous = self.occlusion.previous(batch, len(batch))
+                    selected[k] = previous[data['group'][data['instances']]]
+                    self.rasterize_instances(data, selected[k])
                 
-                dot = (normal.x * view_direction.x + 
-                      normal.y * view_direction.y + 
-                      normal.z * view_direction.z)
+                groups = [data['group'] for data in batches]
+                boxes = [
+                    transform_boxes(*data['mesh'].get_bounds(), data['batch'].matrices[data['group']])
+                    for data in batches
+                ]
+                occluded, stage_start = self.occlusion_test(
+                    np.concatenate([box[0] for box in boxes]),
+                    np.concatenate([box[1] for box in boxes]),
+                    view_proj_matrix, stage_start
+                )
+                
+                # Маски видимости групп экземпляров для следующего кадра
+                visibility = {}
+                bounds = np.cumsum([0] + [len(group) for group in groups])
+                for k, data in enumerate(batches):
+                    batch = data['batch']
+                    visible = visibility.get(batch)
+                    if visible is None:
+                        visible = visibility[batch] = np.zeros(len(batch), dtype=bool)
+                    visible[groups[k]] = ~occluded[bounds[k]:bounds[k + 1]]
+                    
+                    first = selected[k]
+                    selected[k] = ~first & visible[groups[k][data['instances']]]
+                    occluded_faces += int(np.count_nonzero(~first & ~selected[k]))
+                for key, visible in visibility.items():
+                    self.occlusion.update(key, visible)
+            for data, select in zip(batches, selected):
+                self.rasterize_instances(data, select)
+            if edge_segments is not None:
+                self.rasterizer.draw_lines(edge_segments[:, 0], edge_segments[:, 1], (255, 255, 255))
+            self.rasterizer.present(screen)
+        else:
+            if show_filled:
+                # Списки Python для быстрого доступа в цикле рисования
+                lists = []
+                for data in batches:
+                    offsets = data['mesh'].face_offsets.tolist()
+                    lists.append((
+                        data['instances'].tolist(),
+                        [(offsets[f], offsets[f + 1]) for f in data['faces'].tolist()],
+                        data['colors'].tolist(),
+                        data['screen_xy'][:, data['mesh'].face_indices].tolist(),
+                    ))
                 
-                angle = np.degrees(np.arccos(max(-1, min(1, dot))))
-                angle_text = f"Angle: {angle:.1f}°"
-                angle_surface = font.render(angle_text, True, (255, 200, 100))
-                screen.blit(angle_surface, (10, self.height - 60))
\ No newline at end of file
+                # Контур грани рисуется сразу после заливки, чтобы его закрывали более близкие грани
+                for b, j in draw_order:
+                    instance_ids, ranges, colors, corner_xy = lists[b]
+                    first, last = ranges[j]
+                    face_points = corner_xy[instance_ids[j]][first:last]
+                    pygame.draw.polygon(screen, colors[j], face_points)
+                    if show_wireframe:
+                        pygame.draw.polygon(screen, (255, 255, 255), face_points, 1)
+            
+            if edge_segments is not None:
+                self.draw_lines(screen, edge_segments[:, 0], edge_segments[:, 1], (255, 255, 255))
+        
+        stage_start = self._end_stage('rasterization', stage_start)
+        
+        self.update_cull_stats(len(draw_order) - occluded_faces, hidden_faces, frustum_culled,
+                               occluded_faces, total_faces)
+        if self.show_stats:
+            self.draw_stats(screen, f", Instances: {drawn_instances}/{total_instances}")
+        self._end_stage('hud', stage_start)
@@ -0,0 +1,149 @@
+# scene.py
+import numpy as np
+from transformations import identity_matrix
+
+class ModelInstance:
+    """Экземпляр модели на сцене: ссылка на базовую сетку и матрица модели
+    
+    Базовая сетка (Model3D) не копируется и не изменяется при вращении,
+    все преобразования экземпляра хранятся в матрице модели 4x4.
+    color - единый базовый цвет граней (None - палитра рендерера).
+    """
+    
+    def __init__(self, mesh, model_matrix=None, color=None):
+        self.mesh = mesh
+        self.model_matrix = model_matrix if model_matrix is not None else identity_matrix()
+        self.color = color
+    
+    def __str__(self):
+        return f"ModelInstance({self.mesh})"
+    
+    def apply_transform(self, matrix):
+        """Добавление преобразования к матрице модели (сетка не меняется)"""
+        self.model_matrix = matrix @ self.model_matrix
+    
+    def reset_transform(self):
+        """Сброс матрицы модели"""
+        self.model_matrix = identity_matrix()
+
+class InstanceBatch:
+    """Все экземпляры одной сетки
+    
+    Матрицы модели (Kx4x4) и цвета (Kx3, -1 - палитра рендерера) хранятся в
+    общих массивах, которые растут удвоением емкости. Свойства matrices и
+    colors возвращают представления, их можно изменять на месте.
+    """
+    
+    def __init__(self, mesh, capacity=16):
+        self.mesh = mesh
+        self._count = 0
+        self._matrices = np.empty((capacity, 4, 4))
+        self._colors = np.empty((capacity, 3), dtype=np.int16)
+    
+    def __len__(self):
+        return self._count
+    
+    @property
+    def matrices(self):
+        return self._matrices[:self._count]
+    
+    @property
+    def colors(self):
+        return self._colors[:self._count]
+    
+    def _reserve(self, count):
+        """Увеличение емкости массивов до count экземпляров"""
+        capacity = len(self._matrices)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        matrices = np.empty((capacity, 4, 4))
+        colors = np.empty((capacity, 3), dtype=np.int16)
+        matrices[:self._count] = self.matrices
+        colors[:self._count] = self.colors
+        self._matrices = matrices
+        self._colors = colors
+    
+    def add(self, model_matrix=None, color=None):
+        """Добавление экземпляра; возвращает его индекс"""
+        if model_matrix is None:
+            model_matrix = identity_matrix()
+        colors = None if color is None else [color]
+        return self.extend(model_matrix, colors).start
+    
+    def extend(self, matrices, colors=None):
+        """Добавление многих экземпляров сразу; возвращает диапазон их индексов"""
+        matrices = np.asarray(matrices, dtype=float).reshape(-1, 4, 4)
+        first = self._count
+        self._reserve(first + len(matrices))
+        self._count += len(matrices)
+        self._matrices[first:self._count] = matrices
+        self._colors[first:self._count] = -1 if colors is None else np.asarray(colors).reshape(-1, 3)
+        return range(first, self._count)
+    
+    def remove(self, index):
+        """Удаление экземпляра: на его место переносится последний"""
+        last = self._count - 1
+        if not 0 <= index <= last:
+            raise IndexError("instance index out of range")
+        self._matrices[index] = self._matrices[last]
+        self._colors[index] = self._colors[last]
+        self._count = last
+    
+    def clear(self):
+        self._count = 0
+
+class Scene:
+    """Сцена из многих экземпляров, разделяющих общие сетки
+    
+    Экземпляры группируются по сетке в InstanceBatch, поэтому память
+    пропорциональна числу уникальных сеток и числу экземпляров, а рендерер
+    обрабатывает все экземпляры одной сетки одним набором матричных операций.
+    """
+    
+    def __init__(self):
+        self._batches = {}
+    
+    def __len__(self):
+        return sum(len(batch) for batch in self._batches.values())
+    
+    @property
+    def batches(self):
+        return list(self._batches.values())
+    
+    def batch(self, mesh):
+        """Группа экземпляров сетки (создается при первом обращении)"""
+        batch = self._batches.get(id(mesh))
+        if batch is None:
+            batch = self._batches[id(mesh)] = InstanceBatch(mesh)
+        return batch
+    
+    def add(self, mesh, model_matrix=None, color=None):
+        """Добавление экземпляра сетки; возвращает индекс в группе scene.batch(mesh)"""
+        return self.batch(mesh).add(model_matrix, color)
+    
+    def add_instance(self, instance):
+        """Добавление объекта ModelInstance"""
+        return self.add(instance.mesh, instance.model_matrix, instance.color)
+    
+    def extend(self, mesh, matrices, colors=None):
+        """Добавление многих экземпляров одной сетки"""
+        return self.batch(mesh).extend(matrices, colors)
+    
+    def remove_mesh(self, mesh):
+        """Удаление сетки вместе со всеми ее экземплярами"""
+        self._batches.pop(id(mesh), None)
+    
+    def clear(self):
+        self._batches.clear()
+
+def grid_matrices(rows, cols, spacing, scale=1.0):
+    """Матрицы модели для сетки rows x cols экземпляров в плоскости XY с центром в нуле"""
+    ys, xs = np.divmod(np.arange(rows * cols), cols)
+    matrices = np.zeros((rows * cols, 4, 4))
+    matrices[:, 0, 0] = matrices[:, 1, 1] = matrices[:, 2, 2] = scale
+    matrices[:, 3, 3] = 1
+    matrices[:, 0, 3] = (xs - (cols - 1) / 2) * spacing
+    matrices[:, 1, 3] = (ys - (rows - 1) / 2) * spacing
+    return matrices
@@ -0,0 +1,33 @@
+# test_obj_parser.py
+import numpy as np
+import pytest
+from obj_parser import ObjParseError, parse_obj
+
+VERTICES = b"v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nvt 1 0\nvt 0 1\nvn 0 0 1\n"
+
+def write_obj(tmp_path, text):
+    path = tmp_path / "model.obj"
+    path.write_bytes(text)
+    return str(path)
+
+def test_mixed_plain_and_full_corners(tmp_path):
+    """Грани без '/' и с v/vt/vn в одном блоке (столько же '/', сколько углов)"""
+    data = parse_obj(write_obj(tmp_path, VERTICES + b"f 1 2 3\nf 1/1/1 2/2/1 3/3/1\n"))
+    assert data.face_vertices.tolist() == [0, 1, 2, 0, 1, 2]
+    assert data.face_texcoords.tolist() == [-1, -1, -1, 0, 1, 2]
+    assert data.face_normals.tolist() == [-1, -1, -1, 0, 0, 0]
+
+def test_mixed_texcoord_and_normal_corners(tmp_path):
+    data = parse_obj(write_obj(tmp_path, VERTICES + b"f 1/1 2/2 3/3\nf 1//1 2//1 3//1\nf 1 2 3\n"))
+    assert data.face_vertices.tolist() == [0, 1, 2] * 3
+    assert data.face_texcoords.tolist() == [0, 1, 2] + [-1] * 6
+    assert data.face_normals.tolist() == [-1, -1, -1, 0, 0, 0, -1, -1, -1]
+
+def test_short_vertex_line_is_rejected(tmp_path):
+    with pytest.raises(ObjParseError):
+        parse_obj(write_obj(tmp_path, b"v 0 0 0\nv 1 0\nv 0 1 0 5\n"))
+
+def test_uniform_corners(tmp_path):
+    data = parse_obj(write_obj(tmp_path, VERTICES + b"f 1/1/1 2/2/1 3/3/1\nf -3/-3/-1 -2/-2/-1 -1/-1/-1\n"))
+    assert data.face_vertices.tolist() == [0, 1, 2, 0, 1, 2]
+    assert np.array_equal(data.face_offsets, [0, 3, 6])
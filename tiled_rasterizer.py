@@ -0,0 +1,210 @@
+# tiled_rasterizer.py
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from rasterizer import ZBufferRasterizer, color_tables, rasterize_triangles
+
+# Буферы кадра в процессах-исполнителях (подключаются в _init_worker)
+_worker_buffers = {}
+
+def _init_worker(color_name, depth_name, width, height):
+    """Инициализация исполнителя: отображение буферов кадра из разделяемой памяти"""
+    # Исполнители используют трекер ресурсов главного процесса, который и удаляет блоки
+    color_shm = shared_memory.SharedMemory(name=color_name)
+    depth_shm = shared_memory.SharedMemory(name=depth_name)
+    _worker_buffers['shm'] = (color_shm, depth_shm)
+    _worker_buffers['color'] = np.ndarray((width, height, 3), dtype=np.uint8, buffer=color_shm.buf)
+    _worker_buffers['depth'] = np.ndarray((width, height), dtype=np.float32, buffer=depth_shm.buf)
+
+def _rasterize_tiles(tasks):
+    """Растеризация группы плиток в общий буфер кадра
+    
+    tasks - список (clip, xy, z, colors, levels, tables, table_ids); levels
+    (уровни вершин), tables (таблицы базовых цветов, см. color_tables) и
+    table_ids (номер таблицы треугольника) заданы только для затенения по
+    Гуро. Каждая плитка пишет только в свой прямоугольник, поэтому
+    синхронизация между исполнителями не нужна.
+    """
+    color_buffer = _worker_buffers['color']
+    depth_buffer = _worker_buffers['depth']
+    for clip, xy, z, colors, levels, tables, table_ids in tasks:
+        rasterize_triangles(color_buffer, depth_buffer, xy, z, colors, clip, levels, tables, table_ids)
+    return len(tasks)
+
+def bin_triangles(xy, width, height, tile_size):
+    """Распределение треугольников по экранным плиткам
+    
+    Возвращает словарь {(tile_x, tile_y): массив индексов треугольников}.
+    """
+    tiles_x = (width + tile_size - 1) // tile_size
+    tiles_y = (height + tile_size - 1) // tile_size
+    
+    # Диапазоны плиток, покрываемых ограничивающим прямоугольником треугольника
+    lo = np.floor(xy.min(axis=1) / tile_size).astype(np.int64)
+    hi = np.floor(xy.max(axis=1) / tile_size).astype(np.int64)
+    lo[:, 0] = np.clip(lo[:, 0], 0, tiles_x - 1)
+    hi[:, 0] = np.clip(hi[:, 0], 0, tiles_x - 1)
+    lo[:, 1] = np.clip(lo[:, 1], 0, tiles_y - 1)
+    hi[:, 1] = np.clip(hi[:, 1], 0, tiles_y - 1)
+    
+    # Полностью внеэкранные треугольники не попадают ни в одну плитку
+    on_screen = (
+        (xy[:, :, 0].max(axis=1) >= 0) & (xy[:, :, 0].min(axis=1) < width) &
+        (xy[:, :, 1].max(axis=1) >= 0) & (xy[:, :, 1].min(axis=1) < height)
+    )
+    span_x = np.where(on_screen, hi[:, 0] - lo[:, 0] + 1, 0)
+    span_y = hi[:, 1] - lo[:, 1] + 1
+    counts = span_x * span_y
+    
+    # Развертка пар (треугольник, плитка) без цикла по треугольникам
+    tri_ids = np.repeat(np.arange(len(xy)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_x = lo[tri_ids, 0] + local % span_x[tri_ids]
+    tile_y = lo[tri_ids, 1] + local // span_x[tri_ids]
+    tile_ids = tile_y * tiles_x + tile_x
+    
+    order = np.argsort(tile_ids, kind='stable')
+    tile_ids = tile_ids[order]
+    tri_ids = tri_ids[order]
+    unique_tiles, starts = np.unique(tile_ids, return_index=True)
+    ends = np.append(starts[1:], len(tile_ids))
+    
+    return {
+        (int(t % tiles_x), int(t // tiles_x)): tri_ids[a:b]
+        for t, a, b in zip(unique_tiles, starts, ends)
+    }
+
+class TiledRasterizer(ZBufferRasterizer):
+    """Многопроцессная растеризация по экранным плиткам
+    
+    Буферы цвета и глубины лежат в multiprocessing.shared_memory. Треугольники
+    кадра накапливаются, при выводе распределяются по плиткам tile_size x tile_size
+    и растеризуются пулом из workers процессов; главный процесс только выводит
+    готовый буфер на экран.
+    """
+    
+    def __init__(self, width, height, clear_color=(30, 30, 40), workers=None,
+                 tile_size=64, min_parallel_triangles=256):
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_size = tile_size
+        # Для маленьких кадров накладные расходы пула больше выигрыша
+        self.min_parallel_triangles = min_parallel_triangles
+        self._pool = None
+        self._pending_xy = []
+        self._pending_z = []
+        self._pending_colors = []
+        self._pending_levels = []
+        super().__init__(width, height, clear_color)
+    
+    def _allocate_buffers(self):
+        """Выделение буферов кадра в разделяемой памяти"""
+        self._color_shm = shared_memory.SharedMemory(create=True, size=self.width * self.height * 3)
+        self._depth_shm = shared_memory.SharedMemory(create=True, size=self.width * self.height * 4)
+        self.color_buffer = np.ndarray((self.width, self.height, 3), dtype=np.uint8,
+                                       buffer=self._color_shm.buf)
+        self.depth_buffer = np.ndarray((self.width, self.height), dtype=np.float32,
+                                       buffer=self._depth_shm.buf)
+    
+    def _get_pool(self):
+        """Ленивое создание пула исполнителей"""
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self._color_shm.name, self._depth_shm.name, self.width, self.height)
+            )
+        return self._pool
+    
+    def clear(self):
+        """Очистка буферов и списка треугольников кадра"""
+        super().clear()
+        self._pending_xy.clear()
+        self._pending_z.clear()
+        self._pending_colors.clear()
+        self._pending_levels.clear()
+    
+    def draw_triangle(self, xy, z, color, levels=None):
+        """Добавление треугольника в очередь кадра
+        
+        Уровни яркости вершин (levels) задаются либо для всех треугольников
+        кадра, либо ни для одного.
+        """
+        self.draw_triangles([xy], [z], [color], None if levels is None else [levels])
+    
+    def draw_triangles(self, xy, z, colors, levels=None):
+        """Добавление массива треугольников в очередь кадра (см. draw_triangle)"""
+        self._pending_xy.append(np.asarray(xy, dtype=np.float64).reshape(-1, 3, 2))
+        self._pending_z.append(np.asarray(z, dtype=np.float64).reshape(-1, 3))
+        self._pending_colors.append(np.asarray(colors, dtype=np.uint8).reshape(-1, 3))
+        if levels is not None:
+            self._pending_levels.append(np.asarray(levels).reshape(-1, 3))
+    
+    def flush(self):
+        """Растеризация накопленных треугольников"""
+        if not self._pending_xy:
+            return
+        
+        xy = np.concatenate(self._pending_xy)
+        z = np.concatenate(self._pending_z)
+        colors = np.concatenate(self._pending_colors)
+        levels = np.concatenate(self._pending_levels) if self._pending_levels else None
+        tables = table_ids = None
+        if levels is not None:
+            # Таблицы цветов строятся один раз на базовый цвет
+            tables, table_ids = color_tables(self.color_lut, colors)
+        self._pending_xy.clear()
+        self._pending_z.clear()
+        self._pending_colors.clear()
+        self._pending_levels.clear()
+        
+        if self.workers <= 1 or len(xy) < self.min_parallel_triangles:
+            rasterize_triangles(self.color_buffer, self.depth_buffer, xy, z, colors,
+                                levels=levels, tables=tables, table_ids=table_ids)
+            return
+        
+        tasks = []
+        for (tx, ty), ids in bin_triangles(xy, self.width, self.height, self.tile_size).items():
+            clip = (
+                tx * self.tile_size,
+                ty * self.tile_size,
+                min((tx + 1) * self.tile_size, self.width),
+                min((ty + 1) * self.tile_size, self.height)
+            )
+            if levels is None:
+                tasks.append((clip, xy[ids], z[ids], colors[ids], None, None, None))
+            else:
+                tasks.append((clip, xy[ids], z[ids], colors[ids], levels[ids], tables, table_ids[ids]))
+        
+        # Самые загруженные плитки раздаются первыми, группами по несколько плиток
+        tasks.sort(key=lambda task: len(task[1]), reverse=True)
+        chunks = [tasks[i::self.workers * 4] for i in range(min(len(tasks), self.workers * 4))]
+        self._get_pool().map(_rasterize_tiles, chunks)
+    
+    def draw_lines(self, starts, ends, color):
+        """Отрезки рисуются поверх уже растеризованных треугольников"""
+        self.flush()
+        super().draw_lines(starts, ends, color)
+    
+    def present(self, screen):
+        """Завершение растеризации кадра и вывод на экран"""
+        self.flush()
+        super().present(screen)
+    
+    def close(self):
+        """Остановка пула и освобождение разделяемой памяти"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        if self._color_shm is None:
+            return
+        
+        # Представления буферов нужно удалить до закрытия блоков памяти
+        self.color_buffer = None
+        self.depth_buffer = None
+        for shm in (self._color_shm, self._depth_shm):
+            shm.close()
+            shm.unlink()
+        self._color_shm = None
+        self._depth_shm = None
@@ -1,6 +1,8 @@
 # transformations.py
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
-from point import Point
+from point import Point, PointArray
 
 def identity_matrix():
     """Единичная матрица"""
@@ -138,7 +140,12 @@ def rotation_around_line_matrix(line_point, direction_vector, angle_degrees):
     return translate_back @ rotation @ translate_to_origin
 
 def composite_transformation(*matrices):
-    """Композиция нескольких матричных преобразований"""
+    """Композиция нескольких матричных преобразований
+    
+    Матрицы применяются в порядке аргументов. Аргументами могут быть и
+    стопки матриц (..., 4, 4): композиция вычисляется для каждой матрицы
+    стопки (по правилам broadcasting).
+    """
     if not matrices:
         return identity_matrix()
     
@@ -153,31 +160,285 @@ def transform_point(point, matrix):
     return point.copy().transform(matrix)
 
 def transform_multiple_points(points, matrix):
-    """Применение матрицы преобразования к нескольким точкам"""
-    return [transform_point(p, matrix) for p in points]
+    """Применение матрицы преобразования к нескольким точкам
+    
+    Для PointArray возвращается новый PointArray, для последовательности
+    Point - список новых точек; в обоих случаях координаты преобразуются
+    одним проходом по массиву.
+    """
+    if isinstance(points, PointArray):
+        return points.copy().transform(matrix)
+    points = list(points)
+    if not points:
+        return []
+    coords = np.array([(p.x, p.y, p.z) for p in points], dtype=float)
+    return [Point(x, y, z) for x, y, z in transform_points_array(coords, matrix).tolist()]
 
-def create_spiral_transform(center, height, rotations, scale_factor=1.0):
-    """Создание спирального преобразования"""
-    matrices = []
+def is_affine(matrix):
+    """Проверка, что матрица аффинная (последняя строка 0, 0, 0, 1)"""
+    return matrix[3, 0] == 0 and matrix[3, 1] == 0 and matrix[3, 2] == 0 and matrix[3, 3] == 1
+
+def transform_points_array(points, matrix):
+    """Применение матрицы преобразования к массиву точек Nx3 за один проход"""
+    points = np.asarray(points, dtype=float)
+    result = points @ matrix[:3, :3].T
+    result += matrix[:3, 3]
+    
+    if is_affine(matrix):
+        return result
+    
+    # Перспективное деление только там, где w отлично от 0 и 1
+    w = points @ matrix[3, :3] + matrix[3, 3]
+    divide = (w != 0) & (w != 1)
+    result[divide] /= w[divide, np.newaxis]
+    return result
+
+def transform_points_batch(points, matrices):
+    """Применение стопки матриц к стопке наборов точек за один проход
+    
+    points - массив (..., N, 3), matrices - (..., 4, 4); ведущие оси
+    согласуются по правилам broadcasting: например, точки (N, 3) и матрицы
+    (K, 4, 4) дают (K, N, 3) - одну сетку в K положениях, а точки (K, N, 3)
+    и матрицы (K, 4, 4) - K наборов, каждый со своей матрицей.
+    """
+    points = np.asarray(points, dtype=float)
+    matrices = np.asarray(matrices, dtype=float)
+    result = points @ np.swapaxes(matrices[..., :3, :3], -1, -2)
+    result += matrices[..., np.newaxis, :3, 3]
+    
+    bottom = matrices[..., 3, :]
+    if np.all(bottom[..., :3] == 0) and np.all(bottom[..., 3] == 1):
+        return result
+    
+    # Перспективное деление только там, где w отлично от 0 и 1
+    w = np.einsum('...ni,...i->...n', points, bottom[..., :3]) + bottom[..., np.newaxis, 3]
+    w = np.broadcast_to(w, result.shape[:-1])
+    divide = (w != 0) & (w != 1)
+    result[divide] /= w[divide][:, np.newaxis]
+    return result
+
+def rotation_matrices(axis, angles_degrees):
+    """Стопка матриц вращения вокруг оси 'x', 'y' или 'z' (K x 4 x 4) по массиву углов"""
+    if axis not in ('x', 'y', 'z'):
+        raise ValueError(f"Unknown rotation axis: {axis}")
+    angles = np.radians(np.asarray(angles_degrees, dtype=float).ravel())
+    cos_a = np.cos(angles)
+    sin_a = np.sin(angles)
+    
+    # Плоскость вращения (i, j): для оси X - (y, z), для Y - (z, x), для Z - (x, y)
+    i, j = {'x': (1, 2), 'y': (2, 0), 'z': (0, 1)}[axis]
+    result = np.tile(identity_matrix(), (len(angles), 1, 1))
+    result[:, i, i] = cos_a
+    result[:, i, j] = -sin_a
+    result[:, j, i] = sin_a
+    result[:, j, j] = cos_a
+    return result
+
+def translation_matrices(offsets):
+    """Стопка матриц переноса (K x 4 x 4) по массиву смещений Kx3"""
+    offsets = np.asarray(offsets, dtype=float).reshape(-1, 3)
+    result = np.tile(identity_matrix(), (len(offsets), 1, 1))
+    result[:, :3, 3] = offsets
+    return result
+
+def normal_matrix(matrix):
+    """Матрица преобразования нормалей (обратная транспонированная 3x3)
     
-    # Перенос в начало координат
-    matrices.append(translation_matrix(-center.x, -center.y, -center.z))
+    Возвращает None, если линейная часть матрицы вырождена.
+    """
+    linear = matrix[:3, :3]
+    det = np.linalg.det(linear)
+    if abs(det) < 1e-12:
+        return None
     
-    # Постепенный поворот и подъем
+    # Знак определителя сохраняет ориентацию нормалей, вычисляемых по обходу вершин
+    return np.linalg.inv(linear).T * np.sign(det)
+
+def transform_normals_array(normals, matrix):
+    """Преобразование массива единичных нормалей Fx3 с перенормировкой"""
+    result = normals @ matrix.T
+    lengths = np.linalg.norm(result, axis=1, keepdims=True)
+    np.divide(result, lengths, out=result, where=lengths > 0)
+    return result
+
+def extract_frustum_planes(view_proj_matrix):
+    """Плоскости пирамиды видимости из матрицы вида и проекции (массив 6x4)
+    
+    Каждая строка (a, b, c, d) задает плоскость a*x + b*y + c*z + d = 0 с
+    нормалью внутрь: точка видима, если значение неотрицательно для всех
+    плоскостей. Если в матрицу встроена матрица модели, плоскости получаются
+    в координатах модели. Порядок: левая, правая, нижняя, верхняя, ближняя, дальняя.
+    """
+    m = np.asarray(view_proj_matrix, dtype=float)
+    planes = np.array([
+        m[3] + m[0],
+        m[3] - m[0],
+        m[3] + m[1],
+        m[3] - m[1],
+        m[3] + m[2],
+        m[3] - m[2],
+    ])
+    
+    # Нормировка, чтобы значения были расстояниями до плоскостей
+    lengths = np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+    np.divide(planes, lengths, out=planes, where=lengths > 0)
+    return planes
+
+class TransformPipeline:
+    """Цепочка преобразований с именованными параметрами
+    
+    Шаги добавляются в порядке применения (как аргументы
+    composite_transformation); аргумент шага - число или имя параметра
+    (строка), значение которого передается при вычислении:
+        
+        pipeline = TransformPipeline().rotate_y('angle_y').rotate_x('angle_x')
+        matrix = pipeline(angle_y=30, angle_x=10)
+    
+    При компиляции соседние шаги без параметров перемножаются один раз.
+    При вычислении матрица шага пересчитывается, только если изменились
+    значения его параметров (матрицы для уже встречавшихся значений берутся
+    из кэша шага на cache_size записей), а произведение цепочки - только
+    начиная с первого изменившегося шага. Результат доступен только для чтения.
+    """
+    
+    def __init__(self, cache_size=256):
+        self.cache_size = cache_size
+        self._steps = []
+        self._stages = None
+    
+    def add(self, function, *args):
+        """Шаг function(*args) -> матрица 4x4; строковые аргументы - параметры"""
+        self._steps.append((function, args))
+        self._stages = None
+        return self
+    
+    def matrix(self, matrix):
+        """Постоянная матрица"""
+        matrix = np.array(matrix, dtype=float)
+        return self.add(lambda: matrix)
+    
+    def translate(self, dx, dy, dz):
+        return self.add(translation_matrix, dx, dy, dz)
+    
+    def scale(self, sx, sy, sz):
+        return self.add(scaling_matrix, sx, sy, sz)
+    
+    def rotate_x(self, angle):
+        return self.add(rotation_x_matrix, angle)
+    
+    def rotate_y(self, angle):
+        return self.add(rotation_y_matrix, angle)
+    
+    def rotate_z(self, angle):
+        return self.add(rotation_z_matrix, angle)
+    
+    def rotate_around_line(self, line_point, direction_vector, angle):
+        return self.add(rotation_around_line_matrix, line_point, direction_vector, angle)
+    
+    def shear(self, sh_xy, sh_xz, sh_yx, sh_yz, sh_zx, sh_zy):
+        return self.add(shearing_matrix, sh_xy, sh_xz, sh_yx, sh_yz, sh_zx, sh_zy)
+    
+    @property
+    def parameters(self):
+        """Имена параметров цепочки"""
+        return sorted({arg for _, args in self._steps for arg in args if isinstance(arg, str)})
+    
+    def compile(self):
+        """Свертка постоянных участков цепочки
+        
+        Этап - либо готовая матрица, либо параметрический шаг
+        [function, args, cache, последние значения, матрица].
+        """
+        stages = []
+        for function, args in self._steps:
+            if any(isinstance(arg, str) for arg in args):
+                stages.append([function, args, OrderedDict(), None, None])
+                continue
+            matrix = function(*args)
+            if stages and isinstance(stages[-1], np.ndarray):
+                stages[-1] = matrix @ stages[-1]
+            else:
+                stages.append(matrix)
+        
+        self._stages = stages
+        self._products = [None] * len(stages)
+        return self
+    
+    def _stage_matrix(self, stage, params):
+        """Матрица параметрического шага; True вторым значением, если она изменилась"""
+        function, args, cache = stage[0], stage[1], stage[2]
+        try:
+            values = tuple(params[arg] if isinstance(arg, str) else arg for arg in args)
+        except KeyError as e:
+            raise ValueError(f"Missing pipeline parameter: {e.args[0]}") from None
+        if values == stage[3]:
+            return stage[4], False
+        
+        matrix = cache.get(values)
+        if matrix is None:
+            matrix = function(*values)
+            cache[values] = matrix
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(values)
+        stage[3] = values
+        stage[4] = matrix
+        return matrix, True
+    
+    def evaluate(self, **params):
+        """Матрица цепочки при заданных значениях параметров"""
+        if self._stages is None:
+            self.compile()
+        if not self._stages:
+            return identity_matrix()
+        
+        products = self._products
+        dirty = False
+        for i, stage in enumerate(self._stages):
+            if isinstance(stage, np.ndarray):
+                matrix = stage
+            else:
+                matrix, changed = self._stage_matrix(stage, params)
+                dirty = dirty or changed
+            
+            # Произведения до первого изменившегося шага берутся из прошлого вызова
+            if dirty or products[i] is None:
+                dirty = True
+                products[i] = matrix @ products[i - 1] if i > 0 else np.array(matrix, dtype=float)
+                products[i].flags.writeable = False
+        return products[-1]
+    
+    __call__ = evaluate
+
+@lru_cache(maxsize=64)
+def _spiral_chain(height, rotations):
+    """Произведение десяти шагов спирали (поворот вокруг Y и подъем по Z)"""
     angle_per_step = rotations * 360 / 10
     height_per_step = height / 10
     
+    chain = identity_matrix()
     for i in range(1, 11):
-        matrices.append(rotation_y_matrix(angle_per_step * i))
-        matrices.append(translation_matrix(0, 0, height_per_step * i))
-    
-    # Масштабирование
-    matrices.append(scaling_matrix(scale_factor, scale_factor, scale_factor))
-    
-    # Возврат обратно
-    matrices.append(translation_matrix(center.x, center.y, center.z))
+        chain = translation_matrix(0, 0, height_per_step * i) @ rotation_y_matrix(angle_per_step * i) @ chain
+    chain.flags.writeable = False
+    return chain
+
+def create_spiral_transform(center, height, rotations, scale_factor=1.0):
+    """Создание спирального преобразования
     
-    return composite_transformation(*matrices)
+    Цепочка поворотов и подъемов зависит только от height и rotations и
+    вычисляется один раз для каждой пары значений.
+    """
+    return composite_transformation(
+        # Перенос в начало координат
+        translation_matrix(-center.x, -center.y, -center.z),
+        # Постепенный поворот и подъем
+        _spiral_chain(float(height), float(rotations)),
+        # Масштабирование
+        scaling_matrix(scale_factor, scale_factor, scale_factor),
+        # Возврат обратно
+        translation_matrix(center.x, center.y, center.z)
+    )
 
 def print_matrix_info(matrix, name="Matrix"):
     """Красивый вывод информации о матрице"""
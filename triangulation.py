@@ -0,0 +1,124 @@
+# triangulation.py
+import numpy as np
+
+def next_corners(face_offsets):
+    """Номер следующего угла той же грани для каждого угла упакованного массива"""
+    following = np.arange(1, face_offsets[-1] + 1, dtype=np.int64)
+    following[face_offsets[1:] - 1] = face_offsets[:-1]
+    return following
+
+def newell_normals(positions, face_indices, face_offsets):
+    """Ненормированные нормали граней по формуле Ньюэлла (Fx3)
+    
+    Длина вектора равна удвоенной площади многоугольника; для неплоских
+    и невыпуклых граней нормаль учитывает все вершины, а не первые три.
+    """
+    if len(face_offsets) < 2:
+        return np.zeros((0, 3))
+    corners = positions[face_indices]
+    following = corners[next_corners(face_offsets)]
+    return np.add.reduceat(np.cross(corners, following), face_offsets[:-1], axis=0)
+
+def convex_faces(positions, face_indices, face_offsets, normals):
+    """Маска выпуклых граней: все углы поворачивают в сторону нормали"""
+    sizes = np.diff(face_offsets)
+    following = next_corners(face_offsets)
+    previous = np.empty_like(following)
+    previous[following] = np.arange(len(following))
+    
+    corners = positions[face_indices]
+    turns = np.cross(corners - corners[previous], corners[following] - corners)
+    owner = np.repeat(np.arange(len(sizes)), sizes)
+    reflex = np.einsum('ij,ij->i', turns, normals[owner]) < 0
+    return (np.bincount(owner[reflex], minlength=len(sizes)) == 0) | (sizes <= 3)
+
+def _ear_clip(points):
+    """Отсечение ушей для простого многоугольника на плоскости (Kx2, против часовой)
+    
+    Возвращает список троек номеров вершин; если уши не находятся
+    (самопересечение, вырождение), остаток разбивается веером.
+    """
+    remaining = list(range(len(points)))
+    triangles = []
+    
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    
+    while len(remaining) > 3:
+        count = len(remaining)
+        for k in range(count):
+            i, j, l = remaining[k - 1], remaining[k], remaining[(k + 1) % count]
+            a, b, c = points[i], points[j], points[l]
+            if cross(a, b, c) <= 0:
+                continue
+            
+            # Ухо не должно содержать других вершин многоугольника
+            if any(
+                cross(a, b, points[m]) >= 0 and cross(b, c, points[m]) >= 0 and cross(c, a, points[m]) >= 0
+                for m in remaining if m not in (i, j, l)
+            ):
+                continue
+            triangles.append((i, j, l))
+            del remaining[k]
+            break
+        else:
+            break
+    
+    triangles.extend((remaining[0], remaining[k], remaining[k + 1]) for k in range(1, len(remaining) - 1))
+    return triangles
+
+def triangulate_faces(positions, face_indices, face_offsets, normals=None):
+    """Разбиение граней на треугольники
+    
+    Выпуклые грани разбиваются веером векторно, невыпуклые - отсечением
+    ушей в плоскости, перпендикулярной нормали. Возвращает массив
+    треугольников Tx3 (индексы вершин) и смещения triangle_offsets (F + 1):
+    треугольники грани f занимают [triangle_offsets[f], triangle_offsets[f + 1]).
+    """
+    if normals is None:
+        normals = newell_normals(positions, face_indices, face_offsets)
+    sizes = np.diff(face_offsets)
+    counts = np.maximum(sizes - 2, 0)
+    triangle_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(counts, out=triangle_offsets[1:])
+    
+    # Веер для всех граней; невыпуклые затем перезаписываются
+    face_of_triangle = np.repeat(np.arange(len(sizes)), counts)
+    k = np.arange(int(counts.sum())) - triangle_offsets[face_of_triangle]
+    base = face_offsets[face_of_triangle]
+    triangles = np.stack([
+        face_indices[base],
+        face_indices[base + k + 1],
+        face_indices[base + k + 2]
+    ], axis=1).astype(np.int32)
+    
+    concave = np.flatnonzero(~convex_faces(positions, face_indices, face_offsets, normals))
+    for face in concave.tolist():
+        indices = face_indices[face_offsets[face]:face_offsets[face + 1]]
+        
+        # Проекция на плоскость без доминирующей оси нормали с сохранением ориентации
+        normal = normals[face]
+        axis = int(np.argmax(np.abs(normal)))
+        u, v = [(1, 2), (2, 0), (0, 1)][axis]
+        points = positions[indices][:, [u, v]]
+        if normal[axis] < 0:
+            points = points[:, ::-1]
+        
+        local = _ear_clip(points.tolist())
+        first = triangle_offsets[face]
+        triangles[first:first + len(local)] = indices[np.array(local)]
+    return triangles, triangle_offsets
+
+def extract_edges(face_indices, face_offsets, vertex_count):
+    """Уникальные ребра граней без учета направления
+    
+    Возвращает массив ребер Ex2 (меньший индекс первым) и corner_edges -
+    номер ребра от каждого угла грани к следующему (по длине face_indices).
+    Диагонали разбиения на треугольники ребрами не считаются.
+    """
+    a = face_indices.astype(np.int64)
+    b = a[next_corners(face_offsets)]
+    keys = np.minimum(a, b) * vertex_count + np.maximum(a, b)
+    unique_keys, corner_edges = np.unique(keys, return_inverse=True)
+    edges = np.column_stack(np.divmod(unique_keys, vertex_count)).astype(np.int32)
+    return edges, corner_edges.astype(np.int64)